@@ -2,6 +2,22 @@ import sqlite3
 from sqlite3 import Error
 import time
 
+from archive import attach_history, forget_archive
+from availability import available_aircraft, create_availability_index
+from cache import forget_connection, get_result_cache, invalidate, written_table
+from indexes import create_indexes
+from instrumentation import InstrumentedConnection, query_stats
+from loader import insert_rows
+from schema import SCHEMA_VERSION, forget_catalog, get_catalog, get_column_names, tables_to_create
+from queries import (STATEMENT_CACHE_SIZE, aircraft_by_status, column_values, delete_rows, drop_column,
+    flight_duration_and_passengers, flight_numbers, insert_row, pilots_by_rank, update_value)
+from search import create_search_index, search
+from stats import create_stats_tables
+from viewer import DEFAULT_PAGE_SIZE, iter_pages
+
+# seconds the menu waits after each action so the output can be read
+MENU_PAUSE = 2
+
 def make_connection(database_file):
     """ Create a connection to the database file.
     Variables:
@@ -11,7 +27,8 @@ def make_connection(database_file):
     connection: connection to the database"""
     connection = None
     try:
-        connection = sqlite3.connect(database_file)
+        connection = sqlite3.connect(database_file, cached_statements=STATEMENT_CACHE_SIZE,
+                                     factory=InstrumentedConnection)
         print(f"Successfully connected to {database_file}")
     except Error as e:
         print(e)
@@ -30,7 +47,15 @@ def make_query(connection, query):
         cursor = connection.cursor()
         cursor.execute(query)
         result = cursor.fetchall()
-        connection.commit()
+        # only statements that changed data leave a transaction open
+        if connection.in_transaction:
+            connection.commit()
+            # only the results that read the written table are dropped; other statements drop them all
+            table_name = written_table(query)
+            if table_name is not None:
+                invalidate(connection, table_name)
+            else:
+                get_result_cache(connection).clear()
         return result
     except Error as e:
         print(e)
@@ -44,51 +69,114 @@ def list_all_tables(connection):
     Returns:
     list_of_tables: names of tables.
     """
-    query = "SELECT name FROM sqlite_master WHERE type ='table';"
     list_of_tables=[]
     try:
-        cursor = connection.cursor()
-        cursor.execute(query)
-        tables = cursor.fetchall()
-        if tables:
-            list_of_tables = [table[0] for table in tables]
+        # read from the schema catalog, internal tables (e.g. the search index) are left out
+        list_of_tables = get_catalog(connection).tables()
+        if list_of_tables:
             return list_of_tables
         else:
             print("Database is empty.")
     except Error as e:
         print(e)
 
-def view_table_data(connection, table_name):
-    """ gets all the data for a specific table.
+def print_table_data(connection, table_name, page_size=DEFAULT_PAGE_SIZE, columns=None, order_by=None):
+    """ Prints all the data of a specific table, one page at a time.
 
     Variables:
     connection: connection to the database
-    table_name: The name of a specific table """
-    cursor = connection.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = cursor.fetchall()
-    column_names = [column[1] for column in columns]
-
-    # get and print data
-    query = f"SELECT * FROM {table_name};"
-    table_data = make_query(connection, query)
-
-    if column_names and table_data:
-        # Print the column names
-        print(", ".join(column_names))
-        
+    table_name: The name of a specific table
+    page_size: number of rows read per page
+    columns: columns to print, defaults to all of them
+    order_by: indexed column to sort on, defaults to table order
+
+    Raises:
+    ValueError: unknown table or column, or order_by does not lead an index """
+    column_names = columns or get_column_names(connection, table_name)
+    has_data = False
+    for page in iter_pages(connection, table_name, page_size, columns, order_by):
+        if not has_data:
+            # Print the column names
+            print(", ".join(column_names))
+            has_data = True
+
         # Print data
-        for row in table_data:
+        for row in page:
             print(", ".join(map(str, row)))
-    else:
+    if not has_data:
         print(f"{table_name} table has no data.")
-    return None
 
-# Database file
-database_file = "aircraft_management_system_db.db"
+def view_table_data(connection, table_name, page_size=DEFAULT_PAGE_SIZE, columns=None, order_by=None):
+    """ Same as print_table_data, printing the error instead (the menu keeps going). """
+    try:
+        print_table_data(connection, table_name, page_size, columns, order_by)
+    except ValueError as e:
+        print(e)
+    return None
 
-# Create a connection to the database
-connection = make_connection(database_file)
+# Insert data into sql tables
+aircraft_data = [
+    ('EI-DCJ', 150, 'Boeing', 'Active'),
+    ('F-WWBY', 200, 'Airbus', 'Active'),
+    ('EI-HGA', 100, 'Ryanair', 'Active'),
+    ('EI-DAJ', 180, 'Boeing', 'Maintenance'),
+    ('F-WWAY', 250, 'Airbus', 'Retired')]
+
+flight_data = [
+    ('B777', 'EI-DCJ', 'STD', 'EDI', '2023-10-30 08:00:00', '2023-10-30 09:30:00', 122, 1.5),
+    ('F56', 'F-WWBY', 'BRI', 'MXP', '2023-11-01 14:30:00', '2023-11-01 16:30:00', 171, 2),
+    ('FR2233', 'EI-HGA', 'MAD', 'BUD', '2023-11-05 10:45:00', '2023-11-05 16:45:00', 80, 3.5),
+    ('B677', 'EI-DAJ', 'LIS', 'PRA', '2023-11-10 12:30:00', '2023-11-10 18:30:00', 169, 3),
+    ('112', 'F-WWAY', 'BER', 'FCO', '2023-11-15 09:15:00', '2023-11-15 11:15:00', 201, 2)]
+
+pilot_data = [
+    ('CPL001', 'John', 'Wayne', 'L12345', '07704144166', 'Captain'),
+    ('CPL002', 'Robin', 'Gray', 'L67890', '08804188111', 'Cadet'),
+    ('CPL003', 'Felix', 'Arthur', 'L54321', '02804128121', 'Captain'),
+    ('CPL004', 'James', 'Williams', 'L99999', '3304195111', 'Cadet'),
+    ('CPL005', 'Ben', 'Simpson', 'L11111', '55804143111', 'Captain'),
+    ('CPL006', 'Larry', 'Wilks', 'L12345', '77804188111', 'Cadet'),
+    ('CPL007', 'Marc', 'Stewart', 'L67890', '09904188111', 'Captain'),
+    ('CPL008', 'Shaun', 'Proctor', 'L54321', '11114188111', 'Cadet'),
+    ('CPL009', 'Ben', 'Aaron', 'L99999', '22224188111', 'Captain'),
+    ('CPL010', 'Marc', 'Leith', 'L11111', '333341881112', 'Cadet')]
+
+destination_data = [
+    ('EDI', 'Edinburgh', 'UK'),
+    ('MXP', 'Milan', 'Italy'),
+    ('BUD', 'Budapest', 'Hungary'),
+    ('PRG', 'Prague', 'Czech Republic'),
+    ('FCO', 'Rome', 'Italy')]
+
+pilot_flight_data = [
+    (1, 'CPL001', 'B777', 'Captain'),
+    (2, 'CPL002', 'B777', 'Cadet'),
+    (3, 'CPL003', 'F56', 'Captain'),
+    (4, 'CPL004', 'F56', 'Cadet'),
+    (5, 'CPL005', 'FR2233', 'Captain'),
+    (6, 'CPL006', 'FR2233', 'Cadet'),
+    (7, 'CPL007', 'B677', 'Captain'),
+    (8, 'CPL008', 'B677', 'Cadet'),
+    (9, 'CPL09', '112', 'Captain'),
+    (10, 'CPL010', '112', 'Cadet')]
+
+aircraft_destination_data = [
+    (1, 'EI-DCJ', 'EDI'),
+    (2, 'F-WWBY', 'MXP'),
+    (3, 'EI-HGA', 'BUD'),
+    (4, 'EI-DAJ', 'PRG'),
+    (5, 'F-WWAY', 'FCO')]
+
+aircraft_flight_data = [
+    (1, 'EI-DCJ', 'B777'),
+    (2, 'F-WWBY', 'F56'),
+    (3, 'EI-HGA', 'FR2233'),
+    (4, 'EI-DAJ', 'B677'),
+    (5, 'F-WWAY', '112')]
+
+seed_data = {"Aircraft": aircraft_data, "Flight": flight_data, "Pilot": pilot_data,
+    "Destination": destination_data, "Pilot_Flight": pilot_flight_data,
+    "Aircraft_Destination": aircraft_destination_data, "Aircraft_Flight": aircraft_flight_data}
 
 # Drop tables on initialisation
 # tables_to_drop = ["Aircraft", "Flight", "Pilot", "Destination", "Pilot_Flight", "Aircraft_Destination", "Aircraft_Flight"]
@@ -97,152 +185,76 @@ connection = make_connection(database_file)
 #     table_drop = f"DROP TABLE IF EXISTS {table};"
 #     make_query(connection, table_drop)
 
-# Create tables
-aircraft_table = """ CREATE TABLE IF NOT EXISTS Aircraft (
-    Aircraft_Registration_Number VARCHAR(25) PRIMARY KEY,
-    Seat_Capacity INT,
-    Manufacturer VARCHAR(25) NOT NULL,
-    Status TEXT CHECK (Status IN ('Active', 'Maintenance', 'Retired')) NOT NULL); """
-
-flight_table = """ CREATE TABLE IF NOT EXISTS Flight (
-    Flight_Number VARCHAR (25) PRIMARY KEY,
-    Aircraft_Registration_Number VARCHAR(25) REFERENCES Aircraft(Aircraft_Registration_Number) NOT NULL,
-    Departure_Airport_Code VARCHAR(25) NOT NULL,
-    Arrival_Airport_Code VARCHAR(25) NOT NULL,
-    Departure_Date_Time DATETIME,
-    Arrival_Date_Time DATETIME,
-    Passenger_Count INT,
-    Flight_Duration INT ); """
-
-pilot_table = """ CREATE TABLE IF NOT EXISTS Pilot (
-    Commercial_Pilot_License_Number VARCHAR(25) PRIMARY KEY,
-    First_Name VARCHAR(25) NOT NULL,
-    Last_Name VARCHAR(25) NOT NULL,
-    License_Number VARCHAR(25) NOT NULL,
-    Contact_Number VARCHAR(25) NOT NULL,
-    Pilot_Ranking TEXT CHECK (Pilot_Ranking IN ('Cadet', 'Captain')) NOT NULL ); """
-
-destination_table = """ CREATE TABLE IF NOT EXISTS Destination (
-    Airport_Destination_Code VARCHAR(25) PRIMARY KEY,
-    Location VARCHAR(25) NOT NULL,
-    Country VARCHAR(25) NOT NULL ); """
-
-pilot_flight_table = """ CREATE TABLE IF NOT EXISTS Pilot_Flight (
-    Pilot_Flight_ID INT PRIMARY KEY,
-    Commercial_Pilot_License_Number VARCHAR(25) REFERENCES Pilot(Commercial_Pilot_License_Number),
-    Flight_Number VARCHAR (25) REFERENCES Flight(Flight_Number),
-    Pilot_Ranking TEXT CHECK (Pilot_Ranking IN ('Pilot Cadet', 'Second officer', 'Cadet', 'Captain')) NOT NULL ); """
-
-aircraft_destination_table = """ CREATE TABLE IF NOT EXISTS Aircraft_Destination (
-    Aircraft_Destination_ID INT PRIMARY KEY,
-    Aircraft_Registration_Number VARCHAR(25) REFERENCES Aircraft(Aircraft_Registration_Number),
-    Airport_Destination_Code VARCHAR(25) REFERENCES Destination(Airport_Destination_Code) ); """
-
-aircraft_flight_table = """ CREATE TABLE IF NOT EXISTS Aircraft_Flight (
-    Aircraft_Flight_ID INT PRIMARY KEY,
-    Aircraft_Registration_Number VARCHAR(25) REFERENCES Aircraft(Aircraft_Registration_Number),
-    Flight_Number VARCHAR (25) REFERENCES Flight(Flight_Number) ); """
-
-tables_to_create = [aircraft_table, flight_table, pilot_table,
-    destination_table, pilot_flight_table, aircraft_destination_table, aircraft_flight_table]
-
-# create queries
-for table_query in tables_to_create:
-    make_query(connection, table_query)
+def initialise_database(connection):
+    """ Creates the tables, indexes and derived tables and inserts the seed data.
 
-# Insert data into sql tables
-aircraft_data = """ INSERT INTO Aircraft (Aircraft_Registration_Number, Seat_Capacity, Manufacturer, Status)
-VALUES
-  ('EI-DCJ', 150, 'Boeing', 'Active'),
-  ('F-WWBY', 200, 'Airbus', 'Active'),
-  ('EI-HGA', 100, 'Ryanair', 'Active'),
-  ('EI-DAJ', 180, 'Boeing', 'Maintenance'),
-  ('F-WWAY', 250, 'Airbus', 'Retired'); """
-
-flight_data = """ INSERT INTO Flight (Flight_Number, Aircraft_Registration_Number, Departure_Airport_Code, Arrival_Airport_Code, Departure_Date_Time, Arrival_Date_Time, Passenger_Count, Flight_Duration)
-VALUES
-  ('B777', 'EI-DCJ', 'STD', 'EDI', '2023-10-30 08:00:00', '2023-10-30 09:30:00', 122, 1.5),
-  ('F56', 'F-WWBY', 'BRI', 'MXP', '2023-11-01 14:30:00', '2023-11-01 16:30:00', 171, 2),
-  ('FR2233', 'EI-HGA', 'MAD', 'BUD', '2023-11-05 10:45:00', '2023-11-05 16:45:00', 80, 3.5),
-  ('B677', 'EI-DAJ', 'LIS', 'PRA', '2023-11-10 12:30:00', '2023-11-10 18:30:00', 169, 3),
-  ('112', 'F-WWAY', 'BER', 'FCO', '2023-11-15 09:15:00', '2023-11-15 11:15:00', 201, 2); """
-
-pilot_data = """ INSERT INTO Pilot (Commercial_Pilot_License_Number, First_Name, Last_Name, License_Number, Contact_Number, Pilot_Ranking)
-VALUES
-  ('CPL001', 'John', 'Wayne', 'L12345', '07704144166', 'Captain'),
-  ('CPL002', 'Robin', 'Gray', 'L67890', '08804188111', 'Cadet'),
-  ('CPL003', 'Felix', 'Arthur', 'L54321', '02804128121', 'Captain'),
-  ('CPL004', 'James', 'Williams', 'L99999', '3304195111', 'Cadet'),
-  ('CPL005', 'Ben', 'Simpson', 'L11111', '55804143111', 'Captain'),
-  ('CPL006', 'Larry', 'Wilks', 'L12345', '77804188111', 'Cadet'),
-  ('CPL007', 'Marc', 'Stewart', 'L67890', '09904188111', 'Captain'),
-  ('CPL008', 'Shaun', 'Proctor', 'L54321', '11114188111', 'Cadet'),
-  ('CPL009', 'Ben', 'Aaron', 'L99999', '22224188111', 'Captain'),
-  ('CPL010', 'Marc', 'Leith', 'L11111', '333341881112', 'Cadet'); """
-
-destination_data = """ INSERT INTO Destination (Airport_Destination_Code, Location, Country)
-VALUES
-  ('EDI', 'Edinburgh', 'UK'),
-  ('MXP', 'Milan', 'Italy'),
-  ('BUD', 'Budapest', 'Hungary'),
-  ('PRG', 'Prague', 'Czech Republic'),
-  ('FCO', 'Rome', 'Italy'); """
-
-pilot_flight_data = """ INSERT INTO Pilot_Flight (Pilot_Flight_ID, Commercial_Pilot_License_Number, Flight_Number, Pilot_Ranking)
-VALUES
-  (1, 'CPL001', 'B777', 'Captain'),
-  (2, 'CPL002', 'B777', 'Cadet'),
-  (3, 'CPL003', 'F56', 'Captain'),
-  (4, 'CPL004', 'F56', 'Cadet'),
-  (5, 'CPL005', 'FR2233', 'Captain'),
-  (6, 'CPL006', 'FR2233', 'Cadet'),
-  (7, 'CPL007', 'B677', 'Captain'),
-  (8, 'CPL008', 'B677', 'Cadet'),
-  (9, 'CPL09', '112', 'Captain'),
-  (10, 'CPL010', '112', 'Cadet'); """
-
-aircraft_destination_data = """ INSERT INTO Aircraft_Destination (Aircraft_Destination_ID, Aircraft_Registration_Number, Airport_Destination_Code)
-VALUES
-  (1, 'EI-DCJ', 'EDI'),
-  (2, 'F-WWBY', 'MXP'),
-  (3, 'EI-HGA', 'BUD'),
-  (4, 'EI-DAJ', 'PRG'),
-  (5, 'F-WWAY', 'FCO'); """
-
-aircraft_flight_data = """ INSERT INTO Aircraft_Flight (Aircraft_Flight_ID, Aircraft_Registration_Number, Flight_Number)
-VALUES
-  (1, 'EI-DCJ', 'B777'),
-  (2, 'F-WWBY', 'F56'),
-  (3, 'EI-HGA', 'FR2233'),
-  (4, 'EI-DAJ', 'B677'),
-  (5, 'F-WWAY', '112'); """
-
-insert_data = [aircraft_data, flight_data, pilot_data,
-    destination_data, pilot_flight_data, aircraft_destination_data, aircraft_flight_data]
-
-# create tables
-for insert_query in insert_data:
-    make_query(connection, insert_query)
-
-# start menu:
-while True:
-    print("\n\nSTART MENU\n")
-    print("1. List all tables")
-    print("2. View table data")
-    print("3. Search data")
-    print("4. Update data")
-    print("5. Delete data")
-    print("6. Insert data")
-    print("7. Get the length of an entire flight and total passenger count")
-    print("8. Find available aircrafts")
-    print("9. Find pilots by rank")
-    print("10. Quit\n")
-    
-    choice = input("Select one of the following (1-10): ")    
-    if choice == '1':
-        print("\n===========LIST OF TABLES===========\n")
-        # when the user uses a specific table store variable table_name to execute commands
-        while True:
+    Skipped when PRAGMA user_version already matches SCHEMA_VERSION, so
+    opening an existing database costs one PRAGMA.
+
+    Variables:
+    connection: connection to the database
+
+    Returns:
+    created: True if the schema was (re)created """
+    user_version = connection.execute("PRAGMA user_version;").fetchone()[0]
+    if user_version == SCHEMA_VERSION:
+        return False
+
+    # create queries
+    for table_query in tables_to_create:
+        make_query(connection, table_query)
+
+    # create the secondary indexes, and the search index (and its triggers) before any data goes in
+    create_indexes(connection)
+    create_search_index(connection)
+    create_availability_index(connection)
+    create_stats_tables(connection)
+
+    # insert data (only into a new database)
+    if user_version == 0:
+        for table_name, rows in seed_data.items():
+            insert_rows(connection, table_name, rows)
+
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+    return True
+
+def run_menu(connection):
+    """ Runs the interactive start menu until the user quits.
+
+    Variables:
+    connection: connection to the database """
+    while True:
+        print("\n\nSTART MENU\n")
+        print("1. List all tables")
+        print("2. View table data")
+        print("3. Search data")
+        print("4. Update data")
+        print("5. Delete data")
+        print("6. Insert data")
+        print("7. Get the length of an entire flight and total passenger count")
+        print("8. Find available aircrafts")
+        print("9. Find pilots by rank")
+        print("10. Query statistics")
+        print("11. Quit\n")
+        
+        choice = input("Select one of the following (1-11): ")    
+        if choice == '1':
+            print("\n===========LIST OF TABLES===========\n")
+            # when the user uses a specific table store variable table_name to execute commands
+            while True:
+                tables=list_all_tables(connection)
+                list_tables=[]
+                count=0
+                for table in tables:
+                    count=count+1
+                    list_tables.append(f"{count}. {table}")
+                for table in list_tables:
+                    print(table)
+                time.sleep(MENU_PAUSE)
+                break
+            
+        elif choice == '2':
+            # SELECT A SPECIFIC TABLE
             tables=list_all_tables(connection)
             list_tables=[]
             count=0
@@ -251,309 +263,298 @@ while True:
                 list_tables.append(f"{count}. {table}")
             for table in list_tables:
                 print(table)
-            time.sleep(2)
-            break
-        
-    elif choice == '2':
-        # SELECT A SPECIFIC TABLE
-        tables=list_all_tables(connection)
-        list_tables=[]
-        count=0
-        for table in tables:
-            count=count+1
-            list_tables.append(f"{count}. {table}")
-        for table in list_tables:
-            print(table)
-        choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
-        if choice.isdigit() and 1 <= int(choice) <= 100:
-            table_name = tables[int(choice) - 1]
-            view_table_data(connection, table_name)
-            time.sleep(2)
-            continue
-        elif choice =='x':
-            time.sleep(2)
-            continue
-        elif (choice.lower() == 'x' or (choice.isdigit() and 1 <= int(choice) <= count) is not True):
-            print(f"Invalid choice. Please enter a number between 1 and {count}.")
-            time.sleep(2)
-            continue
-        else:
-            time.sleep(2)
-            break
-    elif choice=='3':
-        query="SELECT name FROM sqlite_master WHERE type='table';"
-        cursor = connection.cursor()
-        cursor=cursor.execute(query)
-        table_names = cursor.fetchall()
-        attribute_value=input('input the attribute you are searching for (case sensitive): ')
-        for table in table_names:
-            table_name = table[0]
-
-            column_names_query = f"PRAGMA table_info({table_name});"
-            cursor.execute(column_names_query)
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
-
-            select_query = f"SELECT * FROM {table_name} WHERE {f'=? OR '.join(column_names)}=?;"
-            cursor.execute(select_query, [attribute_value]*len(column_names))
-            records = cursor.fetchall()
-
-            # Print the results
-            if records:
-                print(f"\n Matching records in table {table_name}:")
-                for record in records:
-                    print(record)
+            choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
+            if choice.isdigit() and 1 <= int(choice) <= 100:
+                table_name = tables[int(choice) - 1]
+                view_table_data(connection, table_name)
+                time.sleep(MENU_PAUSE)
+                continue
+            elif choice =='x':
+                time.sleep(MENU_PAUSE)
+                continue
+            elif (choice.lower() == 'x' or (choice.isdigit() and 1 <= int(choice) <= count) is not True):
+                print(f"Invalid choice. Please enter a number between 1 and {count}.")
+                time.sleep(MENU_PAUSE)
+                continue
             else:
-                print(f"No matching records were found in table {table_name}")
-            time.sleep(2)
-    elif choice == '4':
-        # SELECT A SPECIFIC TABLE
-        tables=list_all_tables(connection)
-        list_tables=[]
-        count=0
-        for table in tables:
-            count=count+1
-            list_tables.append(f"{count}. {table}")
-        for table in list_tables:
-            print(table)
-        choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
-        print('\n')
-        if choice.isdigit() and 1 <= int(choice) <= 100:
-            table_name = tables[int(choice) - 1]
-            cursor = connection.cursor()
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
+                time.sleep(MENU_PAUSE)
+                break
+        elif choice=='3':
+            table_names = list_all_tables(connection)
+            attribute_value=input('input the attribute you are searching for (not case sensitive, end with * to match a prefix): ')
+            prefix = attribute_value.endswith('*')
+            results = search(connection, attribute_value.rstrip('*') if prefix else attribute_value, prefix)
+            for table_name in table_names:
+                records = results.get(table_name)
+
+                # Print the results
+                if records:
+                    print(f"\n Matching records in table {table_name}:")
+                    for record in records:
+                        print(record)
+                else:
+                    print(f"No matching records were found in table {table_name}")
+            time.sleep(MENU_PAUSE)
+        elif choice == '4':
+            # SELECT A SPECIFIC TABLE
+            tables=list_all_tables(connection)
+            list_tables=[]
             count=0
-            column_list=[]
-            for col in column_names:
+            for table in tables:
                 count=count+1
-                column_list.append(f"{count}. {col}")
-            for col in column_list:
-                print(col)
-            column_count=len(column_names)
-            choice = input(f"\nNow select one of the {column_count} columns from the {table_name} table or type 'x' to go back to the start menu: \n")
+                list_tables.append(f"{count}. {table}")
+            for table in list_tables:
+                print(table)
+            choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
             print('\n')
             if choice.isdigit() and 1 <= int(choice) <= 100:
-                col_name = column_names[int(choice) - 1]
-                query = f"SELECT {col_name} FROM {table_name};"
-                cursor = connection.cursor()
-                cursor=cursor.execute(query)
-                rows = cursor.fetchall()
-                row_names = [row[0] for row in rows]
+                table_name = tables[int(choice) - 1]
+                column_names = get_column_names(connection, table_name)
                 count=0
-                row_list=[]
-                for row in row_names:
+                column_list=[]
+                for col in column_names:
                     count=count+1
-                    row_list.append(f"{count}. {row}")
-                for row in row_list:
-                    print(row)
-                row_count=len(row_list)
-                choice = input(f"\nNow select one of the {row_count} rows from the {table_name} table or type 'x' to go back to the start menu: \n")
+                    column_list.append(f"{count}. {col}")
+                for col in column_list:
+                    print(col)
+                column_count=len(column_names)
+                choice = input(f"\nNow select one of the {column_count} columns from the {table_name} table or type 'x' to go back to the start menu: \n")
                 print('\n')
                 if choice.isdigit() and 1 <= int(choice) <= 100:
-                    new_value=input("Type in the updated value:")
-                    row_value = row_names[int(choice) - 1]
-                    query = f"UPDATE {table_name} SET {col_name} = '{new_value}' WHERE {col_name} = '{row_value}';"
-                    cursor = connection.cursor()
-                    cursor=cursor.execute(query)
-                    print('\nUPDATED TABLE:\n')
-                    view_table_data(connection, table_name)
-                    time.sleep(2)
-                elif choice =='x':
-                    time.sleep(2)
-                    continue
+                    col_name = column_names[int(choice) - 1]
+                    row_names = column_values(connection, table_name, col_name)
+                    count=0
+                    row_list=[]
+                    for row in row_names:
+                        count=count+1
+                        row_list.append(f"{count}. {row}")
+                    for row in row_list:
+                        print(row)
+                    row_count=len(row_list)
+                    choice = input(f"\nNow select one of the {row_count} rows from the {table_name} table or type 'x' to go back to the start menu: \n")
+                    print('\n')
+                    if choice.isdigit() and 1 <= int(choice) <= 100:
+                        new_value=input("Type in the updated value:")
+                        row_value = row_names[int(choice) - 1]
+                        update_value(connection, table_name, col_name, row_value, new_value)
+                        print('\nUPDATED TABLE:\n')
+                        view_table_data(connection, table_name)
+                        time.sleep(MENU_PAUSE)
+                    elif choice =='x':
+                        time.sleep(MENU_PAUSE)
+                        continue
+                    elif (choice.lower() == 'x' or (choice.isdigit() and 1 <= int(choice) <= count) is not True):
+                        print(f"Invalid choice. Please enter a number between 1 and {count}.")
+                        time.sleep(MENU_PAUSE)
+                        continue
+                    else:
+                        time.sleep(MENU_PAUSE)
+                        break
                 elif (choice.lower() == 'x' or (choice.isdigit() and 1 <= int(choice) <= count) is not True):
                     print(f"Invalid choice. Please enter a number between 1 and {count}.")
-                    time.sleep(2)
+                    time.sleep(MENU_PAUSE)
                     continue
                 else:
-                    time.sleep(2)
+                    time.sleep(MENU_PAUSE)
                     break
+            elif choice =='x':
+                time.sleep(MENU_PAUSE)
+                continue
             elif (choice.lower() == 'x' or (choice.isdigit() and 1 <= int(choice) <= count) is not True):
                 print(f"Invalid choice. Please enter a number between 1 and {count}.")
-                time.sleep(2)
+                time.sleep(MENU_PAUSE)
                 continue
             else:
-                time.sleep(2)
+                time.sleep(MENU_PAUSE)
                 break
-        elif choice =='x':
-            time.sleep(2)
-            continue
-        elif (choice.lower() == 'x' or (choice.isdigit() and 1 <= int(choice) <= count) is not True):
-            print(f"Invalid choice. Please enter a number between 1 and {count}.")
-            time.sleep(2)
-            continue
-        else:
-            time.sleep(2)
-            break
-    elif choice == '5':
-        # SELECT A SPECIFIC TABLE
-        tables=list_all_tables(connection)
-        list_tables=[]
-        count=0
-        for table in tables:
-            count=count+1
-            list_tables.append(f"{count}. {table}")
-        for table in list_tables:
-            print(table)
-        choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
-        if choice.isdigit() and 1 <= int(choice) <= 100:
-            table_name = tables[int(choice) - 1]
-            table=view_table_data(connection, table_name)
-            choice = input(f"\nType '1' to delete a column or '2' to delete a row: \n")
-            if choice=='1':
-                # delete column
-                column = input(f"\nType in the column you want to delete (case sensitive): \n")
-                query = f"ALTER TABLE {table_name} DROP {column};"
-                cursor = connection.cursor()
-                cursor=cursor.execute(query)
-                print('\nUPDATED TABLE:\n')
-                view_table_data(connection, table_name)
-                time.sleep(2)
-            elif choice=='2':
-                # delete row
-                col = input(f"\nType in the value of the column of the row you want to delete (case sensitive): \n")
-                row = input(f"\nType in the value of the row you want to delete (case sensitive): \n")
-                query = f"DELETE FROM {table_name} WHERE {col} = '{row}';"
-                cursor = connection.cursor()
-                cursor=cursor.execute(query)
+        elif choice == '5':
+            # SELECT A SPECIFIC TABLE
+            tables=list_all_tables(connection)
+            list_tables=[]
+            count=0
+            for table in tables:
+                count=count+1
+                list_tables.append(f"{count}. {table}")
+            for table in list_tables:
+                print(table)
+            choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
+            if choice.isdigit() and 1 <= int(choice) <= 100:
+                table_name = tables[int(choice) - 1]
+                table=view_table_data(connection, table_name)
+                choice = input(f"\nType '1' to delete a column or '2' to delete a row: \n")
+                if choice=='1':
+                    # delete column
+                    column = input(f"\nType in the column you want to delete (case sensitive): \n")
+                    try:
+                        drop_column(connection, table_name, column)
+                    except ValueError as e:
+                        print(e)
+                    print('\nUPDATED TABLE:\n')
+                    view_table_data(connection, table_name)
+                    time.sleep(MENU_PAUSE)
+                elif choice=='2':
+                    # delete row
+                    col = input(f"\nType in the value of the column of the row you want to delete (case sensitive): \n")
+                    row = input(f"\nType in the value of the row you want to delete (case sensitive): \n")
+                    try:
+                        delete_rows(connection, table_name, col, row)
+                    except ValueError as e:
+                        print(e)
+                    print('\nUPDATED TABLE:\n')
+                    view_table_data(connection, table_name)
+                    time.sleep(MENU_PAUSE)
+                elif choice =='x':
+                    time.sleep(MENU_PAUSE)
+                    continue
+                else:
+                    print(f"Invalid input, please try again.")
+                    time.sleep(MENU_PAUSE)
+        elif choice == '6':
+            # SELECT A SPECIFIC TABLE
+            tables=list_all_tables(connection)
+            list_tables=[]
+            count=0
+            for table in tables:
+                count=count+1
+                list_tables.append(f"{count}. {table}")
+            for table in list_tables:
+                print(table)
+            choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
+            if choice.isdigit() and 1 <= int(choice) <= 100:
+                table_name = tables[int(choice) - 1]
+                print('Selected table:')
+                table=view_table_data(connection, table_name)
+                table_name = tables[int(choice) - 1]
+                column_names = get_column_names(connection, table_name)
+                values=[]
+                print('\nfor each column insert value\n')
+                for col in column_names:
+                    choice=input(f'{col}:')
+                    values.append(choice)
+                insert_row(connection, table_name, column_names, values)
                 print('\nUPDATED TABLE:\n')
                 view_table_data(connection, table_name)
-                time.sleep(2)
+                time.sleep(MENU_PAUSE)
             elif choice =='x':
-                time.sleep(2)
+                time.sleep(MENU_PAUSE)
                 continue
             else:
                 print(f"Invalid input, please try again.")
-                time.sleep(2)
-    elif choice == '6':
-        # SELECT A SPECIFIC TABLE
-        tables=list_all_tables(connection)
-        list_tables=[]
-        count=0
-        for table in tables:
-            count=count+1
-            list_tables.append(f"{count}. {table}")
-        for table in list_tables:
-            print(table)
-        choice = input(f"\nNow select one of the {count} tables by typing the number of the desired table or type 'x' to go back to the start menu: \n")
-        if choice.isdigit() and 1 <= int(choice) <= 100:
-            table_name = tables[int(choice) - 1]
-            print('Selected table:')
-            table=view_table_data(connection, table_name)
-            table_name = tables[int(choice) - 1]
-            cursor = connection.cursor()
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            col_tuple = tuple(item.replace("'", "") for item in column_names)
-            values=[]
-            print('\nfor each column insert value\n')
-            for col in column_names:
-                choice=input(f'{col}:')
-                values.append(choice)
-            values=tuple(values)
-            query = f"INSERT INTO {table_name} {col_tuple} VALUES {values};"
-            cursor = connection.cursor()
-            cursor=cursor.execute(query)
-            print('\nUPDATED TABLE:\n')
-            view_table_data(connection, table_name)
-            time.sleep(2)
-        elif choice =='x':
-            time.sleep(2)
-            continue
-        else:
-            print(f"Invalid input, please try again.")
-            time.sleep(2)
-    elif choice == '7':
-        table_name="Flight"
-        query = f"SELECT Flight_Number FROM Flight;"
-        cursor = connection.cursor()
-        flight_n=cursor.execute(query)
-        flight_numbers = [row[0] for row in flight_n]
-        count=0
-        flight_numbers_list=[]
-        for f_n in flight_numbers:
-            count=count+1
-            flight_numbers_list.append(f"{count}. {f_n}")
-        for f_n in flight_numbers_list:
-            print(f_n)
-        choice = input(f"\nNow type in the number of the desired flight number (1-n) to get flight duration and passenger count or type 'x' to go back to the start menu: \n")
-        if choice.isdigit() and 1 <= int(choice) <= 100:
-            f_n = flight_numbers[int(choice) - 1]
-            query = f"SELECT Flight_Duration, Passenger_Count FROM Flight WHERE Flight_Number='{f_n}';"
-            # SELECT column1, column2 FROM table1, table2 WHERE column2='value';
-            cursor = connection.cursor()
-            result=cursor.execute(query)
-            for values in result:
-                print(f'Total flight duration: {values[0]}\nTotal passenger count: {values[1]} ')
-            time.sleep(2)
-        elif choice =='x':
-            time.sleep(2)
-            continue
-        else:
-            print(f"Invalid input, please try again.")
-            time.sleep(2)
-    elif choice =='8':
-        choice = input(f"\n Search one of the following (1-3) \n 1. active \n 2. retired \n 3. in maintenance \n or type 'x' to go back to the start menu: \n")
-        if choice=='1':
-            query = f"SELECT Aircraft_Registration_Number, manufacturer FROM Aircraft WHERE Status='Active';"
-            cursor = connection.cursor()
-            result=cursor.execute(query)
-            for r in result:
-                print(r[0])
-            time.sleep(2)
-        elif choice =='2':
-            query = f"SELECT Aircraft_Registration_Number, manufacturer FROM Aircraft WHERE Status='Retired';"
-            cursor = connection.cursor()
-            result=cursor.execute(query)
-            for r in result:
-                print(r[0])
-            time.sleep(2)
-        elif choice =='3':
-            query = f"SELECT Aircraft_Registration_Number, manufacturer FROM Aircraft WHERE Status='Maintenance';"
-            cursor = connection.cursor()
-            result=cursor.execute(query)
-            for r in result:
-                print(r[0])
-            time.sleep(2)
-        elif choice =='x':
-            time.sleep(2)
-            continue
-        else:
-            print(f"Invalid input, please try again.")
-            time.sleep(2)
-    elif choice =='9':
-        choice = input(f"\n Search one of the following (1-2) \n 1. Captain \n 2. Cadet \n or type 'x' to go back to the start menu: \n")
-        if choice =='1':
-            query = f"SELECT First_Name, Last_Name FROM Pilot WHERE Pilot_Ranking='Captain';"
-            cursor = connection.cursor()
-            result=cursor.execute(query)
-            for r in result:
-                print(r[0])
-            time.sleep(2)
-        elif choice =='2':
-            query = f"SELECT First_Name, Last_Name FROM Pilot WHERE Pilot_Ranking='Cadet';"
-            cursor = connection.cursor()
-            result=cursor.execute(query)
-            for r in result:
-                print(r[0])
-            time.sleep(2)
-        elif choice =='x':
-            time.sleep(2)
-            continue
+                time.sleep(MENU_PAUSE)
+        elif choice == '7':
+            table_name="Flight"
+            numbers = flight_numbers(connection)
+            count=0
+            flight_numbers_list=[]
+            for f_n in numbers:
+                count=count+1
+                flight_numbers_list.append(f"{count}. {f_n}")
+            for f_n in flight_numbers_list:
+                print(f_n)
+            choice = input(f"\nNow type in the number of the desired flight number (1-n) to get flight duration and passenger count or type 'x' to go back to the start menu: \n")
+            if choice.isdigit() and 1 <= int(choice) <= 100:
+                f_n = numbers[int(choice) - 1]
+                values = flight_duration_and_passengers(connection, f_n)
+                if values:
+                    print(f'Total flight duration: {values[0]}\nTotal passenger count: {values[1]} ')
+                time.sleep(MENU_PAUSE)
+            elif choice =='x':
+                time.sleep(MENU_PAUSE)
+                continue
+            else:
+                print(f"Invalid input, please try again.")
+                time.sleep(MENU_PAUSE)
+        elif choice =='8':
+            choice = input(f"\n Search one of the following (1-4) \n 1. active \n 2. retired \n 3. in maintenance \n 4. active and free between two times \n or type 'x' to go back to the start menu: \n")
+            if choice=='1':
+                result = aircraft_by_status(connection, 'Active')
+                for r in result:
+                    print(r[0])
+                time.sleep(MENU_PAUSE)
+            elif choice =='2':
+                result = aircraft_by_status(connection, 'Retired')
+                for r in result:
+                    print(r[0])
+                time.sleep(MENU_PAUSE)
+            elif choice =='3':
+                result = aircraft_by_status(connection, 'Maintenance')
+                for r in result:
+                    print(r[0])
+                time.sleep(MENU_PAUSE)
+            elif choice =='4':
+                start = input("Free from (YYYY-MM-DD HH:MM): ")
+                end = input("Free until (YYYY-MM-DD HH:MM): ")
+                airport = input("At airport (airport code, or leave empty for any airport): ")
+                try:
+                    result = available_aircraft(connection, start, end, airport or None)
+                    for r in result:
+                        print(f"{r[0]} ({r[1]} seats)")
+                    if not result:
+                        print("No aircraft is free in that window.")
+                except ValueError as e:
+                    print(e)
+                time.sleep(MENU_PAUSE)
+            elif choice =='x':
+                time.sleep(MENU_PAUSE)
+                continue
+            else:
+                print(f"Invalid input, please try again.")
+                time.sleep(MENU_PAUSE)
+        elif choice =='9':
+            choice = input(f"\n Search one of the following (1-2) \n 1. Captain \n 2. Cadet \n or type 'x' to go back to the start menu: \n")
+            if choice =='1':
+                result = pilots_by_rank(connection, 'Captain')
+                for r in result:
+                    print(r[0])
+                time.sleep(MENU_PAUSE)
+            elif choice =='2':
+                result = pilots_by_rank(connection, 'Cadet')
+                for r in result:
+                    print(r[0])
+                time.sleep(MENU_PAUSE)
+            elif choice =='x':
+                time.sleep(MENU_PAUSE)
+                continue
+            else:
+                print(f"Invalid input, please try again.")
+                time.sleep(MENU_PAUSE)
+        elif choice =='10':
+            print(query_stats.report())
+            cache_stats = get_result_cache(connection).stats()
+            print(f"\nResult cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                  f"{cache_stats['evictions']} evictions, {cache_stats['invalidations']} invalidations, "
+                  f"{cache_stats['entries']} entries")
+            for entry in query_stats.slow_queries:
+                print(f"\nSLOW ({entry['ms']:.1f} ms): {entry['sql']}")
+                for line in entry['plan']:
+                    print(f"    {line}")
+            time.sleep(MENU_PAUSE)
+        elif choice =='11':
+            time.sleep(MENU_PAUSE)
+            break
         else:
-            print(f"Invalid input, please try again.")
-            time.sleep(2)
-    elif choice =='10':
-        time.sleep(2)
-        break
-    else:
-        print("Invalid choice. Please enter a number between 1 and 10.")
-        time.sleep(2)
-
-# Close the connection
-if connection:
+            print("Invalid choice. Please enter a number between 1 and 11.")
+            time.sleep(MENU_PAUSE)
+
+def main():
+    # Database file
+    database_file = "aircraft_management_system_db.db"
+    query_stats.slow_log_path = "slow_queries.log"
+
+    # Create a connection to the database
+    connection = make_connection(database_file)
+    if connection is None:
+        return
+    initialise_database(connection)
+    attach_history(connection)
+    run_menu(connection)
+
+    # Close the connection
+    forget_archive(connection)
+    forget_catalog(connection)
+    forget_connection(connection)
     connection.close()
-    print("Connection closed")
\ No newline at end of file
+    print("Connection closed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+""" Fleet analytics over columnar NumPy snapshots of Flight and Aircraft.
+
+FleetSnapshot.from_database pulls Flight (and the seat capacities of
+Aircraft) in one bulk fetch into typed arrays: registrations and airport
+codes dictionary encoded as int32 codes, datetimes as epoch seconds (int64,
+-1 when missing), passengers and durations as float64 (NaN when missing).
+The analytics below are then group-bys (bincount) and sorts over those
+arrays, with no Python loop per flight:
+- load_factor: Passenger_Count / Seat_Capacity per aircraft, route or airport,
+- utilisation: airborne hours per aircraft in a time window,
+- duration_percentiles: Flight_Duration percentiles overall or per group.
+
+refresh() reloads the small Aircraft table and brings the flights up to
+date. With the change log (changelog.py) logging Flight, it appends the
+flights inserted since the last refresh, and reloads every flight when one
+was updated or deleted. Without it, every flight is reloaded whenever the
+database changed (PRAGMA data_version for other connections' commits, the
+connection's total_changes for its own), and nothing is read otherwise.
+Rowids are not used: a rowid freed by a delete can be given to a new row.
+
+NumPy is an optional dependency: only this module needs it. """
+import calendar
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from changelog import complete_since, has_change_log, is_logged, last_sequence
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+# max number of flight numbers bound into one "IN (...)" fetch of inserted flights
+FETCH_CHUNK = 500
+
+_flight_query = """ SELECT Aircraft_Registration_Number, Departure_Airport_Code, Arrival_Airport_Code,
+    COALESCE(CAST(strftime('%s', Departure_Date_Time) AS INTEGER), -1),
+    COALESCE(CAST(strftime('%s', Arrival_Date_Time) AS INTEGER), -1),
+    Passenger_Count, Flight_Duration
+FROM Flight"""
+
+_groups = ("aircraft", "route", "departure_airport", "arrival_airport")
+
+
+def _epoch(text):
+    """ Epoch seconds of 'YYYY-MM-DD[ HH:MM[:SS]]', read as UTC like SQLite's strftime('%s'). """
+    for pattern in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(text, pattern))
+        except ValueError:
+            pass
+    raise ValueError(f"Not a date: {text!r} (expected YYYY-MM-DD[ HH:MM[:SS]])")
+
+
+class FleetSnapshot:
+    """ Columnar copy of Flight (and Aircraft seat capacities) for vectorized analytics.
+
+    Variables:
+    seq (int): change log Seq the flights are up to date with, None without the change log
+    registrations (list): aircraft registration of each aircraft code
+    airports (list): airport code of each airport code number
+    columns (dict): name -> numpy array, one entry per flight """
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("analytics needs NumPy (pip install numpy)")
+        self.seq = None
+        self._version = None
+        self.registrations, self._registration_codes = [], {}
+        self.airports, self._airport_codes = [], {}
+        self.seat_capacity = numpy.empty(0)
+        self.columns = {
+            "aircraft": numpy.empty(0, numpy.int32),
+            "departure_airport": numpy.empty(0, numpy.int32),
+            "arrival_airport": numpy.empty(0, numpy.int32),
+            "departure": numpy.empty(0, numpy.int64),
+            "arrival": numpy.empty(0, numpy.int64),
+            "passengers": numpy.empty(0),
+            "duration": numpy.empty(0),
+        }
+
+    @classmethod
+    def from_database(cls, connection):
+        """ Builds the snapshot of the current Flight and Aircraft tables. """
+        snapshot = cls()
+        snapshot.refresh(connection)
+        return snapshot
+
+    def __len__(self):
+        return len(self.columns["aircraft"])
+
+    def _code(self, codes, values, value):
+        """ Dictionary code of value, added if new. """
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def refresh(self, connection, full=False):
+        """ Brings the flights up to date and reloads the seat capacities, in one read transaction.
+
+        Variables:
+        connection: connection to the database
+        full: reload every flight
+
+        Returns:
+        added: number of flights read """
+        own_transaction = not connection.in_transaction
+        if own_transaction:
+            connection.execute("BEGIN;")
+        try:
+            added = self._refresh_flights(connection, full)
+            self._load_seat_capacity(connection)
+        finally:
+            if own_transaction:
+                connection.rollback()
+        return added
+
+    def _refresh_flights(self, connection, full):
+        """ Appends the inserted flights, or reloads them all when that cannot be done. """
+        cursor = connection.cursor()
+        version = (id(connection), cursor.execute("PRAGMA data_version;").fetchone()[0], connection.total_changes)
+        logged = has_change_log(connection) and is_logged(connection, "Flight")
+        seq = last_sequence(connection) if logged else None
+
+        inserted = None
+        if not full and logged and self.seq is not None and complete_since(connection, self.seq):
+            changes = cursor.execute("SELECT Op, Row_Key FROM _Change_Log WHERE Table_Name = 'Flight' AND Seq > ?;",
+                                     (self.seq,)).fetchall()
+            keys = [row_key for _, row_key in changes]
+            # a key inserted twice was replaced (INSERT OR REPLACE logs no delete)
+            if all(op == "insert" for op, _ in changes) and len(set(keys)) == len(keys):
+                inserted = keys
+        elif not full and not logged and version == self._version:
+            inserted = []
+
+        rows = []
+        if inserted is None:
+            self.__init__()
+            rows = cursor.execute(_flight_query + ";").fetchall()
+        else:
+            for start in range(0, len(inserted), FETCH_CHUNK):
+                chunk = inserted[start:start + FETCH_CHUNK]
+                rows += cursor.execute(f"{_flight_query} WHERE Flight_Number IN ({', '.join('?' * len(chunk))});",
+                                       chunk).fetchall()
+        self._append(rows)
+        self.seq, self._version = seq, version
+        return len(rows)
+
+    def _append(self, rows):
+        """ Adds flight rows (in _flight_query column order) to the arrays. """
+        if not rows:
+            return
+        aircraft, departure_airport, arrival_airport, departure, arrival, passengers, duration = zip(*rows)
+        registration_code = self._registration_codes
+        airport_code = self._airport_codes
+        new = {
+            "aircraft": numpy.array([self._code(registration_code, self.registrations, value)
+                                     for value in aircraft], numpy.int32),
+            "departure_airport": numpy.array([self._code(airport_code, self.airports, value)
+                                              for value in departure_airport], numpy.int32),
+            "arrival_airport": numpy.array([self._code(airport_code, self.airports, value)
+                                            for value in arrival_airport], numpy.int32),
+            "departure": numpy.array(departure, numpy.int64),
+            "arrival": numpy.array(arrival, numpy.int64),
+            # None becomes NaN
+            "passengers": numpy.array(passengers, numpy.float64),
+            "duration": numpy.array(duration, numpy.float64),
+        }
+        for name, values in new.items():
+            self.columns[name] = numpy.concatenate((self.columns[name], values))
+
+    def _load_seat_capacity(self, connection):
+        """ Reloads the seat capacity of every aircraft. """
+        capacities = connection.execute("SELECT Aircraft_Registration_Number, Seat_Capacity FROM Aircraft;").fetchall()
+        for registration, _ in capacities:
+            self._code(self._registration_codes, self.registrations, registration)
+        self.seat_capacity = numpy.full(len(self.registrations), numpy.nan)
+        for registration, seats in capacities:
+            if seats is not None:
+                self.seat_capacity[self._registration_codes[registration]] = seats
+
+    def _group_codes(self, group):
+        """ (group code of each flight, key of each group code) for a grouping. """
+        if group == "aircraft":
+            return self.columns["aircraft"], self.registrations
+        if group in ("departure_airport", "arrival_airport"):
+            return self.columns[group], self.airports
+        if group == "route":
+            # number the routes flown (not every airport pair, which can be ~300M)
+            count = len(self.airports)
+            pairs = self.columns["departure_airport"].astype(numpy.int64) * count + self.columns["arrival_airport"]
+            routes, codes = numpy.unique(pairs, return_inverse=True)
+            return codes.reshape(-1), [(self.airports[route // count], self.airports[route % count])
+                                       for route in routes.tolist()]
+        raise ValueError(f"Unknown group: {group!r} (expected one of {', '.join(_groups)})")
+
+    def load_factor(self, group="aircraft"):
+        """ Passengers / seats offered per group, over the flights with a passenger count and a known capacity.
+
+        Returns:
+        stats: list of dicts (Key, Flights, Passengers, Seats, Load_Factor) sorted by key """
+        seats = self.seat_capacity[self.columns["aircraft"]] if len(self.seat_capacity) else numpy.empty(0)
+        passengers = self.columns["passengers"]
+        counted = ~numpy.isnan(passengers) & ~numpy.isnan(seats)
+        codes, keys = self._group_codes(group)
+        codes = codes[counted]
+        flights = numpy.bincount(codes, minlength=len(keys)).tolist()
+        passenger_totals = numpy.bincount(codes, weights=passengers[counted], minlength=len(keys)).tolist()
+        seat_totals = numpy.bincount(codes, weights=seats[counted], minlength=len(keys)).tolist()
+        stats = [{"Key": key, "Flights": count, "Passengers": passenger_total, "Seats": seat_total,
+                  "Load_Factor": passenger_total / seat_total if seat_total else None}
+                 for key, count, passenger_total, seat_total in zip(keys, flights, passenger_totals, seat_totals)
+                 if count]
+        return sorted(stats, key=lambda group_stats: group_stats["Key"])
+
+    def utilisation(self, start=None, end=None):
+        """ Airborne hours per aircraft between start and end ('YYYY-MM-DD[ HH:MM[:SS]]'),
+        flights cut at the window edges.
+
+        Returns:
+        stats: list of dicts (Aircraft_Registration_Number, Flights, Hours, Utilisation), Utilisation
+        being the share of the window spent airborne (None without a window) """
+        departure, arrival = self.columns["departure"], self.columns["arrival"]
+        timed = (departure >= 0) & (arrival > departure)
+        window_start = _epoch(start) if start else None
+        window_end = _epoch(end) if end else None
+        begin = departure if window_start is None else numpy.maximum(departure, window_start)
+        finish = arrival if window_end is None else numpy.minimum(arrival, window_end)
+        inside = timed & (finish > begin)
+        codes = self.columns["aircraft"][inside]
+        size = len(self.registrations)
+        flights = numpy.bincount(codes, minlength=size).tolist()
+        hours = numpy.bincount(codes, weights=(finish - begin)[inside] / 3600.0, minlength=size).tolist()
+        window_hours = (window_end - window_start) / 3600.0 if window_start is not None and window_end is not None \
+            else None
+        stats = [{"Aircraft_Registration_Number": registration, "Flights": count, "Hours": airborne,
+                  "Utilisation": airborne / window_hours if window_hours else None}
+                 for registration, count, airborne in zip(self.registrations, flights, hours)]
+        return sorted(stats, key=lambda aircraft: aircraft["Aircraft_Registration_Number"])
+
+    def duration_percentiles(self, group=None, percentiles=DEFAULT_PERCENTILES):
+        """ Flight_Duration percentiles (linear interpolation), overall or per group.
+
+        Returns:
+        stats: list of dicts (Key, Flights, P50, P90, ...) sorted by key; one dict with Key None overall """
+        duration = self.columns["duration"]
+        known = ~numpy.isnan(duration)
+        fractions = numpy.asarray(percentiles, numpy.float64) / 100.0
+        names = [f"P{percentile:g}" for percentile in percentiles]
+        if group is None:
+            values = duration[known]
+            if not len(values):
+                return []
+            row = {"Key": None, "Flights": len(values)}
+            row.update(zip(names, numpy.percentile(values, percentiles).tolist()))
+            return [row]
+
+        codes, keys = self._group_codes(group)
+        codes, values = codes[known], duration[known]
+        # sort by group then duration: each group is a sorted run
+        order = numpy.lexsort((values, codes))
+        codes, values = codes[order], values[order]
+        run_codes, starts, counts = numpy.unique(codes, return_index=True, return_counts=True)
+        positions = starts[:, None] + fractions[None, :] * (counts[:, None] - 1)
+        below = numpy.floor(positions).astype(numpy.int64)
+        above = numpy.minimum(below + 1, (starts + counts - 1)[:, None])
+        weight = positions - below
+        result = values[below] * (1 - weight) + values[above] * weight
+        stats = []
+        for code, count, values in zip(run_codes.tolist(), counts.tolist(), result.tolist()):
+            row = {"Key": keys[code], "Flights": count}
+            row.update(zip(names, values))
+            stats.append(row)
+        return sorted(stats, key=lambda group_stats: group_stats["Key"])
@@ -0,0 +1,363 @@
+""" Monthly archive of old flights, with memory-mapped columns for history queries.
+
+archive_flights moves the flights that departed before a cutoff out of the
+live Flight table into one SQLite file per month (archive/flights_YYYY_MM.db,
+same Flight table), together with their Pilot_Flight and Aircraft_Flight
+rows, so the live database only holds the active window. The delete runs
+through the Flight triggers, so the search index, the time R*Tree and the
+_Stats_ tables then cover the live window only.
+
+Next to each month file the month is also exported as columns
+(archive/flights_YYYY_MM/<column>.npy, airports and aircraft dictionary
+encoded, times in epoch minutes). The .npy files are written with the
+standard library, and read memory-mapped: as NumPy arrays when NumPy is
+installed (the aggregates are then vectorized with bincount), or as
+memoryviews over mmap otherwise.
+
+attach_archive attaches the month files to a connection and creates a TEMP
+view over the live and archived flights (Flight_History by default). The
+menu and the command line attach the archive when it exists, and the flight
+lookups of menu option 7 then read Flight_History (flight_source). Passing
+view_name='Flight' shadows the live table for that connection, so existing
+'SELECT * FROM Flight' reports see the whole history; writes, and the rowid
+paging of the viewer, need the real table, so only do that on a read-only
+reporting connection. """
+import glob
+import json
+import mmap
+import os
+import re
+import sqlite3
+import sys
+from array import array
+
+from cache import invalidate
+from schema import aircraft_flight_table, flight_table, get_catalog, pilot_flight_table
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_ARCHIVE_DIRECTORY = "archive"
+
+# tables of a month file, and the tables whose rows follow their flight into it
+_archive_tables = {"Flight": flight_table, "Pilot_Flight": pilot_flight_table,
+                   "Aircraft_Flight": aircraft_flight_table}
+_link_tables = ("Pilot_Flight", "Aircraft_Flight")
+
+# connection id -> (connection, directory, view name) of the connections with the archive attached
+_attached = {}
+
+_month_file = re.compile(r"flights_(\d{4})_(\d{2})\.db$")
+_month_schema = re.compile(r"archive_(\d{4})_(\d{2})")
+
+# column file -> (array typecode, .npy dtype, value used for NULL)
+_column_types = {
+    "aircraft": ("i", "<i4", -1),
+    "departure_airport": ("i", "<i4", -1),
+    "arrival_airport": ("i", "<i4", -1),
+    "departure_minute": ("q", "<i8", -1),
+    "arrival_minute": ("q", "<i8", -1),
+    "passengers": ("i", "<i4", -1),
+    "duration": ("d", "<f8", float("nan")),
+}
+
+_export_query = """ SELECT Aircraft_Registration_Number, Departure_Airport_Code, Arrival_Airport_Code,
+    CAST(strftime('%s', Departure_Date_Time) AS INTEGER) / 60,
+    CAST(strftime('%s', Arrival_Date_Time) AS INTEGER) / 60,
+    Passenger_Count, Flight_Duration
+FROM Flight ORDER BY Departure_Date_Time; """
+
+
+def month_path(directory, month):
+    """ Archive file of a month ('YYYY-MM'). """
+    return os.path.join(directory, f"flights_{month.replace('-', '_')}.db")
+
+
+def archived_months(directory=DEFAULT_ARCHIVE_DIRECTORY):
+    """ Months ('YYYY-MM') with an archive file, oldest first. """
+    months = []
+    for path in glob.glob(os.path.join(directory, "flights_*.db")):
+        match = _month_file.search(path)
+        if match:
+            months.append(f"{match.group(1)}-{match.group(2)}")
+    return sorted(months)
+
+
+def _columns(connection, schema_name, table_name):
+    """ Column names of a table of an attached database, in order. """
+    return [row[1] for row in connection.execute(f"PRAGMA {schema_name}.table_info({table_name});").fetchall()]
+
+
+def _archived_copy(connection, table_name):
+    """ Condition that the archive_month copy of a main row is identical (IS also matches NULLs). """
+    same = " AND ".join(f"archived.{column} IS {table_name}.{column}"
+                        for column in get_catalog(connection).column_names(table_name))
+    return f"EXISTS (SELECT 1 FROM archive_month.{table_name} AS archived WHERE {same})"
+
+
+def archive_flights(connection, cutoff, directory=DEFAULT_ARCHIVE_DIRECTORY, export=True):
+    """ Moves the flights departing before cutoff, with their Pilot_Flight and
+    Aircraft_Flight rows, into the monthly archive files.
+
+    A transaction spanning an attached file is not atomic across the two
+    files in WAL mode, so each month takes two: the rows are copied (INSERT OR
+    REPLACE, so a retried run is harmless) and the month file committed, then
+    the rows whose archived copy is identical are deleted from the live
+    tables. A crash in between leaves the rows in both places (the next run
+    finishes the move); a flight changed in between stays live until the next
+    run.
+
+    Variables:
+    connection: connection to the database
+    cutoff: 'YYYY-MM-DD[ HH:MM:SS]', flights departing before it are archived
+    directory: directory of the archive files
+    export: also write the .npy columns of every month that changed
+
+    Returns:
+    moved: dict month -> number of flights archived """
+    os.makedirs(directory, exist_ok=True)
+    cursor = connection.cursor()
+    cursor.execute("SELECT DISTINCT strftime('%Y-%m', Departure_Date_Time) FROM main.Flight "
+                   "WHERE Departure_Date_Time < ? ORDER BY 1;", (cutoff,))
+    months = [row[0] for row in cursor.fetchall() if row[0] is not None]
+    moved = {}
+    connection.commit()
+    where = "Departure_Date_Time < ? AND strftime('%Y-%m', Departure_Date_Time) = ?"
+    archived_flights = "Flight_Number IN (SELECT Flight_Number FROM archive_month.Flight)"
+    for month in months:
+        cursor.execute("ATTACH DATABASE ? AS archive_month;", (month_path(directory, month),))
+        try:
+            for table_name, table_query in _archive_tables.items():
+                cursor.execute(table_query.replace(f"EXISTS {table_name} ", f"EXISTS archive_month.{table_name} "))
+            # 1. copy into the month file and commit it
+            cursor.execute("BEGIN;")
+            # by column name: the month file keeps a column dropped from the live table since
+            columns = {table_name: ", ".join(_columns(connection, "main", table_name)) for table_name in _archive_tables}
+            cursor.execute(f"INSERT OR REPLACE INTO archive_month.Flight ({columns['Flight']}) "
+                           f"SELECT {columns['Flight']} FROM main.Flight WHERE {where};", (cutoff, month))
+            for table_name in _link_tables:
+                cursor.execute(f"INSERT OR REPLACE INTO archive_month.{table_name} ({columns[table_name]}) "
+                               f"SELECT {columns[table_name]} FROM main.{table_name} WHERE {archived_flights};")
+            connection.commit()
+            # 2. delete from the live tables what the month file holds
+            cursor.execute("BEGIN;")
+            cursor.execute(f"DELETE FROM main.Flight WHERE {where} AND {_archived_copy(connection, 'Flight')};",
+                           (cutoff, month))
+            moved[month] = cursor.rowcount
+            for table_name in _link_tables:
+                cursor.execute(f"DELETE FROM main.{table_name} WHERE {archived_flights} "
+                               f"AND Flight_Number NOT IN (SELECT Flight_Number FROM main.Flight) "
+                               f"AND {_archived_copy(connection, table_name)};")
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.execute("DETACH DATABASE archive_month;")
+        if export:
+            export_columns(directory, month)
+    for table_name in _archive_tables:
+        invalidate(connection, table_name)
+    attached = _attached.get(id(connection))
+    if moved and attached is not None:
+        # the new months join the history view
+        attach_archive(connection, attached[1], attached[2])
+    return moved
+
+
+def _write_npy(path, typecode, dtype, values):
+    """ Writes an array as a version 1.0 .npy file (readable by numpy.load). """
+    data = array(typecode, values)
+    if sys.byteorder != "little":
+        data.byteswap()
+    header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': ({len(data)},), }}"
+    # the magic, version, length and header are padded to a multiple of 64 bytes, ending with \n
+    header += " " * (63 - (10 + len(header)) % 64) + "\n"
+    with open(path, "wb") as npy:
+        npy.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        data.tofile(npy)
+
+
+def read_column(path):
+    """ Memory-maps a 1-D .npy column: a NumPy array if NumPy is installed, else a memoryview. """
+    if numpy is not None:
+        return numpy.load(path, mmap_mode="r")
+    with open(path, "rb") as npy:
+        mapped = mmap.mmap(npy.fileno(), 0, access=mmap.ACCESS_READ)
+    header_length = int.from_bytes(mapped[8:10], "little")
+    header = mapped[10:10 + header_length].decode("latin1")
+    typecode = next(code for code, dtype, _ in _column_types.values() if f"'{dtype}'" in header)
+    return memoryview(mapped)[10 + header_length:].cast(typecode)
+
+
+def export_columns(directory, month):
+    """ Writes the columns of one archived month (and its dictionaries) as .npy files.
+
+    Returns:
+    rows: number of flights exported """
+    source = sqlite3.connect(month_path(directory, month))
+    try:
+        rows = source.execute(_export_query).fetchall()
+    finally:
+        source.close()
+    dictionaries = {"aircraft": {}, "airport": {}}
+
+    def code(kind, value):
+        if value is None:
+            return -1
+        return dictionaries[kind].setdefault(value, len(dictionaries[kind]))
+
+    columns = {name: [] for name in _column_types}
+    for aircraft, departure_airport, arrival_airport, departure, arrival, passengers, duration in rows:
+        columns["aircraft"].append(code("aircraft", aircraft))
+        columns["departure_airport"].append(code("airport", departure_airport))
+        columns["arrival_airport"].append(code("airport", arrival_airport))
+        columns["departure_minute"].append(-1 if departure is None else departure)
+        columns["arrival_minute"].append(-1 if arrival is None else arrival)
+        columns["passengers"].append(-1 if passengers is None else int(passengers))
+        columns["duration"].append(float("nan") if duration is None else float(duration))
+
+    month_directory = os.path.join(directory, f"flights_{month.replace('-', '_')}")
+    os.makedirs(month_directory, exist_ok=True)
+    for name, (typecode, dtype, _) in _column_types.items():
+        _write_npy(os.path.join(month_directory, f"{name}.npy"), typecode, dtype, columns[name])
+    with open(os.path.join(month_directory, "dictionaries.json"), "w") as dictionary_file:
+        json.dump({kind: list(values) for kind, values in dictionaries.items()}, dictionary_file)
+    return len(rows)
+
+
+def _month_totals(month_directory):
+    """ (aircraft names, flights, passengers, block hours per aircraft code) of one exported month. """
+    with open(os.path.join(month_directory, "dictionaries.json")) as dictionary_file:
+        names = json.load(dictionary_file)["aircraft"]
+    aircraft = read_column(os.path.join(month_directory, "aircraft.npy"))
+    passengers = read_column(os.path.join(month_directory, "passengers.npy"))
+    duration = read_column(os.path.join(month_directory, "duration.npy"))
+    if numpy is not None:
+        known = aircraft >= 0
+        codes = aircraft[known]
+        flights = numpy.bincount(codes, minlength=len(names))
+        seats_taken = numpy.bincount(codes, weights=numpy.maximum(passengers[known], 0), minlength=len(names))
+        hours = numpy.bincount(codes, weights=numpy.nan_to_num(duration[known]), minlength=len(names))
+        return names, flights.tolist(), seats_taken.tolist(), hours.tolist()
+    flights, seats_taken, hours = [0] * len(names), [0] * len(names), [0.0] * len(names)
+    for code, count, length in zip(aircraft, passengers, duration):
+        if code >= 0:
+            flights[code] += 1
+            seats_taken[code] += max(count, 0)
+            hours[code] += 0.0 if length != length else length
+    return names, flights, seats_taken, hours
+
+
+def aircraft_history(directory=DEFAULT_ARCHIVE_DIRECTORY, first_month=None, last_month=None):
+    """ Flights, passengers and block hours per aircraft over the archived months,
+    computed from the memory-mapped columns.
+
+    Variables:
+    directory: directory of the archive files
+    first_month, last_month: 'YYYY-MM' bounds (both included), None for no bound
+
+    Returns:
+    stats: list of dicts, one per aircraft, like stats.stats_by_aircraft """
+    totals = {}
+    for month in archived_months(directory):
+        if (first_month and month < first_month) or (last_month and month > last_month):
+            continue
+        month_directory = os.path.join(directory, f"flights_{month.replace('-', '_')}")
+        if not os.path.exists(os.path.join(month_directory, "dictionaries.json")):
+            export_columns(directory, month)
+        for name, flights, passengers, hours in zip(*_month_totals(month_directory)):
+            group = totals.setdefault(name, {"Aircraft_Registration_Number": name, "Flights": 0,
+                                             "Passengers": 0, "Block_Hours": 0.0})
+            group["Flights"] += int(flights)
+            group["Passengers"] += int(passengers)
+            group["Block_Hours"] += float(hours)
+    return [totals[name] for name in sorted(totals)]
+
+
+def attach_archive(connection, directory=DEFAULT_ARCHIVE_DIRECTORY, view_name="Flight_History", months=None):
+    """ Attaches the archive files and creates a TEMP view over live and archived flights.
+
+    Variables:
+    connection: connection to the database
+    directory: directory of the archive files
+    view_name: name of the view ('Flight' shadows the live table, read-only connections only)
+    months: months to attach ('YYYY-MM'), all by default
+
+    Returns:
+    months: the months attached
+
+    Raises:
+    ValueError: if there are more months than SQLite can attach (one attachment
+    is kept free for archive_flights) """
+    months = archived_months(directory) if months is None else sorted(months)
+    limit = connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - 1
+    if len(months) > limit:
+        raise ValueError(f"{len(months)} archived months but at most {limit} can be attached; pass months=")
+    attached = {row[1] for row in connection.execute("PRAGMA database_list;").fetchall()}
+    # the live columns, by name: a month archived before a column was dropped still has it
+    columns = _columns(connection, "main", "Flight")
+    selects = [f"SELECT {', '.join(columns)} FROM main.Flight"]
+    for month in months:
+        schema_name = f"archive_{month.replace('-', '_')}"
+        if schema_name not in attached:
+            connection.execute("ATTACH DATABASE ? AS " + schema_name + ";", (month_path(directory, month),))
+        archived = set(_columns(connection, schema_name, "Flight"))
+        selects.append(f"SELECT {', '.join(column if column in archived else f'NULL AS {column}' for column in columns)} "
+                       f"FROM {schema_name}.Flight")
+    connection.execute(f"DROP VIEW IF EXISTS temp.{view_name};")
+    connection.execute(f"CREATE TEMP VIEW {view_name} AS {' UNION ALL '.join(selects)};")
+    _attached[id(connection)] = (connection, directory, view_name)
+    return months
+
+
+def attach_history(connection, directory=DEFAULT_ARCHIVE_DIRECTORY):
+    """ Attaches the archive as Flight_History if it has any month (at start up).
+
+    Returns:
+    months: the months attached """
+    if not archived_months(directory):
+        return []
+    try:
+        return attach_archive(connection, directory)
+    except (sqlite3.Error, ValueError) as e:
+        print(e)
+        return []
+
+
+def drop_history_view(connection):
+    """ Drops the history view of a connection before ALTER TABLE changes the
+    columns of Flight (SQLite checks every view, TEMP ones included, and a
+    UNION ALL whose sides stop matching fails the ALTER); rebuild_history_view
+    creates it again. """
+    attached = _attached.get(id(connection))
+    if attached is not None:
+        connection.execute(f"DROP VIEW IF EXISTS temp.{attached[2]};")
+
+
+def rebuild_history_view(connection):
+    """ Creates the history view again, over the current columns of Flight. """
+    attached = _attached.get(id(connection))
+    if attached is None:
+        return
+    # the months attached now, so a view built with months= keeps them
+    months = [f"{match.group(1)}-{match.group(2)}" for match in
+              (_month_schema.fullmatch(row[1]) for row in connection.execute("PRAGMA database_list;").fetchall())
+              if match]
+    try:
+        attach_archive(connection, attached[1], attached[2], months)
+    except (sqlite3.Error, ValueError) as e:
+        print(e)
+
+
+def flight_source(connection):
+    """ Name flight lookups read: the history view if attach_archive created one, else Flight. """
+    attached = _attached.get(id(connection))
+    return "Flight" if attached is None or attached[2] == "Flight" else attached[2]
+
+
+def forget_archive(connection):
+    """ Forgets the archive of a connection that is being closed. """
+    _attached.pop(id(connection), None)
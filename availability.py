@@ -0,0 +1,140 @@
+""" Which active aircraft are free between two times (and where they are).
+
+The scheduled time range of every flight is kept in _Flight_Times, an R*Tree
+virtual table (rtree_i32) over [departure, arrival] in minutes since the
+epoch, maintained by triggers on Flight. The aircraft busy in a window are
+found with one R*Tree range query instead of a scan of Flight, and the
+remaining active aircraft come from the partial Aircraft_Active index.
+
+An entry is found again by its times and Flight_Number (an R*Tree lookup on
+both times), not by the rowid of its flight: Flight has a VARCHAR primary
+key, so VACUUM may renumber its rowids. """
+import calendar
+from datetime import datetime
+from sqlite3 import Error
+
+from schema import get_catalog
+
+flight_times_table = """ CREATE VIRTUAL TABLE IF NOT EXISTS _Flight_Times USING rtree_i32(
+    Id,
+    Start_Time, End_Time,
+    +Aircraft_Registration_Number,
+    +Flight_Number ); """
+
+# minutes since the epoch of a Flight datetime column ('NEW.' or 'OLD.' row)
+_minutes = "CAST(strftime('%s', {0}{1}) AS INTEGER) / 60"
+
+_insert_new = f""" INSERT INTO _Flight_Times (Start_Time, End_Time, Aircraft_Registration_Number, Flight_Number)
+            SELECT {_minutes.format('NEW.', 'Departure_Date_Time')}, {_minutes.format('NEW.', 'Arrival_Date_Time')},
+                NEW.Aircraft_Registration_Number, NEW.Flight_Number
+            WHERE {_minutes.format('NEW.', 'Departure_Date_Time')} <= {_minutes.format('NEW.', 'Arrival_Date_Time')}; """
+
+_delete_old = f""" DELETE FROM _Flight_Times WHERE Id IN (SELECT Id FROM _Flight_Times
+                WHERE Start_Time = {_minutes.format('OLD.', 'Departure_Date_Time')}
+                    AND End_Time = {_minutes.format('OLD.', 'Arrival_Date_Time')}
+                    AND Flight_Number = OLD.Flight_Number); """
+
+flight_times_triggers = [
+    f""" CREATE TRIGGER IF NOT EXISTS _Flight_Times_Insert AFTER INSERT ON Flight
+        BEGIN
+            {_insert_new}
+        END; """,
+    f""" CREATE TRIGGER IF NOT EXISTS _Flight_Times_Update
+        AFTER UPDATE OF Flight_Number, Aircraft_Registration_Number, Departure_Date_Time, Arrival_Date_Time ON Flight
+        BEGIN
+            {_delete_old}
+            {_insert_new}
+        END; """,
+    f""" CREATE TRIGGER IF NOT EXISTS _Flight_Times_Delete AFTER DELETE ON Flight
+        BEGIN
+            {_delete_old}
+        END; """,
+]
+
+# flights with no times, or that arrive before they depart, are left out of the tree
+backfill_flight_times = """ INSERT INTO _Flight_Times (Start_Time, End_Time, Aircraft_Registration_Number, Flight_Number)
+SELECT Start_Time, End_Time, Aircraft_Registration_Number, Flight_Number FROM (
+    SELECT Aircraft_Registration_Number, Flight_Number,
+        CAST(strftime('%s', Departure_Date_Time) AS INTEGER) / 60 AS Start_Time,
+        CAST(strftime('%s', Arrival_Date_Time) AS INTEGER) / 60 AS End_Time
+    FROM Flight)
+WHERE Start_Time <= End_Time; """
+
+available_aircraft_query = """ SELECT Aircraft_Registration_Number, Seat_Capacity FROM Aircraft
+WHERE Status = 'Active' AND COALESCE(Seat_Capacity, 0) >= ?
+    AND Aircraft_Registration_Number NOT IN (
+        SELECT Aircraft_Registration_Number FROM _Flight_Times WHERE Start_Time < ? AND End_Time > ?)
+ORDER BY Aircraft_Registration_Number; """
+
+available_aircraft_at_query = """ SELECT Aircraft_Registration_Number, Seat_Capacity FROM Aircraft
+WHERE Status = 'Active' AND COALESCE(Seat_Capacity, 0) >= ?
+    AND Aircraft_Registration_Number NOT IN (
+        SELECT Aircraft_Registration_Number FROM _Flight_Times WHERE Start_Time < ? AND End_Time > ?)
+    AND (SELECT Arrival_Airport_Code FROM Flight
+         WHERE Flight.Aircraft_Registration_Number = Aircraft.Aircraft_Registration_Number
+            AND Departure_Date_Time <= ?
+         ORDER BY Departure_Date_Time DESC LIMIT 1) = ?
+ORDER BY Aircraft_Registration_Number; """
+
+
+def to_minutes(value):
+    """ Converts a datetime or a 'YYYY-MM-DD HH:MM[:SS]' string to minutes since the epoch (UTC). """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return calendar.timegm(value.timetuple()) // 60
+
+
+def _to_text(value):
+    """ Formats a datetime like the Flight datetime columns ('YYYY-MM-DD HH:MM:SS'). """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_availability_index(connection):
+    """ Creates the flight time R*Tree and its triggers, backfilling it on first use.
+
+    Variables:
+    connection: connection to the database """
+    try:
+        catalog = get_catalog(connection)
+        is_new = not catalog.has_table("_Flight_Times")
+        cursor = connection.cursor()
+        if not is_new and "Flight_Number" not in catalog.column_names("_Flight_Times"):
+            # built before the entries carried their Flight_Number (they were keyed by Flight rowid)
+            for event in ("Insert", "Update", "Delete"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS _Flight_Times_{event};")
+            cursor.execute("DROP TABLE _Flight_Times;")
+            is_new = True
+        cursor.execute(flight_times_table)
+        for trigger in flight_times_triggers:
+            cursor.execute(trigger)
+        if is_new:
+            cursor.execute(backfill_flight_times)
+        connection.commit()
+    except Error as e:
+        print(e)
+
+
+def available_aircraft(connection, start, end, airport_code=None, min_seats=0):
+    """ Finds the active aircraft with no flight overlapping [start, end).
+
+    Variables:
+    connection: connection to the database
+    start: start of the window (datetime or 'YYYY-MM-DD HH:MM:SS')
+    end: end of the window
+    airport_code: only aircraft whose last flight before start landed there
+    min_seats: only aircraft with at least this many seats
+
+    Returns:
+    aircraft: list of (Aircraft_Registration_Number, Seat_Capacity) """
+    start_minutes, end_minutes = to_minutes(start), to_minutes(end)
+    if end_minutes < start_minutes:
+        raise ValueError("The end of the window is before its start")
+    cursor = connection.cursor()
+    if airport_code is None:
+        cursor.execute(available_aircraft_query, (min_seats, end_minutes, start_minutes))
+    else:
+        cursor.execute(available_aircraft_at_query,
+                       (min_seats, end_minutes, start_minutes, _to_text(start), airport_code))
+    return cursor.fetchall()
@@ -0,0 +1,91 @@
+""" Benchmark: fleet analytics (load factor per aircraft and route, duration
+percentiles per aircraft) computed row by row through a Python cursor against
+analytics.FleetSnapshot, plus the cost of building and refreshing the snapshot.
+Needs NumPy.
+
+Run from the repository root:
+    python -m benchmarks.analytics_benchmark --flights 200000 """
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from analytics import FleetSnapshot
+from changelog import create_change_log
+
+
+def row_by_row(connection):
+    """ The same analytics with one Python step per flight. """
+    seats = dict(connection.execute("SELECT Aircraft_Registration_Number, Seat_Capacity FROM Aircraft;"))
+    by_aircraft, by_route, durations = {}, {}, {}
+    for aircraft, departure, arrival, passengers, duration in connection.execute(
+            "SELECT Aircraft_Registration_Number, Departure_Airport_Code, Arrival_Airport_Code, "
+            "Passenger_Count, Flight_Duration FROM Flight;"):
+        if passengers is not None and seats.get(aircraft) is not None:
+            for totals, key in ((by_aircraft, aircraft), (by_route, (departure, arrival))):
+                total = totals.setdefault(key, [0, 0])
+                total[0] += passengers
+                total[1] += seats[aircraft]
+        if duration is not None:
+            durations.setdefault(aircraft, []).append(duration)
+    percentiles = {}
+    for aircraft, values in durations.items():
+        values.sort()
+        percentiles[aircraft] = [values[int(fraction * (len(values) - 1))] for fraction in (0.5, 0.9, 0.99)]
+    return by_aircraft, by_route, percentiles
+
+
+def vectorized(snapshot):
+    """ The analytics over the snapshot. """
+    return snapshot.load_factor("aircraft"), snapshot.load_factor("route"), snapshot.duration_percentiles("aircraft")
+
+
+def main():
+    from synthetic import build_database
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "analytics_benchmark.db"))
+        build_database(connection, args.flights)
+
+        start = time.perf_counter()
+        snapshot = FleetSnapshot.from_database(connection)
+        print(f"snapshot of {len(snapshot)} flights: {time.perf_counter() - start:.2f}s")
+
+        results = {}
+        for name, run in (("row by row", lambda: row_by_row(connection)), ("snapshot", lambda: vectorized(snapshot))):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                run()
+            results[name] = (time.perf_counter() - start) / args.repeat
+            print(f"{name:10s} {results[name] * 1000:10.1f} ms per run")
+        print(f"snapshot is {results['row by row'] / results['snapshot']:.0f}x faster per run")
+
+        # with the change log, a refresh after inserts only reads the new flights
+        create_change_log(connection, ["Flight"])
+        snapshot.refresh(connection)
+        connection.execute("INSERT INTO Flight (Flight_Number, Aircraft_Registration_Number, Departure_Airport_Code, "
+                           "Arrival_Airport_Code, Departure_Date_Time, Arrival_Date_Time, Passenger_Count, "
+                           "Flight_Duration) SELECT 'NEW' || Flight_Number, Aircraft_Registration_Number, "
+                           "Departure_Airport_Code, Arrival_Airport_Code, Departure_Date_Time, Arrival_Date_Time, "
+                           "Passenger_Count, Flight_Duration FROM Flight WHERE rowid % 100 = 0;")
+        connection.commit()
+        start = time.perf_counter()
+        added = snapshot.refresh(connection)
+        print(f"incremental refresh (+{added} flights): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        connection.execute("UPDATE Flight SET Passenger_Count = Passenger_Count + 1 WHERE rowid % 100 = 0;")
+        connection.commit()
+        start = time.perf_counter()
+        reloaded = snapshot.refresh(connection)
+        print(f"refresh after updates (reloads {reloaded} flights): {(time.perf_counter() - start) * 1000:.1f} ms")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
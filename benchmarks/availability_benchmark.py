@@ -0,0 +1,96 @@
+""" Benchmark: "which active aircraft are free between T1 and T2 (at airport X)"
+with the R*Tree of availability.py against the same question asked of Flight directly.
+
+Run from the repository root:
+    python -m benchmarks.availability_benchmark --aircraft 10000 --flights 5000000 """
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from availability import available_aircraft, create_availability_index
+from indexes import create_indexes
+from schema import tables_to_create
+
+AIRPORTS = ["STD", "EDI", "BRI", "MXP", "MAD", "BUD", "LIS", "PRA", "BER", "FCO", "DUB", "CDG", "AMS", "FRA"]
+YEAR_START = datetime(2023, 1, 1)
+
+scan_query = """ SELECT Aircraft_Registration_Number, Seat_Capacity FROM Aircraft
+WHERE Status = 'Active' AND Aircraft_Registration_Number NOT IN (
+    SELECT Aircraft_Registration_Number FROM Flight WHERE Departure_Date_Time < ? AND Arrival_Date_Time > ?); """
+
+
+def aircraft_rows(count):
+    """ Generates count aircraft, 80% of them active. """
+    statuses = ["Active"] * 8 + ["Maintenance", "Retired"]
+    for i in range(count):
+        yield (f"AC-{i:05d}", 100 + i % 150, "Airbus", statuses[i % 10])
+
+
+def flight_rows(count, aircraft_count, seed=1):
+    """ Generates count flights spread over one year, back to back per aircraft. """
+    rng = random.Random(seed)
+    per_aircraft = max(1, count // aircraft_count)
+    gap = timedelta(minutes=365 * 24 * 60 // per_aircraft)
+    number = 0
+    for a in range(aircraft_count):
+        departure = YEAR_START + timedelta(minutes=rng.randrange(60))
+        airport = AIRPORTS[a % len(AIRPORTS)]
+        for _ in range(per_aircraft):
+            if number >= count:
+                return
+            duration = timedelta(minutes=rng.randrange(45, 300))
+            arrival_airport = rng.choice(AIRPORTS)
+            yield (f"FL{number:08d}", f"AC-{a:05d}", airport, arrival_airport,
+                   departure.strftime("%Y-%m-%d %H:%M:%S"), (departure + duration).strftime("%Y-%m-%d %H:%M:%S"),
+                   rng.randrange(50, 200), round(duration.seconds / 3600, 2))
+            airport = arrival_airport
+            departure += gap
+            number += 1
+
+
+def time_call(func, repeat):
+    """ Returns the mean wall time of func() in milliseconds. """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aircraft", type=int, default=10000)
+    parser.add_argument("--flights", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "availability_benchmark.db"))
+        for table_query in tables_to_create:
+            connection.execute(table_query)
+        connection.executemany("INSERT INTO Aircraft VALUES (?, ?, ?, ?);", aircraft_rows(args.aircraft))
+        connection.executemany("INSERT INTO Flight VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+                               flight_rows(args.flights, args.aircraft))
+        connection.commit()
+        start = time.perf_counter()
+        create_indexes(connection)
+        create_availability_index(connection)
+        print(f"index build: {time.perf_counter() - start:.1f}s for {args.flights} flights")
+
+        t1, t2 = "2023-07-01 09:00:00", "2023-07-01 13:00:00"
+        scan_ms = time_call(lambda: connection.execute(scan_query, (t2, t1)).fetchall(), args.repeat)
+        rtree_ms = time_call(lambda: available_aircraft(connection, t1, t2), args.repeat)
+        airport_ms = time_call(lambda: available_aircraft(connection, t1, t2, "MAD"), args.repeat)
+        free = len(available_aircraft(connection, t1, t2))
+        print(f"{free} of {args.aircraft} aircraft free between {t1} and {t2}")
+        print(f"Flight scan:          {scan_ms:10.3f} ms")
+        print(f"R*Tree:               {rtree_ms:10.3f} ms  ({scan_ms / rtree_ms:.0f}x faster)")
+        print(f"R*Tree + airport MAD: {airport_ms:10.3f} ms")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
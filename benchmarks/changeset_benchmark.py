@@ -0,0 +1,74 @@
+""" Benchmark: a changeset of retimings, aircraft swaps and cancellations applied
+with changeset.apply_changes against the same changes made one at a time
+(one keyed statement and one commit per change, as the menu does).
+
+Run from the repository root:
+    python -m benchmarks.changeset_benchmark --flights 100000 --changes 5000 """
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from changeset import apply_changes, cancel, retime, swap_aircraft
+from queries import delete_rows
+from synthetic import build_database, flight_number, registration, table_sizes
+
+
+def schedule_changes(count, flights, seed=1):
+    """ count changes on distinct flights: 50% retimings, 30% aircraft swaps, 20% cancellations. """
+    rng = random.Random(seed)
+    aircraft = table_sizes(flights)["Aircraft"]
+    changes = []
+    for n in rng.sample(range(flights), count):
+        kind = rng.random()
+        if kind < 0.5:
+            changes.append(retime(flight_number(n), "2024-01-01 08:00:00", "2024-01-01 09:30:00"))
+        elif kind < 0.8:
+            changes.append(swap_aircraft(flight_number(n), registration(rng.randrange(aircraft))))
+        else:
+            changes.append(cancel(flight_number(n)))
+    return changes
+
+
+def one_at_a_time(connection, changes):
+    """ The changes one statement and one commit at a time. """
+    for change in changes:
+        if change.op == "delete":
+            delete_rows(connection, "Flight", "Flight_Number", change.key)
+            delete_rows(connection, "Pilot_Flight", "Flight_Number", change.key)
+            delete_rows(connection, "Aircraft_Flight", "Flight_Number", change.key)
+        else:
+            for column, value in change.values.items():
+                connection.execute(f"UPDATE Flight SET {column} = ? WHERE Flight_Number = ?;", (value, change.key))
+                connection.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=100_000)
+    parser.add_argument("--changes", type=int, default=5000)
+    args = parser.parse_args()
+
+    changes = schedule_changes(args.changes, args.flights)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("one at a time", "changeset"):
+            connection = sqlite3.connect(os.path.join(directory, f"{name.replace(' ', '_')}.db"))
+            build_database(connection, args.flights)
+            start = time.perf_counter()
+            if name == "changeset":
+                apply_changes(connection, changes)
+            else:
+                one_at_a_time(connection, changes)
+            results[name] = time.perf_counter() - start
+            flights = connection.execute("SELECT count(*) FROM Flight;").fetchone()[0]
+            connection.close()
+            print(f"{name:14s} {results[name]:8.2f}s  {args.changes / results[name]:10.0f} changes/sec  "
+                  f"({flights} flights left)")
+    print(f"changeset is {results['one at a time'] / results['changeset']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
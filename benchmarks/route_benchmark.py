@@ -0,0 +1,97 @@
+""" Benchmark: fastest itinerary queries of routes.py on a generated continent-sized schedule.
+
+The schedule has --airports airports (the first tenth are hubs) and --flights
+flights over --days days; each flight links a random airport to a hub or a hub
+to a random airport, like a hub-and-spoke network.
+
+Run from the repository root:
+    python -m benchmarks.route_benchmark --airports 400 --flights 200000 --days 7 """
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from routes import Timetable
+from schema import tables_to_create
+
+SCHEDULE_START = datetime(2023, 7, 1)
+
+
+def airport_codes(count):
+    """ count three-letter airport codes (AAA, AAB, ...). """
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return [letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26] for i in range(count)]
+
+
+def flight_rows(count, airports, days, seed=1):
+    """ Generates count hub-and-spoke flights spread over days days. """
+    rng = random.Random(seed)
+    hubs = airports[:max(1, len(airports) // 10)]
+    for number in range(count):
+        hub, other = rng.choice(hubs), rng.choice(airports)
+        if other == hub:
+            other = airports[(airports.index(hub) + 1) % len(airports)]
+        departure_airport, arrival_airport = (hub, other) if rng.random() < 0.5 else (other, hub)
+        departure = SCHEDULE_START + timedelta(minutes=rng.randrange(days * 24 * 60))
+        duration = timedelta(minutes=rng.randrange(45, 240))
+        yield (f"FL{number:08d}", f"AC-{number % 1000:05d}", departure_airport, arrival_airport,
+               departure.strftime("%Y-%m-%d %H:%M:%S"), (departure + duration).strftime("%Y-%m-%d %H:%M:%S"),
+               rng.randrange(50, 200), round(duration.seconds / 3600, 2))
+
+
+def percentile(values, fraction):
+    """ The value below which fraction of the sorted values fall. """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--airports", type=int, default=400)
+    parser.add_argument("--flights", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--min-connection", type=int, default=45)
+    args = parser.parse_args()
+
+    airports = airport_codes(args.airports)
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "route_benchmark.db"))
+        for table_query in tables_to_create:
+            connection.execute(table_query)
+        connection.executemany("INSERT INTO Flight VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+                               flight_rows(args.flights, airports, args.days))
+        connection.commit()
+
+        start = time.perf_counter()
+        timetable = Timetable.from_database(connection)
+        print(f"timetable build: {time.perf_counter() - start:.2f}s for {len(timetable)} flights")
+        connection.close()
+
+    rng = random.Random(2)
+    latencies = []
+    found = 0
+    for _ in range(args.queries):
+        origin, destination = rng.sample(airports, 2)
+        depart_after = SCHEDULE_START + timedelta(minutes=rng.randrange((args.days - 1) * 24 * 60))
+        start = time.perf_counter()
+        itinerary = timetable.earliest_arrival(origin, destination, depart_after, args.min_connection)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += itinerary is not None
+    latencies.sort()
+    print(f"{found} of {args.queries} random pairs reachable")
+    print(f"query p50: {percentile(latencies, 0.5):8.3f} ms")
+    print(f"query p99: {percentile(latencies, 0.99):8.3f} ms")
+
+    updates = 1000
+    start = time.perf_counter()
+    for i in range(updates):
+        departure = SCHEDULE_START + timedelta(minutes=rng.randrange(args.days * 24 * 60))
+        timetable.update_flight(f"FL{i:08d}", airports[0], airports[1], departure, departure + timedelta(hours=1))
+    print(f"incremental update: {(time.perf_counter() - start) * 1000 / updates:8.3f} ms per flight")
+
+
+if __name__ == "__main__":
+    main()
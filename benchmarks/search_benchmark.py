@@ -0,0 +1,74 @@
+""" Benchmark: indexed search (search.py) against the old per-table OR-chain scan.
+
+Run from the repository root:
+    python -m benchmarks.search_benchmark --flights 1000000 """
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from schema import table_names, tables_to_create
+from search import create_search_index, search
+
+
+def scan_search(connection, value):
+    """ The search menu option 3 used before the index: one OR-chain scan per table. """
+    cursor = connection.cursor()
+    results = {}
+    for table_name in table_names:
+        cursor.execute(f"PRAGMA table_info({table_name});")
+        column_names = [column[1] for column in cursor.fetchall()]
+        select_query = f"SELECT * FROM {table_name} WHERE {'=? OR '.join(column_names)}=?;"
+        cursor.execute(select_query, [value] * len(column_names))
+        records = cursor.fetchall()
+        if records:
+            results[table_name] = records
+    return results
+
+
+def flight_rows(count):
+    """ Generates count Flight rows with distinct flight numbers. """
+    airports = ["STD", "EDI", "BRI", "MXP", "MAD", "BUD", "LIS", "PRA", "BER", "FCO"]
+    for i in range(count):
+        yield (f"FL{i:07d}", f"EI-{i % 500:03d}", airports[i % 10], airports[(i * 7 + 3) % 10],
+               "2023-11-01 08:00:00", "2023-11-01 10:00:00", i % 300, 2)
+
+
+def time_call(func, repeat):
+    """ Returns the mean wall time of func() in milliseconds. """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "search_benchmark.db"))
+        for table_query in tables_to_create:
+            connection.execute(table_query)
+        connection.executemany("INSERT INTO Flight VALUES (?, ?, ?, ?, ?, ?, ?, ?);", flight_rows(args.flights))
+        connection.commit()
+
+        start = time.perf_counter()
+        create_search_index(connection)
+        print(f"index build: {time.perf_counter() - start:.1f}s for {args.flights} flights")
+
+        target = f"FL{args.flights // 2:07d}"
+        scan_ms = time_call(lambda: scan_search(connection, target), args.repeat)
+        index_ms = time_call(lambda: search(connection, target), args.repeat)
+        prefix_ms = time_call(lambda: search(connection, target[:-1], prefix=True), args.repeat)
+        print(f"scan search:   {scan_ms:10.3f} ms")
+        print(f"index search:  {index_ms:10.3f} ms  ({scan_ms / index_ms:.0f}x faster)")
+        print(f"prefix search: {prefix_ms:10.3f} ms")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+""" Benchmark: load generator for service.py.
+
+--clients concurrent clients send lookups (search, flight duration, aircraft
+by status, free aircraft, pilots by rank) back to back for --seconds seconds
+against a synthetic database. Reports QPS, p50/p99 latency and how many
+requests were coalesced, rejected or timed out.
+
+Run from the repository root:
+    python -m benchmarks.service_benchmark --flights 100000 --clients 200 --seconds 10 """
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from service import QueryService, ServiceOverloaded
+from synthetic import build_database, flight_number, table_sizes
+
+
+def lookups(service, flights, rng):
+    """ One random lookup coroutine; a few hot keys make coalescing possible. """
+    kind = rng.random()
+    if kind < 0.4:
+        return service.flight_duration_and_passengers(flight_number(rng.randrange(min(flights, 1000))))
+    if kind < 0.6:
+        return service.search(flight_number(rng.randrange(flights)))
+    if kind < 0.75:
+        return service.pilots_by_rank(rng.choice(["Captain", "Cadet"]))
+    if kind < 0.9:
+        day = 1 + rng.randrange(28)
+        return service.available_aircraft(f"2023-06-{day:02d} 09:00:00", f"2023-06-{day:02d} 13:00:00")
+    return service.aircraft_by_status(rng.choice(["Active", "Maintenance", "Retired"]))
+
+
+async def client(service, flights, seed, deadline, latencies, failures):
+    """ Sends lookups one after the other until the deadline. """
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            await lookups(service, flights, rng)
+            latencies.append(time.perf_counter() - start)
+        except ServiceOverloaded:
+            failures["rejected"] += 1
+            await asyncio.sleep(0.001)
+        except asyncio.TimeoutError:
+            failures["timeouts"] += 1
+
+
+async def run_load(database_file, args):
+    latencies = []
+    failures = {"rejected": 0, "timeouts": 0}
+    async with QueryService(database_file, args.workers, args.max_pending, args.timeout) as service:
+        start = time.perf_counter()
+        deadline = start + args.seconds
+        await asyncio.gather(*(client(service, args.flights, seed, deadline, latencies, failures)
+                               for seed in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        metrics = service.metrics()
+    latencies.sort()
+    print(f"{len(latencies)} requests in {elapsed:.1f}s: {len(latencies) / elapsed:.0f} QPS")
+    if latencies:
+        print(f"p50: {latencies[len(latencies) // 2] * 1000:.2f} ms")
+        print(f"p99: {latencies[len(latencies) * 99 // 100] * 1000:.2f} ms")
+    print(f"executed {metrics['executed']}, coalesced {metrics['coalesced']}, "
+          f"rejected {failures['rejected']}, timed out {failures['timeouts']}")
+    print(f"read queue wait (mean): {metrics['pool']['read_wait_mean_seconds'] * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_file = os.path.join(directory, "service_benchmark.db")
+        connection = sqlite3.connect(database_file)
+        build_database(connection, args.flights)
+        connection.close()
+        print(f"synthetic database: {table_sizes(args.flights)['Flight']} flights")
+        asyncio.run(run_load(database_file, args))
+
+
+if __name__ == "__main__":
+    main()
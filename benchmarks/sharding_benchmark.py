@@ -0,0 +1,66 @@
+""" Benchmark: the same aggregates and searches on one database file and
+scatter-gathered over --shards shard files (sharding.ShardedDatabase, one
+worker process per CPU).
+
+Run from the repository root:
+    python -m benchmarks.sharding_benchmark --flights 400000 --shards 4 """
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from search import search
+from sharding import ShardedDatabase, ShardMap, split_database
+from synthetic import build_database, flight_number
+
+aggregate_query = ("SELECT Aircraft_Registration_Number, avg(Passenger_Count), count(*), max(Flight_Duration) "
+                   "FROM Flight GROUP BY Aircraft_Registration_Number;")
+
+
+def timed(function, repeat):
+    """ Mean seconds of function() over repeat calls. """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=400_000)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_file = os.path.join(directory, "single.db")
+        connection = sqlite3.connect(database_file)
+        build_database(connection, args.flights)
+        connection.commit()
+
+        start = time.perf_counter()
+        shard_map = ShardMap(os.path.join(directory, "shards"), [f"shard{n}" for n in range(args.shards)])
+        split_database(database_file, shard_map)
+        print(f"split into {args.shards} shards: {time.perf_counter() - start:.2f}s ({os.cpu_count()} CPUs)")
+
+        with ShardedDatabase(shard_map.directory) as sharded:
+            cases = [
+                ("aggregate by aircraft", lambda: connection.execute(aggregate_query).fetchall(),
+                 lambda: sharded.aggregate(["Aircraft_Registration_Number"],
+                                           [("avg", "Passenger_Count"), ("count", "*"), ("max", "Flight_Duration")])),
+                ("full scan count", lambda: connection.execute("SELECT count(*) FROM Flight "
+                                                               "WHERE Passenger_Count > 150;").fetchall(),
+                 lambda: sharded.aggregate([], [("count", "*")], "Passenger_Count > 150")),
+                ("search", lambda: search(connection, flight_number(42)), lambda: sharded.search(flight_number(42))),
+            ]
+            for name, single, scattered in cases:
+                scattered()  # opens the worker connections
+                single_seconds, sharded_seconds = timed(single, args.repeat), timed(scattered, args.repeat)
+                print(f"{name:22s} single {single_seconds * 1000:8.1f} ms   sharded {sharded_seconds * 1000:8.1f} ms"
+                      f"   ({single_seconds / sharded_seconds:.1f}x)")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+""" Benchmark: startup cost of the command line.
+
+Measures, each in a fresh interpreter:
+- import aircraft (must not touch the database),
+- `cli.py list` on a new database (schema + seed data created),
+- `cli.py list` on an existing database (user_version matches, schema skipped).
+
+Run from the repository root:
+    python -m benchmarks.startup_benchmark --repeat 10 """
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(args, cwd):
+    """ Runs a python command and returns its wall time in milliseconds. """
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, cwd=cwd, check=True, stdout=subprocess.DEVNULL,
+                   env=dict(os.environ, PYTHONPATH=ROOT))
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    cli = os.path.join(ROOT, "cli.py")
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = min(run(["-c", "pass"], directory) for _ in range(args.repeat))
+        imports = min(run(["-c", "import aircraft"], directory) for _ in range(args.repeat))
+        created = []
+        for i in range(args.repeat):
+            created.append(run([cli, "--database", f"new_{i}.db", "list"], directory))
+        existing = min(run([cli, "--database", "new_0.db", "list"], directory) for _ in range(args.repeat))
+        if os.path.exists(os.path.join(directory, "aircraft_management_system_db.db")):
+            print("warning: importing aircraft created the default database")
+
+    print(f"python -c pass:            {baseline:8.1f} ms")
+    print(f"import aircraft:           {imports:8.1f} ms")
+    print(f"cli list, new database:    {min(created):8.1f} ms")
+    print(f"cli list, existing db:     {existing:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
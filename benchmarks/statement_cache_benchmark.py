@@ -0,0 +1,61 @@
+""" Microbenchmark: per-call latency of a flight lookup built with an f-string
+literal (re-parsed every call) against the parameterized query of queries.py
+(prepared once, then served from the statement cache). Both run the query on
+the connection: flight_duration_and_passengers also goes through the result
+cache (cache.py), whose hits would be measured instead.
+
+Run from the repository root:
+    python -m benchmarks.statement_cache_benchmark --flights 10000 --lookups 100000 """
+import argparse
+import sqlite3
+import time
+
+from queries import STATEMENT_CACHE_SIZE, select_query
+from schema import tables_to_create
+
+
+def literal_lookup(connection, flight_number):
+    """ The option 7 lookup as it was written before queries.py. """
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT Flight_Duration, Passenger_Count FROM Flight WHERE Flight_Number='{flight_number}';")
+    return cursor.fetchone()
+
+
+def bound_lookup(connection, flight_number):
+    """ The option 7 lookup of queries.py, without the result cache. """
+    cursor = connection.cursor()
+    cursor.execute(select_query("Flight", ("Flight_Duration", "Passenger_Count"), "Flight_Number"), (flight_number,))
+    return cursor.fetchone()
+
+
+def time_lookups(lookup, connection, numbers):
+    """ Returns the mean latency of lookup() in microseconds. """
+    start = time.perf_counter()
+    for flight_number in numbers:
+        lookup(connection, flight_number)
+    return (time.perf_counter() - start) * 1_000_000 / len(numbers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(":memory:", cached_statements=STATEMENT_CACHE_SIZE)
+    for table_query in tables_to_create:
+        connection.execute(table_query)
+    connection.executemany("INSERT INTO Flight VALUES (?, 'EI-DCJ', 'STD', 'EDI', NULL, NULL, ?, 2);",
+                           ((f"FL{i}", i % 300) for i in range(args.flights)))
+    connection.commit()
+    numbers = [f"FL{(i * 7919) % args.flights}" for i in range(args.lookups)]
+
+    literal_us = time_lookups(literal_lookup, connection, numbers)
+    bound_us = time_lookups(bound_lookup, connection, numbers)
+    print(f"f-string literal:  {literal_us:8.2f} us/call")
+    print(f"parameterized:     {bound_us:8.2f} us/call  ({literal_us / bound_us:.1f}x faster)")
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
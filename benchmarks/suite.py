@@ -0,0 +1,151 @@
+""" Benchmark suite: search, view, update, delete, insert, availability and stats
+on a synthetic database (synthetic.py), with the results saved as JSON.
+
+Each operation runs --repeat times; the JSON keeps the mean, p50 and p99 in
+milliseconds per operation together with the scale, seed and versions, so two
+runs can be compared with --compare (operations more than 20% slower are
+flagged).
+
+Run from the repository root:
+    python -m benchmarks.suite --flights 1000000 --output results.json
+    python -m benchmarks.suite --flights 1000000 --output new.json --compare results.json """
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from availability import available_aircraft
+from queries import STATEMENT_CACHE_SIZE, delete_rows, insert_row, update_value
+from search import search
+from stats import stats_by_aircraft, stats_by_day, stats_by_route
+from synthetic import DEFAULT_SEED, build_database, flight_number, registration, table_sizes
+from viewer import iter_pages
+
+REGRESSION_RATIO = 1.2
+
+
+def measure(func, repeat):
+    """ Runs func(i) for i in range(repeat) and summarises the wall times.
+
+    Returns:
+    result: dict with mean_ms, p50_ms, p99_ms and repeat """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"mean_ms": sum(times) / len(times), "p50_ms": times[len(times) // 2],
+            "p99_ms": times[min(len(times) - 1, len(times) * 99 // 100)], "repeat": repeat}
+
+
+def first_pages(connection, count, **options):
+    """ Reads the first count pages of Flight with viewer.iter_pages. """
+    pages = iter_pages(connection, "Flight", **options)
+    for _ in range(count):
+        if next(pages, None) is None:
+            break
+
+
+def operations(connection, flights, repeat):
+    """ The benchmarked operations, reads first so the writes do not change what they read.
+
+    Returns:
+    operations: list of (name, func(i), repeat) """
+    sizes = table_sizes(flights)
+    step = max(1, flights // repeat)
+    new_flights = flights + 1
+    insert_columns = ("Flight_Number", "Aircraft_Registration_Number", "Departure_Airport_Code",
+                      "Arrival_Airport_Code", "Departure_Date_Time", "Arrival_Date_Time",
+                      "Passenger_Count", "Flight_Duration")
+    return [
+        ("search_exact", lambda i: search(connection, flight_number(i * step)), repeat),
+        ("search_prefix", lambda i: search(connection, flight_number(i * step)[:-1], prefix=True), repeat),
+        ("view_first_page", lambda i: first_pages(connection, 1), repeat),
+        ("view_10_pages_by_airport", lambda i: first_pages(connection, 10, order_by="Departure_Airport_Code"), repeat),
+        ("availability_window", lambda i: available_aircraft(
+            connection, f"2023-{1 + i % 12:02d}-10 09:00:00", f"2023-{1 + i % 12:02d}-10 13:00:00"), repeat),
+        ("availability_at_airport", lambda i: available_aircraft(
+            connection, f"2023-{1 + i % 12:02d}-10 09:00:00", f"2023-{1 + i % 12:02d}-10 13:00:00", "AAA"), repeat),
+        ("stats_by_aircraft", lambda i: stats_by_aircraft(connection), max(1, repeat // 10)),
+        ("stats_by_route", lambda i: stats_by_route(connection), max(1, repeat // 10)),
+        ("stats_by_day_month", lambda i: stats_by_day(connection, "2023-03-01", "2023-03-31"), repeat),
+        ("update_flight_number", lambda i: update_value(
+            connection, "Flight", "Flight_Number", flight_number(i * step + 1), flight_number(i * step + 1) + "U"),
+         repeat),
+        ("insert_flight", lambda i: insert_row(connection, "Flight", insert_columns, (
+            flight_number(new_flights + i), registration(i % sizes["Aircraft"]), "AAA", "AAB",
+            "2024-01-01 08:00:00", "2024-01-01 09:30:00", 100, 1.5)), repeat),
+        ("delete_flight", lambda i: delete_rows(connection, "Flight", "Flight_Number", flight_number(i * step)),
+         repeat),
+    ]
+
+
+def run_suite(connection, flights, repeat):
+    """ Runs every operation and returns name -> measure result. """
+    return {name: measure(func, count) for name, func, count in operations(connection, flights, repeat)}
+
+
+def compare(results, baseline):
+    """ Prints each operation's mean against a previous run, flagging regressions. """
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            print(f"{name:30s} {result['mean_ms']:10.3f} ms  (new)")
+            continue
+        ratio = result["mean_ms"] / before["mean_ms"] if before["mean_ms"] else float("inf")
+        flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+        print(f"{name:30s} {result['mean_ms']:10.3f} ms  was {before['mean_ms']:10.3f} ms  ({ratio:.2f}x){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flights", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "suite.db"), cached_statements=STATEMENT_CACHE_SIZE)
+        start = time.perf_counter()
+        loads = build_database(connection, args.flights, args.seed)
+        build_seconds = time.perf_counter() - start
+        print(f"synthetic database: {args.flights} flights in {build_seconds:.1f}s")
+        results = run_suite(connection, args.flights, args.repeat)
+        connection.close()
+
+    report = {
+        "meta": {
+            "flights": args.flights,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "rows": table_sizes(args.flights),
+            "build_seconds": build_seconds,
+            "load_rows_per_second": {name: load["rows_per_second"] for name, load in loads.items() if "rows" in load},
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    else:
+        for name, result in results.items():
+            print(f"{name:30s} {result['mean_ms']:10.3f} ms  (p99 {result['p99_ms']:.3f} ms)")
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+""" Read-through cache of query results, invalidated per table by writes.
+
+Results are kept per database file, keyed by the SQL text (whitespace
+collapsed) and its parameters, in LRU order (at most max_entries) and for at
+most ttl seconds; a result is stored the second time its key misses, so
+one-off reads do not evict the results that are read again. Each entry
+remembers the tables its query reads; a write to a table (the menu update /
+delete / insert paths, the bulk loaders, the pool writer) drops every entry
+that read it. Writes to a base table also drop the entries that
+read the internal '_' tables, since triggers keep those in step with it.
+
+A read that overlaps a write to one of its tables is not cached (every
+invalidation is numbered, and the result is stored only if none of its
+tables was invalidated after the number taken before the read), so a read
+after a write never sees the result of a read from before it. The key text
+and table set of a query string are worked out once (functools.lru_cache),
+so a miss costs little more than the query itself.
+
+Writes made by other processes are only picked up when the ttl expires. """
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 60.0
+# query strings whose key text and table set are remembered
+QUERY_SHAPE_CACHE_SIZE = 1024
+
+_read_tables = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+_written_table = re.compile(r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|"
+                            r"DELETE\s+FROM|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?)\s+([A-Za-z_][A-Za-z0-9_]*)",
+                            re.IGNORECASE)
+
+
+def read_tables(sql):
+    """ Tables named after FROM / JOIN in a query. """
+    return frozenset(_read_tables.findall(sql))
+
+
+def written_table(sql):
+    """ Table changed by an INSERT / UPDATE / DELETE / ALTER / DROP statement, None for other statements. """
+    match = _written_table.match(sql)
+    return match.group(1) if match else None
+
+
+class ResultCache:
+    """ Bounded LRU + TTL cache of query results with per-table invalidation.
+
+    Variables:
+    max_entries (int): results kept before the least recently used is evicted
+    ttl (float): seconds a result stays valid """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, tables, rows)
+        self._by_table = {}            # table -> keys of the entries reading it
+        self._seen = set()             # keys missed once and not stored yet
+        self._writes = 0               # invalidations so far, each one numbered
+        self._written_at = {}          # table -> number of its last invalidation
+        self._derived_written_at = 0   # last invalidation of a base table, seen by every '_' table
+        self._cleared_at = 0           # last clear(), seen by every table
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                          "invalidations": 0, "skipped_stores": 0}
+
+    def lookup(self, key):
+        """ The cached rows of key (None on a miss) and the generation to pass to put on a miss.
+
+        A miss is seen without taking the lock (a dict read is atomic). """
+        if key not in self._entries:
+            self._counters["misses"] += 1
+            return None, self._writes
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None, self._writes
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None, self._writes
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[2], self._writes
+
+    def _written_since(self, tables, generation):
+        """ True if one of tables was invalidated after generation; the caller holds the lock. """
+        if self._cleared_at > generation:
+            return True
+        for table in tables:
+            if self._written_at.get(table, 0) > generation or \
+                    (table.startswith("_") and self._derived_written_at > generation):
+                return True
+        return False
+
+    def generation(self):
+        """ Snapshot to take before running a query, then pass to put. """
+        with self._lock:
+            return self._writes
+
+    def put(self, key, tables, rows, generation):
+        """ Stores the rows read after a miss unless one of tables was written since generation was taken.
+
+        Only the second miss of a key within the last max_entries first
+        misses stores it: a scan over keys that are read once (that would
+        evict every useful result) costs a set lookup instead of a store. """
+        if key not in self._seen:
+            if len(self._seen) >= self.max_entries:
+                self._seen.clear()
+            self._seen.add(key)
+            return
+        with self._lock:
+            self._seen.discard(key)
+            if generation != self._writes and self._written_since(tables, generation):
+                self._counters["skipped_stores"] += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tables, rows)
+            by_table = self._by_table
+            for table in tables:
+                keys = by_table.get(table)
+                if keys is None:
+                    keys = by_table[table] = set()
+                keys.add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def _drop(self, key):
+        """ Removes one entry; the caller holds the lock. """
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, table_name):
+        """ Drops every result that read table_name (and the '_' tables derived from base tables). """
+        with self._lock:
+            self._writes += 1
+            self._written_at[table_name] = self._writes
+            tables = {table_name}
+            if not table_name.startswith("_"):
+                self._derived_written_at = self._writes
+                tables.update(table for table in self._by_table if table.startswith("_"))
+            for table in tables:
+                for key in list(self._by_table.pop(table, ())):
+                    if key in self._entries:
+                        self._drop(key)
+                        self._counters["invalidations"] += 1
+
+    def clear(self):
+        """ Drops every result (e.g. after a schema change). """
+        with self._lock:
+            self._writes += 1
+            self._cleared_at = self._writes
+            self._counters["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._by_table.clear()
+
+    def stats(self):
+        """ Counters (hits, misses, evictions, expirations, invalidations, skipped_stores) and size.
+
+        Misses are counted without the lock, so under concurrent lookups the
+        count can come out slightly low.
+
+        Returns:
+        stats: dict """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+# database file -> ResultCache; connection id -> (connection, database file, ResultCache)
+_caches = {}
+_databases = {}
+_caches_lock = threading.Lock()
+
+
+def get_result_cache(connection):
+    """ Gets the result cache shared by every connection to the same database file.
+
+    Variables:
+    connection: connection to the database
+
+    Returns:
+    cache: the ResultCache of that database """
+    known = _databases.get(id(connection))
+    if known is None:
+        path = connection.execute("PRAGMA database_list;").fetchone()[2]
+        # in-memory databases are private to their connection
+        path = path or f":memory:{id(connection)}"
+        with _caches_lock:
+            cache = _caches.get(path)
+            if cache is None:
+                cache = _caches[path] = ResultCache()
+        known = _databases[id(connection)] = (connection, path, cache)
+    return known[2]
+
+
+def forget_connection(connection):
+    """ Drops what is remembered about a connection that is being closed. """
+    _databases.pop(id(connection), None)
+
+
+@lru_cache(maxsize=QUERY_SHAPE_CACHE_SIZE)
+def _query_shape(query, tables):
+    """ Key text (whitespace collapsed) and table set of a query string. """
+    return " ".join(query.split()), read_tables(query) if tables is None else frozenset(tables)
+
+
+def cached_query(connection, query, params=(), tables=None):
+    """ Runs a read query through the cache.
+
+    Variables:
+    connection: connection to the database
+    query: The SQL query that will be executed
+    params: values bound to the query's ? placeholders
+    tables: tables the query reads, found from FROM / JOIN if None
+
+    Returns:
+    rows: list of the query's rows """
+    cache = get_result_cache(connection)
+    text, tables = _query_shape(query, tables if tables is None else tuple(tables))
+    key = (text, tuple(params))
+    rows, generation = cache.lookup(key)
+    if rows is None:
+        rows = connection.execute(query, params).fetchall()
+        cache.put(key, tables, rows, generation)
+    return list(rows)
+
+
+def invalidate(connection, table_name):
+    """ Drops the cached results that read table_name; call it once the write is committed. """
+    get_result_cache(connection).invalidate(table_name)
@@ -0,0 +1,176 @@
+""" Change log (change data capture): every row written to each table, in commit order.
+
+Once create_change_log has run, triggers on the seven tables append one
+row per changed row to _Change_Log (Seq, Table_Name, Op, Row_Key, Row_Data):
+the primary key of the inserted, updated or deleted row and, for inserts
+and updates, the new row as a JSON object (an update that changes the
+primary key is logged as a delete of the old key and an update of the new
+one). Seq only grows, so a reader (integrity checks, replication.py)
+remembers the last Seq it processed (its offset in _Change_Log_Offsets) and
+asks for what came after; prune_change_log drops what every reader has seen.
+A reader that is gone for good (e.g. a deleted replica) must be removed
+with remove_offset, or its offset keeps every later change in the log.
+
+The log is opt-in: every write to a logged table costs one more insert. """
+from sqlite3 import Error
+
+from schema import get_catalog, table_names
+
+change_log_table = """ CREATE TABLE IF NOT EXISTS _Change_Log (
+    Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    Table_Name TEXT NOT NULL,
+    Op TEXT NOT NULL,
+    Row_Key NOT NULL,
+    Row_Data TEXT ); """
+
+change_log_index = "CREATE INDEX IF NOT EXISTS _Change_Log_Table ON _Change_Log (Table_Name, Seq, Row_Key);"
+
+offsets_table = """ CREATE TABLE IF NOT EXISTS _Change_Log_Offsets (
+    Reader TEXT PRIMARY KEY,
+    Seq INTEGER NOT NULL ); """
+
+
+_events = ("Insert", "Update", "Delete")
+
+
+def _log_triggers(table_name, key_column, column_names):
+    """ CREATE TRIGGER statements logging the rows written to one table. """
+    log = f"INSERT INTO _Change_Log (Table_Name, Op, Row_Key, Row_Data) SELECT '{table_name}'"
+    new_row = "json_object(" + ", ".join(f"'{column}', NEW.{column}" for column in column_names) + ")"
+    return [
+        f""" CREATE TRIGGER IF NOT EXISTS _Change_Log_{table_name}_Insert AFTER INSERT ON {table_name}
+        BEGIN
+            {log}, 'insert', NEW.{key_column}, {new_row};
+        END; """,
+        f""" CREATE TRIGGER IF NOT EXISTS _Change_Log_{table_name}_Update AFTER UPDATE ON {table_name}
+        BEGIN
+            {log}, 'delete', OLD.{key_column}, NULL WHERE OLD.{key_column} IS NOT NEW.{key_column};
+            {log}, 'update', NEW.{key_column}, {new_row};
+        END; """,
+        f""" CREATE TRIGGER IF NOT EXISTS _Change_Log_{table_name}_Delete AFTER DELETE ON {table_name}
+        BEGIN
+            {log}, 'delete', OLD.{key_column}, NULL;
+        END; """,
+    ]
+
+
+def _drop_triggers(cursor, tables):
+    for table_name in tables or table_names:
+        for event in _events:
+            cursor.execute(f"DROP TRIGGER IF EXISTS _Change_Log_{table_name}_{event};")
+
+
+def drop_change_log_triggers(connection, tables=None):
+    """ Stops logging the writes to tables (the seven tables by default); the log itself stays. """
+    _drop_triggers(connection.cursor(), tables)
+    connection.commit()
+
+
+def create_change_log(connection, tables=None):
+    """ Creates the change log and its triggers (on the seven tables by default).
+
+    The triggers are recreated, so they pick up added columns (and a log
+    created without Row_Data gets it).
+
+    Variables:
+    connection: connection to the database
+    tables: names of the tables to log """
+    catalog = get_catalog(connection)
+    cursor = connection.cursor()
+    try:
+        connection.commit()
+        # one transaction, so no write slips between the old triggers and the new ones
+        cursor.execute("BEGIN;")
+        cursor.execute(change_log_table)
+        cursor.execute(change_log_index)
+        cursor.execute(offsets_table)
+        if "Row_Data" not in catalog.column_names("_Change_Log"):
+            cursor.execute("ALTER TABLE _Change_Log ADD COLUMN Row_Data TEXT;")
+        _drop_triggers(cursor, tables)
+        for table_name in tables or table_names:
+            if catalog.has_table(table_name):
+                key_column = catalog.primary_key(table_name)[0]
+                for trigger in _log_triggers(table_name, key_column, catalog.column_names(table_name)):
+                    cursor.execute(trigger)
+        connection.commit()
+    except Error as e:
+        connection.rollback()
+        print(e)
+
+
+def has_change_log(connection):
+    """ Whether create_change_log has run on the database. """
+    return get_catalog(connection).has_table("_Change_Log")
+
+
+def is_logged(connection, table_name):
+    """ Whether the writes to a table are being logged (a replica, for one, has the log but not its triggers). """
+    count = connection.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?);",
+                               tuple(f"_Change_Log_{table_name}_{event}" for event in _events)).fetchone()[0]
+    return count == len(_events)
+
+
+def last_sequence(connection):
+    """ Seq of the latest logged change (pruned or not), 0 if none. """
+    row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = '_Change_Log';").fetchone()
+    return row[0] if row else 0
+
+
+def complete_since(connection, seq):
+    """ Whether the log still holds every change after seq (prune_change_log dropped none of them). """
+    count = connection.execute("SELECT count(*) FROM _Change_Log WHERE Seq > ?;", (seq,)).fetchone()[0]
+    return count == last_sequence(connection) - seq
+
+
+def changes_since(connection, seq, table_name=None):
+    """ Logged changes after seq, oldest first.
+
+    Returns:
+    rows: list of (Seq, Table_Name, Op, Row_Key, Row_Data) """
+    if table_name is None:
+        return connection.execute("SELECT Seq, Table_Name, Op, Row_Key, Row_Data FROM _Change_Log WHERE Seq > ? "
+                                  "ORDER BY Seq;", (seq,)).fetchall()
+    return connection.execute("SELECT Seq, Table_Name, Op, Row_Key, Row_Data FROM _Change_Log "
+                              "WHERE Table_Name = ? AND Seq > ? ORDER BY Seq;", (table_name, seq)).fetchall()
+
+
+def get_offset(connection, reader):
+    """ Last Seq processed by a reader, None if it never ran. """
+    row = connection.execute("SELECT Seq FROM _Change_Log_Offsets WHERE Reader = ?;", (reader,)).fetchone()
+    return None if row is None else row[0]
+
+
+def set_offset(connection, reader, seq):
+    """ Records that a reader has processed the log up to seq. """
+    connection.execute("INSERT INTO _Change_Log_Offsets (Reader, Seq) VALUES (?, ?) "
+                       "ON CONFLICT(Reader) DO UPDATE SET Seq = excluded.Seq;", (reader, seq))
+    connection.commit()
+
+
+def remove_offset(connection, reader):
+    """ Unregisters a reader, so prune_change_log no longer keeps the changes it has not seen.
+
+    Returns:
+    removed: whether the reader had an offset """
+    cursor = connection.execute("DELETE FROM _Change_Log_Offsets WHERE Reader = ?;", (reader,))
+    connection.commit()
+    return cursor.rowcount > 0
+
+
+def offsets(connection):
+    """ Every registered reader and its last processed Seq.
+
+    Returns:
+    offsets: dict reader -> Seq """
+    return dict(connection.execute("SELECT Reader, Seq FROM _Change_Log_Offsets ORDER BY Reader;").fetchall())
+
+
+def prune_change_log(connection):
+    """ Deletes the changes every reader has processed.
+
+    Returns:
+    deleted: number of log rows deleted """
+    cursor = connection.execute("DELETE FROM _Change_Log WHERE Seq <= "
+                                "(SELECT COALESCE(min(Seq), 0) FROM _Change_Log_Offsets);")
+    connection.commit()
+    return cursor.rowcount
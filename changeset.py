@@ -0,0 +1,225 @@
+""" Batched, keyed schedule changes applied in one transaction.
+
+A changeset is a list (or stream) of Change(op, table, key, values):
+- ('update', table, key, {column: value, ...}) sets columns of the row whose primary key is key,
+- ('insert', table, key, {column: value, ...}) adds a row,
+- ('delete', table, key, None) removes a row.
+
+Consecutive changes of the same shape (op, table, columns) are sent to SQLite
+together with one executemany against the primary key, so thousands of
+retimings, aircraft swaps or cancellations cost a few statements. The
+schema's foreign keys are not enforced by SQLite here, so their cascades are
+done set-based:
+- a delete also deletes the rows that reference the deleted keys (e.g.
+  cancelling a flight removes its Pilot_Flight and Aircraft_Flight rows),
+  recursively,
+- an update of a primary key renames the references to it.
+
+A value of None sets the column to NULL. In records read from a file
+(read_changes) a column that is absent is left unchanged: in JSONL leave the
+field out (null sets NULL), in CSV leave it empty (\\N sets NULL). An update
+that sets no column is refused.
+
+The whole changeset is one transaction: if any change fails, nothing is
+applied. """
+import time
+from collections import namedtuple
+
+from cache import invalidate
+from loader import DEFAULT_BATCH_SIZE, batched
+from queries import validate_identifier
+from schema import get_catalog
+
+Change = namedtuple("Change", ["op", "table", "key", "values"])
+
+_operations = ("update", "insert", "delete")
+
+# a column a record leaves out (e.g. an empty CSV field: pass it to loader.read_records as empty)
+ABSENT = object()
+# CSV field setting a column to NULL
+NULL_FIELD = "\\N"
+
+deleted_keys_table = """ CREATE TEMP TABLE IF NOT EXISTS _Changeset_Deleted (
+    Table_Name TEXT NOT NULL,
+    Key NOT NULL,
+    PRIMARY KEY (Table_Name, Key) ) WITHOUT ROWID; """
+
+
+def retime(flight_number, departure, arrival):
+    """ Change moving a flight to new departure / arrival times ('YYYY-MM-DD HH:MM:SS'). """
+    return Change("update", "Flight", flight_number,
+                  {"Departure_Date_Time": departure, "Arrival_Date_Time": arrival})
+
+
+def swap_aircraft(flight_number, registration_number):
+    """ Change giving a flight another aircraft. """
+    return Change("update", "Flight", flight_number, {"Aircraft_Registration_Number": registration_number})
+
+
+def cancel(flight_number):
+    """ Change deleting a flight (and, by cascade, its crew and aircraft links). """
+    return Change("delete", "Flight", flight_number, None)
+
+
+def _shape(change):
+    """ Changes with the same shape share one executemany. """
+    columns = tuple(change.values) if change.values else ()
+    return change.op, change.table, columns
+
+
+def _key_column(connection, table_name):
+    """ The single primary key column of a table. """
+    primary_key = get_catalog(connection).primary_key(table_name)
+    if len(primary_key) != 1:
+        raise ValueError(f"{table_name} has no single column primary key")
+    return primary_key[0]
+
+
+def _references(connection, table_name):
+    """ (child table, column) pairs whose foreign key points at table_name. """
+    catalog = get_catalog(connection)
+    return [(child, foreign_key.column) for child in catalog.tables()
+            for foreign_key in catalog.foreign_keys(child) if foreign_key.table == table_name]
+
+
+def _cascade_deletes(connection, cursor, table_name, touched):
+    """ Deletes, level by level, the rows referencing the keys in _Changeset_Deleted.
+
+    Returns:
+    cascaded: number of rows deleted by the cascade """
+    cascaded = 0
+    pending = [table_name]
+    while pending:
+        parent = pending.pop()
+        for child, column in _references(connection, parent):
+            child_key = _key_column(connection, child)
+            keys = "(SELECT Key FROM temp._Changeset_Deleted WHERE Table_Name = ?)"
+            cursor.execute(f"INSERT OR IGNORE INTO temp._Changeset_Deleted (Table_Name, Key) "
+                           f"SELECT ?, {child_key} FROM {child} WHERE {column} IN {keys};", (child, parent))
+            if cursor.rowcount > 0:
+                cursor.execute(f"DELETE FROM {child} WHERE {column} IN {keys};", (parent,))
+                cascaded += cursor.rowcount
+                touched.add(child)
+                pending.append(child)
+    return cascaded
+
+
+def _apply_group(connection, cursor, shape, changes, touched):
+    """ Applies a run of changes of one shape.
+
+    Returns:
+    (rows, cascaded): rows changed directly and through the cascades """
+    op, table_name, columns = shape
+    if op not in _operations:
+        raise ValueError(f"Unknown change: {op!r} (expected one of {', '.join(_operations)})")
+    validate_identifier(connection, table_name)
+    for column in columns:
+        validate_identifier(connection, table_name, column)
+    key_column = _key_column(connection, table_name)
+    touched.add(table_name)
+
+    if op == "update":
+        if not columns:
+            raise ValueError(f"Update of {table_name} {changes[0].key!r} sets no column")
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        cursor.executemany(f"UPDATE {table_name} SET {assignments} WHERE {key_column} = ?;",
+                           [tuple(change.values.values()) + (change.key,) for change in changes])
+        rows = cursor.rowcount
+        cascaded = 0
+        if key_column in columns:
+            # primary key renamed: point the references at the new key
+            renames = [(change.values[key_column], change.key) for change in changes
+                       if change.values[key_column] != change.key]
+            for child, column in _references(connection, table_name):
+                cursor.executemany(f"UPDATE {child} SET {column} = ? WHERE {column} = ?;", renames)
+                cascaded += cursor.rowcount
+                touched.add(child)
+        return rows, cascaded
+
+    if op == "insert":
+        all_columns = (key_column,) + tuple(column for column in columns if column != key_column)
+        cursor.executemany(f"INSERT INTO {table_name} ({', '.join(all_columns)}) "
+                           f"VALUES ({', '.join('?' * len(all_columns))});",
+                           [(change.key,) + tuple(change.values[column] for column in all_columns[1:])
+                            for change in changes])
+        return cursor.rowcount, 0
+
+    cursor.execute("DELETE FROM temp._Changeset_Deleted;")
+    cursor.executemany("INSERT OR IGNORE INTO temp._Changeset_Deleted (Table_Name, Key) VALUES (?, ?);",
+                       [(table_name, change.key) for change in changes])
+    cursor.execute(f"DELETE FROM {table_name} WHERE {key_column} IN "
+                   f"(SELECT Key FROM temp._Changeset_Deleted WHERE Table_Name = ?);", (table_name,))
+    rows = cursor.rowcount
+    return rows, _cascade_deletes(connection, cursor, table_name, touched)
+
+
+def _runs(changes, batch_size):
+    """ Splits the changes into runs of one shape, at most batch_size long, keeping their order. """
+    for batch in batched(changes, batch_size):
+        run = []
+        for change in batch:
+            change = Change(*change)
+            if run and _shape(run[0]) != _shape(change):
+                yield _shape(run[0]), run
+                run = []
+            run.append(change)
+        if run:
+            yield _shape(run[0]), run
+
+
+def apply_changes(connection, changes, batch_size=DEFAULT_BATCH_SIZE):
+    """ Applies a changeset atomically.
+
+    Variables:
+    connection: connection to the database
+    changes: iterable of Change (or (op, table, key, values) tuples)
+    batch_size: max changes per executemany
+
+    Returns:
+    report: dict with changes, rows, cascaded, seconds and changes_per_second
+
+    Raises:
+    ValueError or sqlite3.Error: the changeset was rolled back """
+    connection.commit()
+    cursor = connection.cursor()
+    touched = set()
+    count = rows = cascaded = 0
+    start = time.perf_counter()
+    try:
+        cursor.execute(deleted_keys_table)
+        cursor.execute("BEGIN;")
+        for shape, run in _runs(changes, batch_size):
+            run_rows, run_cascaded = _apply_group(connection, cursor, shape, run, touched)
+            count += len(run)
+            rows += run_rows
+            cascaded += run_cascaded
+        connection.commit()
+    except Exception:
+        # including errors of the change stream itself (e.g. a bad record)
+        connection.rollback()
+        raise
+    finally:
+        for table_name in touched:
+            invalidate(connection, table_name)
+    seconds = time.perf_counter() - start
+    return {"changes": count, "rows": rows, "cascaded": cascaded, "seconds": seconds,
+            "changes_per_second": count / seconds if seconds else 0.0}
+
+
+def read_changes(records):
+    """ Turns flat records (e.g. from loader.read_records) into changes.
+
+    Each record has 'op', 'table' and 'key'; its other fields are the values,
+    except those that are ABSENT. None and NULL_FIELD set NULL.
+
+    Returns:
+    generator of Change """
+    for record in records:
+        record = dict(record)
+        missing = {"op", "table", "key"} - set(record)
+        if missing:
+            raise ValueError(f"Change without {', '.join(sorted(missing))}: {record}")
+        op, table_name, key = record.pop("op"), record.pop("table"), record.pop("key")
+        values = {column: (None if value == NULL_FIELD else value) for column, value in record.items()
+                  if value is not ABSENT}
+        yield Change(op, table_name, key, values if op != "delete" else None)
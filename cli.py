@@ -0,0 +1,431 @@
+""" Non-interactive command line for scripts and batch jobs.
+
+Usage:
+    python cli.py list
+    python cli.py view Flight --page-size 500 --columns Flight_Number,Passenger_Count --order-by Flight_Number
+    python cli.py search EDI [--prefix]
+    python cli.py flight B777
+    python cli.py aircraft EI-DCJ
+    python cli.py departures MAD 2023-11-01 2023-11-02
+    python cli.py stats aircraft|route|day|pilot [--from 2023-11-01 --to 2023-11-30]
+    python cli.py load Flight schedule.csv [--batch-size 10000]
+    python cli.py apply changes.jsonl [--batch-size 10000]
+    python cli.py crew [--min-rest 30]
+    python cli.py route MAD EDI "2023-11-01 08:00" [--min-connection 45]
+    python cli.py archive 2023-06-01 [--directory archive]
+    python cli.py history [--directory archive] [--first-month 2023-01 --last-month 2023-03]
+    python cli.py analytics load-factor|utilisation|durations [--group route] [--from ... --to ...]
+    python cli.py integrity [--incremental] [--workers 4]   (exit status 1 if anything is found)
+    python cli.py shard shards/ --shards europe,americas,asia [--by airport --regions regions.json]
+    python cli.py snapshot replica.db [--pages 256]
+    python cli.py replicate replica.db [--batch-size 1000] [--follow 5 --prune]
+    python cli.py readers [--remove replica.db]
+
+Every command takes --database (default: aircraft_management_system_db.db),
+--archive (directory of the monthly archive, attached as Flight_History when
+it has any month), --query-stats (print the time spent per statement afterwards), --prometheus
+FILE (write the same numbers in Prometheus text format) and --slow-log FILE
+(statements slower than --slow-ms, with their query plan). """
+import argparse
+import json
+import sqlite3
+import sys
+import time
+
+# only what every run loads anyway (aircraft.initialise_database imports it): the subsystems a single
+# command uses (NumPy analytics, process pools, replication...) are imported by that command, which
+# also fills in their defaults
+from aircraft import initialise_database, list_all_tables, print_table_data
+from archive import DEFAULT_ARCHIVE_DIRECTORY, aircraft_history, archive_flights, attach_history, forget_archive
+from cache import get_result_cache
+from changelog import (create_change_log, get_offset, has_change_log, last_sequence, offsets, prune_change_log,
+    remove_offset, set_offset)
+from instrumentation import DEFAULT_SLOW_MS, InstrumentedConnection, query_stats
+from loader import DEFAULT_BATCH_SIZE, load_file, read_records
+from queries import STATEMENT_CACHE_SIZE, departures, flight_duration_and_passengers, flights_of_aircraft, pilots_on_flight
+from search import search
+from stats import stats_by_aircraft, stats_by_day, stats_by_pilot, stats_by_route
+from viewer import DEFAULT_PAGE_SIZE
+
+DEFAULT_DATABASE = "aircraft_management_system_db.db"
+
+
+def command_list(connection, args):
+    """ Prints the name of every table. """
+    for table_name in list_all_tables(connection) or []:
+        print(table_name)
+
+
+def command_view(connection, args):
+    """ Prints a table page by page. """
+    columns = args.columns.split(",") if args.columns else None
+    print_table_data(connection, args.table, args.page_size, columns, args.order_by)
+
+
+def command_search(connection, args):
+    """ Prints every row with a column equal to (or starting with) the value. """
+    results = search(connection, args.value, args.prefix)
+    for table_name, records in results.items():
+        for record in records:
+            print(f"{table_name}: {record}")
+    if not results:
+        print("No matching records were found")
+
+
+def command_flight(connection, args):
+    """ Prints the duration and passenger count of one flight, archived or live, and its crew. """
+    values = flight_duration_and_passengers(connection, args.flight_number)
+    if values is None:
+        print(f"No flight {args.flight_number}")
+        return 1
+    print(f"Total flight duration: {values[0]}\nTotal passenger count: {values[1]}")
+    for licence, first_name, last_name, ranking in pilots_on_flight(connection, args.flight_number):
+        print(f"{ranking}: {first_name} {last_name} ({licence})")
+
+
+def command_aircraft(connection, args):
+    """ Prints the flights of one aircraft in departure order. """
+    flights = flights_of_aircraft(connection, args.registration)
+    for flight_number, departure_airport, arrival_airport, departure, arrival in flights:
+        print(f"{flight_number}: {departure_airport} {departure} -> {arrival_airport} {arrival}")
+    if not flights:
+        print(f"No flights of {args.registration}")
+
+
+def command_departures(connection, args):
+    """ Prints the flights leaving an airport between two times. """
+    flights = departures(connection, args.airport, args.start, args.end)
+    for flight_number, arrival_airport, departure, arrival in flights:
+        print(f"{flight_number}: {departure} -> {arrival_airport} {arrival}")
+    if not flights:
+        print(f"No departures from {args.airport}")
+
+
+def command_stats(connection, args):
+    """ Prints the flight totals of one grouping as CSV-like lines. """
+    if args.group == "aircraft":
+        stats = stats_by_aircraft(connection)
+    elif args.group == "route":
+        stats = stats_by_route(connection)
+    elif args.group == "day":
+        stats = stats_by_day(connection, getattr(args, "from"), args.to)
+    else:
+        stats = stats_by_pilot(connection)
+    if stats:
+        print(", ".join(stats[0]))
+    for group in stats:
+        print(", ".join("" if value is None else f"{value:.3f}" if isinstance(value, float) else str(value)
+                        for value in group.values()))
+
+
+def command_load(connection, args):
+    """ Bulk loads a file and prints the rows/sec. """
+    report = load_file(connection, args.table, args.path, args.batch_size, not args.no_defer_indexes)
+    print(f"Loaded {report['rows']} rows into {args.table} in {report['seconds']:.2f}s "
+          f"({report['rows_per_second']:.0f} rows/sec)")
+
+
+def command_apply(connection, args):
+    """ Applies a changeset file (op, table, key and the new values per record) in one transaction. """
+    from changeset import ABSENT, apply_changes, read_changes
+    report = apply_changes(connection, read_changes(read_records(args.path, ABSENT)), args.batch_size)
+    print(f"Applied {report['changes']} changes ({report['rows']} rows, {report['cascaded']} cascaded) "
+          f"in {report['seconds']:.2f}s ({report['changes_per_second']:.0f} changes/sec)")
+
+
+def command_crew(connection, args):
+    """ Prints every crew conflict (overlapping legs, short rest, captain rule). """
+    from crew import DEFAULT_MIN_REST_MINUTES, CrewRoster
+    min_rest = DEFAULT_MIN_REST_MINUTES if args.min_rest is None else args.min_rest
+    conflicts = CrewRoster.from_database(connection, min_rest).conflicts()
+    for conflict in conflicts:
+        if conflict.kind == "captain":
+            print(f"captain: flight {conflict.flight} does not have exactly one Captain")
+        else:
+            print(f"{conflict.kind}: pilot {conflict.pilot} on {conflict.flight} and {conflict.other_flight}")
+    if not conflicts:
+        print("No crew conflicts")
+
+
+def command_route(connection, args):
+    """ Prints the fastest itinerary between two airports. """
+    from routes import DEFAULT_HORIZON_MINUTES, DEFAULT_MIN_CONNECTION_MINUTES, Timetable, minutes_to_text
+    itinerary = Timetable.from_database(connection).earliest_arrival(
+        args.origin, args.destination, args.after,
+        DEFAULT_MIN_CONNECTION_MINUTES if args.min_connection is None else args.min_connection,
+        DEFAULT_HORIZON_MINUTES if args.horizon is None else args.horizon)
+    if itinerary is None:
+        print(f"No itinerary from {args.origin} to {args.destination}")
+        return
+    for leg in itinerary:
+        print(f"{leg.flight}: {leg.departure_airport} {minutes_to_text(leg.departure)} -> "
+              f"{leg.arrival_airport} {minutes_to_text(leg.arrival)}")
+
+
+def command_archive(connection, args):
+    """ Moves the flights departing before the cutoff into the monthly archive. """
+    moved = archive_flights(connection, args.before, args.directory)
+    for month, rows in moved.items():
+        print(f"{month}: archived {rows} flights")
+    if not moved:
+        print(f"No flights before {args.before}")
+
+
+def command_history(connection, args):
+    """ Prints flights, passengers and block hours per aircraft over the archived months. """
+    history = aircraft_history(args.directory, args.first_month, args.last_month)
+    if history:
+        print(", ".join(history[0]))
+    for group in history:
+        print(", ".join(f"{value:.3f}" if isinstance(value, float) else str(value) for value in group.values()))
+
+
+def command_analytics(connection, args):
+    """ Prints load factors, utilisation or duration percentiles computed over a NumPy snapshot. """
+    from analytics import FleetSnapshot
+    snapshot = FleetSnapshot.from_database(connection)
+    if args.report == "load-factor":
+        stats = snapshot.load_factor(args.group or "aircraft")
+    elif args.report == "utilisation":
+        stats = snapshot.utilisation(getattr(args, "from"), args.to)
+    else:
+        stats = snapshot.duration_percentiles(args.group)
+        if args.group is None:
+            # one overall row: no Key column
+            stats = [{name: value for name, value in row.items() if name != "Key"} for row in stats]
+    if stats:
+        print(", ".join(stats[0]))
+    for group in stats:
+        print(", ".join("" if value is None else f"{value:.3f}" if isinstance(value, float)
+                        else "-".join(value) if isinstance(value, tuple) else str(value) for value in group.values()))
+
+
+def command_integrity(connection, args):
+    """ Prints every dangling foreign key and rank mismatch; with --incremental only those
+    the changes since the previous incremental run can have caused. """
+    from integrity import DEFAULT_WORKERS, check_integrity, summarize
+    since = None
+    if args.incremental:
+        if not has_change_log(connection):
+            create_change_log(connection)
+        since = get_offset(connection, "integrity")
+    checked_up_to = last_sequence(connection) if args.incremental else None
+    violations = []
+    workers = DEFAULT_WORKERS if args.workers is None else args.workers
+    for violation in check_integrity(connection, since, workers):
+        print(f"{violation.kind}: {violation.table} {violation.key}: {violation.column} = {violation.value!r} "
+              f"({violation.detail})")
+        violations.append(violation)
+    if args.incremental:
+        set_offset(connection, "integrity", checked_up_to)
+    for (kind, table_name, column), count in summarize(violations).items():
+        print(f"{count} {kind} violations in {table_name}.{column}", file=sys.stderr)
+    if not violations:
+        print("No integrity violations")
+    return 1 if violations else 0
+
+
+def command_shard(connection, args):
+    """ Splits the database into shard files, flights by departure airport region or month. """
+    from sharding import ShardMap, split_database
+    regions = None
+    if args.regions:
+        with open(args.regions) as regions_file:
+            regions = json.load(regions_file)
+    shard_map = ShardMap(args.directory, args.shards.split(","), args.by, regions)
+    connection.commit()
+    for shard, rows in split_database(args.database, shard_map, args.processes).items():
+        print(f"{shard}: " + ", ".join(f"{table_name} {count}" for table_name, count in rows.items()))
+
+
+def command_snapshot(connection, args):
+    """ Copies the database to a replica file while writes go on, printing the progress. """
+    from replication import DEFAULT_SNAPSHOT_PAGES, snapshot
+
+    def progress(status, remaining, total):
+        print(f"\rcopied {total - remaining}/{total} pages", end="", file=sys.stderr)
+
+    seq = snapshot(connection, args.replica, DEFAULT_SNAPSHOT_PAGES if args.pages is None else args.pages, progress)
+    print(file=sys.stderr)
+    print(f"Snapshot {args.replica} at change {seq}")
+
+
+def command_replicate(connection, args):
+    """ Applies the changes logged since the replica's snapshot (or last run), once or every --follow seconds. """
+    from replication import DEFAULT_REPLICATION_BATCH_SIZE, Replicator
+    batch_size = DEFAULT_REPLICATION_BATCH_SIZE if args.batch_size is None else args.batch_size
+    with Replicator(connection, args.replica, batch_size) as replicator:
+        while True:
+            report = replicator.sync()
+            print(f"Applied {report['changes']} changes in {report['batches']} batches "
+                  f"({report['changes_per_second']:.0f} changes/sec), replica at change {report['seq']}")
+            if args.prune:
+                prune_change_log(connection)
+            if args.follow is None:
+                break
+            time.sleep(args.follow)
+
+
+def command_readers(connection, args):
+    """ Lists the change log readers and the change each is at; --remove unregisters one (a reader
+    name, or the file of a replica), so its offset no longer holds back pruning. """
+    if not has_change_log(connection):
+        print("No change log")
+        return
+    if args.remove:
+        from replication import forget_replica
+        if not (remove_offset(connection, args.remove) or forget_replica(connection, args.remove)):
+            print(f"No reader {args.remove}")
+            return 1
+        print(f"Removed reader {args.remove}")
+    latest = last_sequence(connection)
+    for reader, seq in offsets(connection).items():
+        print(f"{reader}: at change {seq} of {latest}")
+
+
+def make_parser():
+    """ Builds the argument parser with one subcommand per command_* function. """
+    parser = argparse.ArgumentParser(description="Aircraft management system database")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLite database file")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIRECTORY, help="directory of the monthly archive")
+    parser.add_argument("--query-stats", action="store_true", help="print per-statement timings at the end")
+    parser.add_argument("--prometheus", help="write per-statement metrics to this file (Prometheus text format)")
+    parser.add_argument("--slow-log", help="append slow statements and their query plans to this file")
+    parser.add_argument("--slow-ms", type=float, default=DEFAULT_SLOW_MS, help="slow statement threshold")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="list all tables").set_defaults(run=command_list)
+
+    view = commands.add_parser("view", help="print the data of a table")
+    view.add_argument("table")
+    view.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    view.add_argument("--columns", help="comma separated columns to print")
+    view.add_argument("--order-by", help="indexed column to sort on")
+    view.set_defaults(run=command_view)
+
+    search_parser = commands.add_parser("search", help="find rows with a column equal to a value")
+    search_parser.add_argument("value")
+    search_parser.add_argument("--prefix", action="store_true", help="match values starting with value")
+    search_parser.set_defaults(run=command_search)
+
+    flight = commands.add_parser("flight", help="duration and passenger count of a flight (archived ones too)")
+    flight.add_argument("flight_number")
+    flight.set_defaults(run=command_flight)
+
+    aircraft = commands.add_parser("aircraft", help="flights of an aircraft in departure order")
+    aircraft.add_argument("registration")
+    aircraft.set_defaults(run=command_aircraft)
+
+    departures_parser = commands.add_parser("departures", help="flights leaving an airport between two times")
+    departures_parser.add_argument("airport")
+    departures_parser.add_argument("start", help="first departure time (YYYY-MM-DD[ HH:MM])")
+    departures_parser.add_argument("end", help="departures before this time")
+    departures_parser.set_defaults(run=command_departures)
+
+    stats = commands.add_parser("stats", help="flight totals by aircraft, route, day or pilot")
+    stats.add_argument("group", choices=["aircraft", "route", "day", "pilot"])
+    stats.add_argument("--from", help="first day (YYYY-MM-DD), stats by day only")
+    stats.add_argument("--to", help="last day (YYYY-MM-DD), stats by day only")
+    stats.set_defaults(run=command_stats)
+
+    load = commands.add_parser("load", help="bulk load a CSV or JSONL file into a table")
+    load.add_argument("table")
+    load.add_argument("path")
+    load.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    load.add_argument("--no-defer-indexes", action="store_true")
+    load.set_defaults(run=command_load)
+
+    apply = commands.add_parser("apply", help="apply a CSV or JSONL changeset in one transaction")
+    apply.add_argument("path")
+    apply.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    apply.set_defaults(run=command_apply)
+
+    crew = commands.add_parser("crew", help="check crew assignments for conflicts")
+    crew.add_argument("--min-rest", type=int, help="minimum minutes between two legs of a pilot (default 30)")
+    crew.set_defaults(run=command_crew)
+
+    route = commands.add_parser("route", help="fastest itinerary between two airports")
+    route.add_argument("origin")
+    route.add_argument("destination")
+    route.add_argument("after", help="earliest departure (YYYY-MM-DD HH:MM)")
+    route.add_argument("--min-connection", type=int, help="minimum minutes between two legs (default 45)")
+    route.add_argument("--horizon", type=int, help="latest arrival in minutes after the departure time (default 2880)")
+    route.set_defaults(run=command_route)
+
+    archive = commands.add_parser("archive", help="move old flights into the monthly archive files")
+    archive.add_argument("before", help="archive the flights departing before this (YYYY-MM-DD)")
+    archive.add_argument("--directory", default=DEFAULT_ARCHIVE_DIRECTORY)
+    archive.set_defaults(run=command_archive)
+
+    history = commands.add_parser("history", help="flight totals by aircraft over the archived months")
+    history.add_argument("--directory", default=DEFAULT_ARCHIVE_DIRECTORY)
+    history.add_argument("--first-month", help="first month (YYYY-MM)")
+    history.add_argument("--last-month", help="last month (YYYY-MM)")
+    history.set_defaults(run=command_history)
+
+    analytics = commands.add_parser("analytics", help="fleet analytics over a NumPy snapshot (needs NumPy)")
+    analytics.add_argument("report", choices=["load-factor", "utilisation", "durations"])
+    analytics.add_argument("--group", choices=["aircraft", "route", "departure_airport", "arrival_airport"],
+                           help="grouping of load-factor (default aircraft) and durations (default none)")
+    analytics.add_argument("--from", help="start of the utilisation window (YYYY-MM-DD[ HH:MM])")
+    analytics.add_argument("--to", help="end of the utilisation window (YYYY-MM-DD[ HH:MM])")
+    analytics.set_defaults(run=command_analytics)
+
+    integrity = commands.add_parser("integrity", help="find dangling foreign keys and rank mismatches")
+    integrity.add_argument("--incremental", action="store_true",
+                           help="only check what changed since the last incremental run (keeps a change log)")
+    integrity.add_argument("--workers", type=int, help="checks run in parallel (default 4)")
+    integrity.set_defaults(run=command_integrity)
+
+    shard = commands.add_parser("shard", help="split the database into per-region (or per-month) shard files")
+    shard.add_argument("directory", help="new directory of the shard files")
+    shard.add_argument("--shards", required=True, help="comma separated shard names")
+    shard.add_argument("--by", choices=["airport", "month"], default="airport")
+    shard.add_argument("--regions", help="JSON file mapping departure airport codes to shard names")
+    shard.add_argument("--processes", type=int, help="worker processes (one per CPU by default)")
+    shard.set_defaults(run=command_shard)
+
+    snapshot_parser = commands.add_parser("snapshot", help="consistent online copy of the database for a replica")
+    snapshot_parser.add_argument("replica", help="replica file (overwritten)")
+    snapshot_parser.add_argument("--pages", type=int, help="pages per backup step (default 256)")
+    snapshot_parser.set_defaults(run=command_snapshot)
+
+    replicate = commands.add_parser("replicate", help="apply the change log to a replica made by snapshot")
+    replicate.add_argument("replica")
+    replicate.add_argument("--batch-size", type=int, help="log rows applied per replica transaction (default 1000)")
+    replicate.add_argument("--follow", type=float, help="keep replicating every this many seconds")
+    replicate.add_argument("--prune", action="store_true", help="delete the log rows every reader has applied")
+    replicate.set_defaults(run=command_replicate)
+
+    readers = commands.add_parser("readers", help="list (or remove) the readers of the change log")
+    readers.add_argument("--remove", help="reader name or replica file to unregister")
+    readers.set_defaults(run=command_readers)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    query_stats.slow_ms, query_stats.slow_log_path = args.slow_ms, args.slow_log
+    connection = sqlite3.connect(args.database, cached_statements=STATEMENT_CACHE_SIZE,
+                                 factory=InstrumentedConnection)
+    try:
+        initialise_database(connection)
+        attach_history(connection, args.archive)
+        status = args.run(connection, args)
+    except (sqlite3.Error, ValueError, ImportError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        if args.query_stats:
+            print(query_stats.report(), file=sys.stderr)
+            print(f"result cache: {get_result_cache(connection).stats()}", file=sys.stderr)
+        forget_archive(connection)
+        connection.close()
+        if args.prometheus:
+            with open(args.prometheus, "w") as metrics:
+                metrics.write(query_stats.prometheus())
+    return status or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+""" Crew rostering checks over Pilot_Flight.
+
+The assignments are loaded once (Pilot_Flight joined to the Flight times) into
+one array of legs per pilot, sorted by departure. A sweep over each array
+finds the conflicts:
+- overlap: a pilot is on two flights at the same time,
+- rest: less than min_rest minutes between the arrival of one leg and the
+  departure of the pilot's next leg,
+- captain: a crewed flight without exactly one Captain.
+
+Changes (assign, unassign, retime_flight) re-check only the legs around the
+change, found with bisect, instead of re-running the whole sweep. """
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from availability import to_minutes
+
+DEFAULT_MIN_REST_MINUTES = 30
+
+Conflict = namedtuple("Conflict", ["kind", "pilot", "flight", "other_flight"])
+Leg = namedtuple("Leg", ["start", "end", "flight", "pilot_flight_id"])
+
+roster_query = """ SELECT Pilot_Flight.Pilot_Flight_ID, Pilot_Flight.Commercial_Pilot_License_Number,
+    Pilot_Flight.Flight_Number, Pilot_Flight.Pilot_Ranking, Flight.Departure_Date_Time, Flight.Arrival_Date_Time
+FROM Pilot_Flight JOIN Flight ON Flight.Flight_Number = Pilot_Flight.Flight_Number
+WHERE Pilot_Flight.Commercial_Pilot_License_Number IS NOT NULL
+ORDER BY Pilot_Flight.Commercial_Pilot_License_Number, Flight.Departure_Date_Time; """
+
+
+def _minutes(value):
+    """ Epoch minutes of a datetime or string; ints are already epoch minutes. """
+    return value if isinstance(value, int) else to_minutes(value)
+
+
+def _times(leg):
+    """ Sort key of a leg by time only (pilot_flight_id may be None). """
+    return leg.start, leg.end
+
+
+class CrewRoster:
+    """ In-memory roster of every pilot's legs.
+
+    Variables:
+    min_rest (int): minimum minutes between two legs of the same pilot """
+
+    def __init__(self, min_rest=DEFAULT_MIN_REST_MINUTES):
+        self.min_rest = min_rest
+        self._legs = {}          # pilot -> list of Leg sorted by (start, end, flight)
+        self._longest = {}       # pilot -> longest leg in minutes (bounds the backward search)
+        self._assignments = {}   # Pilot_Flight_ID -> (pilot, flight, ranking)
+        self._flight_times = {}  # flight -> (start, end)
+        self._crew = {}          # flight -> set of Pilot_Flight_IDs
+        self._captains = {}      # flight -> number of captains
+
+    @classmethod
+    def from_database(cls, connection, min_rest=DEFAULT_MIN_REST_MINUTES):
+        """ Loads every assignment with a timed flight in one query.
+
+        Variables:
+        connection: connection to the database
+        min_rest: minimum minutes between two legs of the same pilot
+
+        Returns:
+        roster: the loaded CrewRoster """
+        roster = cls(min_rest)
+        cursor = connection.cursor()
+        cursor.execute(roster_query)
+        for pilot_flight_id, pilot, flight, ranking, departure, arrival in cursor.fetchall():
+            if departure is None or arrival is None:
+                continue
+            roster._flight_times[flight] = (to_minutes(departure), to_minutes(arrival))
+            roster._add(pilot_flight_id, pilot, flight, ranking)
+        return roster
+
+    def _add(self, pilot_flight_id, pilot, flight, ranking):
+        """ Records an assignment (the flight times must be known). """
+        start, end = self._flight_times[flight]
+        insort(self._legs.setdefault(pilot, []), Leg(start, end, flight, pilot_flight_id))
+        self._longest[pilot] = max(self._longest.get(pilot, 0), end - start)
+        self._assignments[pilot_flight_id] = (pilot, flight, ranking)
+        self._crew.setdefault(flight, set()).add(pilot_flight_id)
+        if ranking == "Captain":
+            self._captains[flight] = self._captains.get(flight, 0) + 1
+
+    def _remove(self, pilot_flight_id):
+        """ Forgets an assignment. """
+        pilot, flight, ranking = self._assignments.pop(pilot_flight_id)
+        legs = self._legs[pilot]
+        start, end = self._flight_times[flight]
+        del legs[bisect_left(legs, Leg(start, end, flight, pilot_flight_id))]
+        self._crew[flight].discard(pilot_flight_id)
+        if ranking == "Captain":
+            self._captains[flight] -= 1
+
+    def _leg_conflicts(self, pilot, leg):
+        """ Conflicts between one leg and the pilot's other legs, using bisect on the sorted array. """
+        legs = self._legs.get(pilot, [])
+        conflicts = []
+        # earlier legs: only those starting less than the longest leg + rest before this one can reach it
+        i = bisect_left(legs, (leg.start,))
+        horizon = leg.start - self._longest.get(pilot, 0) - self.min_rest
+        j = i - 1
+        while j >= 0 and legs[j].start >= horizon:
+            conflicts.extend(self._pair_conflicts(pilot, legs[j], leg))
+            j -= 1
+        # later legs (and legs starting at the same minute)
+        j = i
+        while j < len(legs) and legs[j].start < leg.end + self.min_rest:
+            if legs[j].pilot_flight_id != leg.pilot_flight_id:
+                conflicts.extend(self._pair_conflicts(pilot, *sorted((leg, legs[j]), key=_times)))
+            j += 1
+        return conflicts
+
+    def _pair_conflicts(self, pilot, first, second):
+        """ Conflict between two legs of a pilot, first departing no later than second. """
+        if first.flight == second.flight:
+            return []
+        if second.start < first.end:
+            return [Conflict("overlap", pilot, first.flight, second.flight)]
+        if second.start - first.end < self.min_rest:
+            return [Conflict("rest", pilot, first.flight, second.flight)]
+        return []
+
+    def _captain_conflicts(self, flight):
+        """ Captain rule for one flight: a crewed flight needs exactly one Captain. """
+        if self._crew.get(flight) and self._captains.get(flight, 0) != 1:
+            return [Conflict("captain", None, flight, None)]
+        return []
+
+    def conflicts(self):
+        """ Full sweep over every pilot's sorted legs.
+
+        Returns:
+        conflicts: list of Conflict(kind, pilot, flight, other_flight) """
+        conflicts = []
+        for pilot, legs in self._legs.items():
+            # sweep line: active holds the earlier legs that still end within min_rest of the current departure
+            active = []
+            for leg in legs:
+                active = [earlier for earlier in active if earlier.end + self.min_rest > leg.start]
+                for earlier in active:
+                    conflicts.extend(self._pair_conflicts(pilot, earlier, leg))
+                active.append(leg)
+        for flight in self._crew:
+            conflicts.extend(self._captain_conflicts(flight))
+        return conflicts
+
+    def check_assignment(self, pilot, flight, ranking, start=None, end=None):
+        """ Conflicts that assigning a pilot to a flight would create, without changing the roster.
+
+        Variables:
+        pilot: Commercial_Pilot_License_Number
+        flight: Flight_Number
+        ranking: Pilot_Ranking on that flight
+        start, end: flight times (datetime, string or epoch minutes) if the roster does not know the flight
+
+        Returns:
+        conflicts: list of Conflict """
+        if start is not None:
+            start_minutes, end_minutes = _minutes(start), _minutes(end)
+        else:
+            start_minutes, end_minutes = self._flight_times[flight]
+        leg = Leg(start_minutes, end_minutes, flight, None)
+        conflicts = self._leg_conflicts(pilot, leg)
+        if ranking == "Captain" and self._captains.get(flight, 0) >= 1:
+            conflicts.append(Conflict("captain", pilot, flight, None))
+        return conflicts
+
+    def assign(self, pilot_flight_id, pilot, flight, ranking, start=None, end=None):
+        """ Adds an assignment and returns the conflicts it is part of. """
+        if start is not None:
+            self._flight_times[flight] = (_minutes(start), _minutes(end))
+        self._add(pilot_flight_id, pilot, flight, ranking)
+        start_minutes, end_minutes = self._flight_times[flight]
+        leg = Leg(start_minutes, end_minutes, flight, pilot_flight_id)
+        return self._leg_conflicts(pilot, leg) + self._captain_conflicts(flight)
+
+    def unassign(self, pilot_flight_id):
+        """ Removes an assignment and returns the captain conflict it leaves, if any. """
+        flight = self._assignments[pilot_flight_id][1]
+        self._remove(pilot_flight_id)
+        return self._captain_conflicts(flight)
+
+    def retime_flight(self, flight, start, end):
+        """ Moves a flight and returns the conflicts of every crew member on it. """
+        assignments = [(pilot_flight_id, *self._assignments[pilot_flight_id])
+                       for pilot_flight_id in self._crew.get(flight, ())]
+        for pilot_flight_id, *_ in assignments:
+            self._remove(pilot_flight_id)
+        self._flight_times[flight] = (_minutes(start), _minutes(end))
+        conflicts = []
+        for pilot_flight_id, pilot, _, ranking in assignments:
+            self._add(pilot_flight_id, pilot, flight, ranking)
+        for pilot_flight_id, pilot, _, _ in assignments:
+            conflicts.extend(self._leg_conflicts(pilot, Leg(*self._flight_times[flight], flight, pilot_flight_id)))
+        return conflicts + self._captain_conflicts(flight)
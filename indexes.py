@@ -0,0 +1,136 @@
+""" Secondary indexes of the database and a query plan check for the built-in queries.
+
+The tables only come with their primary keys, so every filter on a non key
+column and every join on a foreign key would scan a whole table. The
+indexes below cover the menu filters (Aircraft.Status, Pilot.Pilot_Ranking),
+the foreign key joins on Aircraft_Registration_Number / Flight_Number and
+departures by airport and time.
+
+Usage (exits with status 1 if any built-in query plans a SCAN):
+    python indexes.py [database_file] """
+import sys
+import sqlite3
+from sqlite3 import Error
+
+from availability import available_aircraft_at_query, create_availability_index
+from queries import departures_query, flights_of_aircraft_query, pilots_on_flight_query, select_query
+from schema import tables_to_create
+from search import create_search_index, prefix_search_query, search_query
+
+managed_indexes = {
+    "Flight_Aircraft": "CREATE INDEX IF NOT EXISTS Flight_Aircraft ON Flight (Aircraft_Registration_Number, Departure_Date_Time);",
+    "Flight_Departure": "CREATE INDEX IF NOT EXISTS Flight_Departure ON Flight (Departure_Airport_Code, Departure_Date_Time);",
+    "Flight_Arrival": "CREATE INDEX IF NOT EXISTS Flight_Arrival ON Flight (Arrival_Airport_Code, Arrival_Date_Time);",
+    "Aircraft_Status": "CREATE INDEX IF NOT EXISTS Aircraft_Status ON Aircraft (Status);",
+    # only the active fleet is ever scheduled, so lookups that spell out Status='Active' use a smaller index
+    "Aircraft_Active": "CREATE INDEX IF NOT EXISTS Aircraft_Active ON Aircraft (Aircraft_Registration_Number, Seat_Capacity) WHERE Status = 'Active';",
+    "Pilot_Ranking": "CREATE INDEX IF NOT EXISTS Pilot_Ranking ON Pilot (Pilot_Ranking);",
+    "Pilot_Flight_Flight": "CREATE INDEX IF NOT EXISTS Pilot_Flight_Flight ON Pilot_Flight (Flight_Number);",
+    "Pilot_Flight_Pilot": "CREATE INDEX IF NOT EXISTS Pilot_Flight_Pilot ON Pilot_Flight (Commercial_Pilot_License_Number);",
+    "Aircraft_Flight_Flight": "CREATE INDEX IF NOT EXISTS Aircraft_Flight_Flight ON Aircraft_Flight (Flight_Number);",
+    "Aircraft_Flight_Aircraft": "CREATE INDEX IF NOT EXISTS Aircraft_Flight_Aircraft ON Aircraft_Flight (Aircraft_Registration_Number);",
+    "Aircraft_Destination_Aircraft": "CREATE INDEX IF NOT EXISTS Aircraft_Destination_Aircraft ON Aircraft_Destination (Aircraft_Registration_Number);",
+    "Aircraft_Destination_Airport": "CREATE INDEX IF NOT EXISTS Aircraft_Destination_Airport ON Aircraft_Destination (Airport_Destination_Code);",
+}
+
+# (name, query, sample parameters) of every built-in lookup that must not scan a table
+builtin_queries = [
+    ("flight duration and passengers (option 7)",
+     select_query("Flight", ("Flight_Duration", "Passenger_Count"), "Flight_Number"), ("B777",)),
+    ("aircraft by status (option 8)",
+     select_query("Aircraft", ("Aircraft_Registration_Number", "Manufacturer"), "Status"), ("Active",)),
+    ("active aircraft",
+     "SELECT Aircraft_Registration_Number, Seat_Capacity FROM Aircraft WHERE Status = 'Active';", ()),
+    ("pilots by rank (option 9)",
+     select_query("Pilot", ("First_Name", "Last_Name"), "Pilot_Ranking"), ("Captain",)),
+    ("flights of an aircraft (cli aircraft)", flights_of_aircraft_query, ("EI-DCJ",)),
+    ("pilots on a flight (cli flight)", pilots_on_flight_query, ("B777",)),
+    ("departures by airport and time (cli departures)", departures_query, ("MAD", "2023-11-01", "2023-11-02")),
+    ("search (option 3)", search_query, ("EDI",)),
+    ("prefix search (cli search --prefix)", prefix_search_query, ("ED%",)),
+    ("available aircraft (option 8)", available_aircraft_at_query, (0, 1, 0, "2023-11-01 08:00:00", "MAD")),
+]
+
+
+def create_indexes(connection):
+    """ Creates every managed index that does not exist yet.
+
+    Variables:
+    connection: connection to the database """
+    try:
+        cursor = connection.cursor()
+        for index_query in managed_indexes.values():
+            cursor.execute(index_query)
+        connection.commit()
+    except Error as e:
+        print(e)
+
+
+def drop_indexes(connection):
+    """ Drops every managed index (e.g. to compare plans without them). """
+    cursor = connection.cursor()
+    for name in managed_indexes:
+        cursor.execute(f"DROP INDEX IF EXISTS {name};")
+    connection.commit()
+
+
+def query_plan(connection, query, params=()):
+    """ Gets the EXPLAIN QUERY PLAN details of a query.
+
+    Returns:
+    details: one string per plan step, e.g. 'SEARCH Flight USING INDEX ...' """
+    cursor = connection.cursor()
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def is_full_scan(detail):
+    """ Whether a plan step reads a whole table.
+
+    A virtual table (e.g. the R*Tree) always reports SCAN, it only reads the
+    whole table when no constraint is passed to its index ('INDEX n:' with
+    nothing after the colon). """
+    if not detail.startswith("SCAN"):
+        return False
+    if "VIRTUAL TABLE INDEX" in detail:
+        return detail.endswith(":")
+    return True
+
+
+def check_query_plans(connection):
+    """ Runs EXPLAIN QUERY PLAN over every built-in query.
+
+    Variables:
+    connection: connection to the database
+
+    Returns:
+    failures: list of (query name, plan details) for the queries that plan a full SCAN """
+    failures = []
+    for name, query, params in builtin_queries:
+        details = query_plan(connection, query, params)
+        if any(is_full_scan(detail) for detail in details):
+            failures.append((name, details))
+    return failures
+
+
+def main():
+    database_file = sys.argv[1] if len(sys.argv) > 1 else ":memory:"
+    connection = sqlite3.connect(database_file)
+    if database_file == ":memory:":
+        for table_query in tables_to_create:
+            connection.execute(table_query)
+        create_search_index(connection)
+        create_availability_index(connection)
+    create_indexes(connection)
+    failures = check_query_plans(connection)
+    for name, details in failures:
+        print(f"SCAN in {name}:")
+        for detail in details:
+            print(f"    {detail}")
+    print(f"{len(builtin_queries) - len(failures)}/{len(builtin_queries)} built-in queries use an index")
+    connection.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
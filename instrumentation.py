@@ -0,0 +1,300 @@
+""" Per-statement timing, row counts and a slow-query log for sqlite3 connections.
+
+Connections opened with factory=InstrumentedConnection record every statement
+they run (cursor.execute, connection.execute, executemany, and the rows
+fetched afterwards) into a QueryStats registry, keyed by the normalized
+statement (whitespace collapsed, literals replaced by ?):
+- calls, errors, rows (returned, or changed for writes),
+- a latency histogram (execute + fetch time),
+- VM steps, counted with the sqlite3 progress handler (one callback every
+  PROGRESS_STEPS virtual machine instructions).
+
+Statements slower than slow_ms are appended to the slow-query log together
+with their EXPLAIN QUERY PLAN. The registry prints as a table (report) or as
+Prometheus text (prometheus). """
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+# VM instructions between two progress handler callbacks
+PROGRESS_STEPS = 1000
+DEFAULT_SLOW_MS = 100.0
+# upper bounds (ms) of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+# distinct statement texts whose normalized form is kept (the regexes run once per text)
+NORMALIZE_CACHE_SIZE = 1024
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_value_list = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_whitespace = re.compile(r"\s+")
+_explainable = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(sql):
+    """ Statement text with literals replaced by ? and whitespace collapsed, so
+    'SELECT * FROM Flight WHERE Passenger_Count = 120' and '... = 80' share one entry. """
+    sql = _string_literal.sub("?", sql)
+    sql = _number_literal.sub("?", sql)
+    sql = _value_list.sub("(...)", sql)
+    return _whitespace.sub(" ", sql).strip().rstrip(";").strip()
+
+
+class StatementStats:
+    """ Totals and latency histogram of one normalized statement. """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.steps = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, seconds, rows, steps, error=False):
+        self.calls += 1
+        self.errors += error
+        self.rows += rows
+        self.steps += steps
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        milliseconds = seconds * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if milliseconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile_ms(self, fraction):
+        """ Upper bound (ms) of the bucket holding the given fraction of the calls. """
+        target = fraction * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else float("inf")
+        return 0.0
+
+
+class QueryStats:
+    """ Thread-safe registry of StatementStats plus the slow-query log.
+
+    Variables:
+    slow_ms (float): statements slower than this are logged with their query plan
+    slow_log_path (str): file the slow queries are appended to, None to keep them in memory only """
+
+    def __init__(self, slow_ms=DEFAULT_SLOW_MS, slow_log_path=None):
+        self.slow_ms = slow_ms
+        self.slow_log_path = slow_log_path
+        self.slow_queries = deque(maxlen=100)
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds, rows, steps, error=False):
+        """ Adds one execution of a statement. """
+        key = normalize(sql)
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is None:
+                statement = self._statements[key] = StatementStats()
+            statement.add(seconds, rows, steps, error)
+
+    def log_slow(self, sql, seconds, rows, steps, plan):
+        """ Keeps a slow statement (and appends it to slow_log_path if set). """
+        entry = {"time": datetime.now().isoformat(timespec="seconds"), "ms": seconds * 1000,
+                 "rows": rows, "steps": steps, "sql": _whitespace.sub(" ", sql).strip(), "plan": plan}
+        with self._lock:
+            self.slow_queries.append(entry)
+            if self.slow_log_path:
+                with open(self.slow_log_path, "a") as log:
+                    log.write(f"{entry['time']} {entry['ms']:.1f} ms rows={rows} steps={steps}: {entry['sql']}\n")
+                    for line in plan:
+                        log.write(f"    {line}\n")
+
+    def statements(self):
+        """ Snapshot of (normalized statement, StatementStats), slowest total first. """
+        with self._lock:
+            items = list(self._statements.items())
+        return sorted(items, key=lambda item: item[1].seconds, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.slow_queries.clear()
+
+    def report(self, limit=20):
+        """ Text table of the statements with the most total time. """
+        lines = [f"{'calls':>7} {'errors':>6} {'total ms':>10} {'mean ms':>9} {'p99 ms':>8} {'max ms':>9} "
+                 f"{'rows':>9} {'steps':>11}  statement"]
+        for sql, statement in self.statements()[:limit]:
+            lines.append(f"{statement.calls:7d} {statement.errors:6d} {statement.seconds * 1000:10.2f} "
+                         f"{statement.seconds * 1000 / statement.calls:9.3f} {statement.percentile_ms(0.99):8g} "
+                         f"{statement.max_seconds * 1000:9.2f} {statement.rows:9d} {statement.steps:11d}  {sql[:120]}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """ The registry in the Prometheus text exposition format. """
+        lines = [
+            "# HELP sqlite_query_duration_seconds Statement latency (execute + fetch).",
+            "# TYPE sqlite_query_duration_seconds histogram",
+        ]
+        counters = {"sqlite_query_rows_total": [], "sqlite_query_steps_total": [], "sqlite_query_errors_total": []}
+        for sql, statement in self.statements():
+            label = 'statement="' + sql.replace("\\", "\\\\").replace('"', '\\"') + '"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS, statement.buckets):
+                cumulative += count
+                lines.append(f'sqlite_query_duration_seconds_bucket{{{label},le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'sqlite_query_duration_seconds_bucket{{{label},le="+Inf"}} {statement.calls}')
+            lines.append(f"sqlite_query_duration_seconds_sum{{{label}}} {statement.seconds}")
+            lines.append(f"sqlite_query_duration_seconds_count{{{label}}} {statement.calls}")
+            counters["sqlite_query_rows_total"].append(f"sqlite_query_rows_total{{{label}}} {statement.rows}")
+            counters["sqlite_query_steps_total"].append(f"sqlite_query_steps_total{{{label}}} {statement.steps}")
+            counters["sqlite_query_errors_total"].append(f"sqlite_query_errors_total{{{label}}} {statement.errors}")
+        helps = {"sqlite_query_rows_total": "Rows returned (reads) or changed (writes).",
+                 "sqlite_query_steps_total": "SQLite VM instructions, counted by the progress handler.",
+                 "sqlite_query_errors_total": "Statements that raised an error."}
+        for name, samples in counters.items():
+            lines.append(f"# HELP {name} {helps[name]}")
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# registry used by connections that are not given one
+query_stats = QueryStats()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """ Cursor that reports each statement to its connection's QueryStats.
+
+    A statement is recorded once its rows are all fetched (or on the next
+    execute / close), so the latency and steps include the fetches. """
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._pending = None  # [sql, params, seconds, rows, steps]
+
+    def _run(self, method, sql, params, plan_params):
+        self._finish()
+        connection = self.connection
+        steps = connection._steps
+        start = time.perf_counter()
+        try:
+            method(sql, params)
+        except sqlite3.Error:
+            connection.query_stats.record(sql, time.perf_counter() - start, 0,
+                                          (connection._steps - steps) * PROGRESS_STEPS, error=True)
+            raise
+        self._pending = [sql, plan_params, time.perf_counter() - start, 0, connection._steps - steps]
+        if self.description is None:
+            # writes and DDL return no rows: record them now with the rows they changed
+            self._pending[3] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, None)
+
+    def _fetched(self, start, steps, rows, done):
+        """ Adds a fetch to the pending statement. """
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+            self._pending[3] += rows
+            self._pending[4] += self.connection._steps - steps
+            if done:
+                self._finish()
+
+    def fetchone(self):
+        start, steps = time.perf_counter(), self.connection._steps
+        row = super().fetchone()
+        self._fetched(start, steps, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start, steps = time.perf_counter(), self.connection._steps
+        rows = super().fetchmany(size)
+        self._fetched(start, steps, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start, steps = time.perf_counter(), self.connection._steps
+        rows = super().fetchall()
+        self._fetched(start, steps, len(rows), True)
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # a cursor dropped before its last row was fetched (e.g. after one fetchone)
+        try:
+            self._finish()
+        except sqlite3.Error:
+            pass
+
+    def _finish(self):
+        """ Records the pending statement, with its query plan if it was slow. """
+        if self._pending is None:
+            return
+        sql, params, seconds, rows, steps = self._pending
+        self._pending = None
+        connection = self.connection
+        steps *= PROGRESS_STEPS
+        stats = connection.query_stats
+        stats.record(sql, seconds, rows, steps)
+        if seconds * 1000 >= stats.slow_ms:
+            stats.log_slow(sql, seconds, rows, steps, connection.query_plan(sql, params))
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """ sqlite3 connection whose statements are recorded in query_stats.
+
+    Use as sqlite3.connect(path, factory=InstrumentedConnection). """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_stats = query_stats
+        self._steps = 0
+        self.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def _progress(self):
+        self._steps += 1
+        return 0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def query_plan(self, sql, params=()):
+        """ EXPLAIN QUERY PLAN lines of a statement, [] if it has none. """
+        if not _explainable.match(sql) or not isinstance(params, (tuple, list, dict)):
+            return []
+        try:
+            rows = sqlite3.Connection.execute(self, f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error:
+            return []
+        return [row[-1] for row in rows]
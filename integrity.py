@@ -0,0 +1,245 @@
+""" Set-based integrity checks: dangling foreign keys and pilot ranks.
+
+SQLite does not enforce the REFERENCES clauses here (PRAGMA foreign_keys
+is off), so nothing stops a Pilot_Flight row from naming a pilot that does
+not exist. check_integrity finds, with one anti-join per foreign key of the
+schema catalog (child rows whose value has no parent row), every dangling
+reference, and with one join every Pilot_Flight row whose Pilot_Ranking
+does not fit the rank of the pilot in Pilot (rank_rules).
+
+The checks run in parallel on worker threads, each with its own
+connection (SQLite runs the queries without holding the GIL). Work is split
+per check rather than per table, since Pilot_Flight alone has three. The
+violations are yielded as soon as a worker fetches them. Every worker
+connection starts its read transaction while one more connection holds the
+write lock, so no commit lands between them: all the checks see the
+database as of the same moment (with one worker, the checks share one read
+transaction of the connection itself).
+
+With since=Seq of the change log (changelog.py) only the rows that can
+have become invalid are checked: the child rows written after since, and
+the child rows referencing a parent key written after since. """
+import queue
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from changelog import has_change_log
+from instrumentation import InstrumentedConnection
+from schema import get_catalog
+
+Violation = namedtuple("Violation", ["kind", "table", "key", "column", "value", "detail"])
+
+DEFAULT_WORKERS = 4
+FETCH_SIZE = 1000
+
+# Pilot_Flight.Pilot_Ranking -> the Pilot.Pilot_Ranking values allowed with it
+rank_rules = {
+    "Captain": ("Captain",),
+    "Second officer": ("Captain", "Cadet"),
+    "Cadet": ("Cadet",),
+    "Pilot Cadet": ("Cadet",),
+}
+
+_changed_keys = "(SELECT Row_Key FROM _Change_Log WHERE Table_Name = '{table}' AND Seq > :since)"
+
+
+def _foreign_key_checks(connection, table_name, incremental):
+    """ (kind, column, query, detail) of every foreign key of a table. """
+    catalog = get_catalog(connection)
+    key_column = catalog.primary_key(table_name)[0]
+    checks = []
+    for foreign_key in catalog.foreign_keys(table_name):
+        parent_column = foreign_key.to_column or catalog.primary_key(foreign_key.table)[0]
+        query = (f"SELECT child.{key_column}, child.{foreign_key.column} FROM {table_name} AS child "
+                 f"WHERE child.{foreign_key.column} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {foreign_key.table} "
+                 f"AS parent WHERE parent.{parent_column} = child.{foreign_key.column})")
+        if incremental:
+            query += (f" AND (child.{key_column} IN {_changed_keys.format(table=table_name)}"
+                      f" OR child.{foreign_key.column} IN {_changed_keys.format(table=foreign_key.table)})")
+        checks.append(("foreign_key", foreign_key.column, query + ";",
+                       f"no {foreign_key.table} with {parent_column} = {{}}"))
+    return checks
+
+
+def _rank_checks(incremental):
+    """ (kind, column, query, detail) of the Pilot_Flight / Pilot rank rule. """
+    allowed = ", ".join(f"('{flight_rank}', '{pilot_rank}')"
+                        for flight_rank, pilot_ranks in rank_rules.items() for pilot_rank in pilot_ranks)
+    query = ("SELECT Pilot_Flight.Pilot_Flight_ID, Pilot_Flight.Pilot_Ranking, Pilot.Pilot_Ranking "
+             "FROM Pilot_Flight JOIN Pilot "
+             "ON Pilot.Commercial_Pilot_License_Number = Pilot_Flight.Commercial_Pilot_License_Number "
+             f"WHERE (Pilot_Flight.Pilot_Ranking, Pilot.Pilot_Ranking) NOT IN (VALUES {allowed})")
+    if incremental:
+        # both sides of the OR on Pilot_Flight, so each can use an index of it
+        query += (f" AND (Pilot_Flight.Pilot_Flight_ID IN {_changed_keys.format(table='Pilot_Flight')}"
+                  f" OR Pilot_Flight.Commercial_Pilot_License_Number IN {_changed_keys.format(table='Pilot')})")
+    return [("rank", "Pilot_Ranking", query + ";", "pilot's rank in Pilot is {}")]
+
+
+def _checks(connection, incremental):
+    """ table -> its checks, for the tables that have any. """
+    catalog = get_catalog(connection)
+    checks = {}
+    for table_name in catalog.tables():
+        table_checks = _foreign_key_checks(connection, table_name, incremental)
+        if table_name == "Pilot_Flight" and catalog.has_table("Pilot"):
+            table_checks += _rank_checks(incremental)
+        if table_checks:
+            checks[table_name] = table_checks
+    return checks
+
+
+def _run_checks(connection, table_name, checks, since):
+    """ Runs the checks of one table.
+
+    Returns:
+    generator of lists of Violation (at most FETCH_SIZE each) """
+    cursor = connection.cursor()
+    for kind, column, query, detail in checks:
+        cursor.execute(query, {"since": since})
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield [Violation(kind, table_name, row[0], column, row[1], detail.format(row[-1])) for row in rows]
+
+
+def _database_file(connection):
+    """ File of the main database, None for an in-memory one. """
+    return connection.execute("PRAGMA database_list;").fetchone()[2] or None
+
+
+def _snapshot_connections(database_file, count):
+    """ Opens count connections whose read transactions all start at the same moment.
+
+    A separate connection takes the write lock (BEGIN IMMEDIATE) while each
+    worker connection begins a transaction and reads, then lets it go: no
+    commit can land in between, so they all see the same version of the
+    database until they end their transaction.
+
+    Raises:
+    sqlite3.OperationalError: the write lock stayed taken (e.g. by an uncommitted write) """
+    gate = sqlite3.connect(database_file)
+    worker_connections = []
+    try:
+        gate.execute("BEGIN IMMEDIATE;")
+        for _ in range(count):
+            worker_connection = sqlite3.connect(database_file, check_same_thread=False,
+                                                factory=InstrumentedConnection)
+            worker_connections.append(worker_connection)
+            worker_connection.execute("BEGIN;")
+            worker_connection.execute("SELECT count(*) FROM sqlite_master;").fetchone()
+    except sqlite3.Error:
+        for worker_connection in worker_connections:
+            worker_connection.close()
+        raise
+    finally:
+        gate.rollback()
+        gate.close()
+    return worker_connections
+
+
+def check_integrity(connection, since=None, workers=DEFAULT_WORKERS):
+    """ Finds dangling foreign keys and rank mismatches, streaming the violations.
+
+    Variables:
+    connection: connection to the database
+    since: change log Seq; only the rows written (or whose parents were written) after it are checked
+    workers: checks run in parallel (each worker on its own connection); 1 runs them on connection itself
+
+    Returns:
+    generator of Violation(kind, table, key, column, value, detail), kind being 'foreign_key' or 'rank'
+
+    Raises:
+    ValueError: since is given but the database has no change log """
+    if since is not None and not has_change_log(connection):
+        raise ValueError("Incremental checks need the change log (changelog.create_change_log)")
+    checks = _checks(connection, since is not None)
+    database_file = _database_file(connection)
+    if workers <= 1 or database_file is None:
+        # one read transaction for all the checks, unless the caller has one open already
+        own_transaction = not connection.in_transaction
+        if own_transaction:
+            connection.execute("BEGIN;")
+        try:
+            for table_name, table_checks in checks.items():
+                for batch in _run_checks(connection, table_name, table_checks, since):
+                    yield from batch
+        finally:
+            if own_transaction:
+                connection.rollback()
+        return
+
+    check_count = sum(map(len, checks.values()))
+    if not check_count:
+        return
+    worker_connections = _snapshot_connections(database_file, min(workers, check_count))
+
+    # workers put batches of violations (and None when a check is done) on a bounded queue
+    results = queue.Queue(maxsize=workers * 4)
+    stop = threading.Event()
+
+    def emit(batch):
+        while not stop.is_set():
+            try:
+                results.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    idle_connections = queue.Queue()
+    for worker_connection in worker_connections:
+        idle_connections.put(worker_connection)
+
+    def run_check(table_name, check):
+        if stop.is_set():
+            return
+        worker_connection = idle_connections.get()
+        try:
+            for batch in _run_checks(worker_connection, table_name, [check], since):
+                emit(batch)
+        except sqlite3.OperationalError:
+            if not stop.is_set():
+                raise
+        finally:
+            idle_connections.put(worker_connection)
+            emit(None)
+
+    executor = ThreadPoolExecutor(max_workers=len(worker_connections))
+    futures = [executor.submit(run_check, table_name, check)
+               for table_name, table_checks in checks.items() for check in table_checks]
+    finished = False
+    try:
+        remaining = len(futures)
+        while remaining:
+            batch = results.get()
+            if batch is None:
+                remaining -= 1
+            else:
+                yield from batch
+        finished = True
+    finally:
+        if not finished:
+            # the caller stopped reading early: stop the running queries and skip the others
+            stop.set()
+            for worker_connection in worker_connections:
+                worker_connection.interrupt()
+        executor.shutdown(cancel_futures=True)
+        for worker_connection in worker_connections:
+            worker_connection.close()
+    for future in futures:
+        future.result()
+
+
+def summarize(violations):
+    """ Counts violations per (kind, table, column).
+
+    Returns:
+    counts: dict (kind, table, column) -> number of violations """
+    counts = {}
+    for violation in violations:
+        group = (violation.kind, violation.table, violation.column)
+        counts[group] = counts.get(group, 0) + 1
+    return counts
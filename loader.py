@@ -0,0 +1,242 @@
+""" Bulk loading of CSV / JSONL files (e.g. airline schedules) into a table.
+
+Records are streamed from the file with generators and inserted with
+executemany in batches, one explicit transaction per batch, so memory stays
+flat however large the file is.
+
+Usage:
+    python loader.py Flight schedule.csv --batch-size 10000 """
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from sqlite3 import Error
+
+from cache import invalidate
+from schema import get_catalog, get_column_names
+from search import create_search_triggers, drop_search_triggers, index_table
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def read_csv(path, empty=None):
+    """ Streams the records of a CSV file with a header row.
+
+    Variables:
+    path: path of the CSV file
+    empty: value given to empty fields (None: NULL)
+
+    Returns:
+    generator of dicts (column name -> value) """
+    with open(path, newline="") as csv_file:
+        for record in csv.DictReader(csv_file):
+            yield {key: (value if value != "" else empty) for key, value in record.items()}
+
+
+def read_jsonl(path):
+    """ Streams the records of a JSON Lines file (one JSON object per line).
+
+    Variables:
+    path: path of the JSONL file
+
+    Returns:
+    generator of dicts (column name -> value) """
+    with open(path) as jsonl_file:
+        for line in jsonl_file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_records(path, empty=None):
+    """ Picks the reader from the file extension (.csv, .jsonl or .json); empty is passed to read_csv. """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return read_csv(path, empty)
+    if extension in (".jsonl", ".json"):
+        return read_jsonl(path)
+    raise ValueError(f"Unsupported file type: {path} (expected .csv or .jsonl)")
+
+
+def batched(rows, batch_size):
+    """ Groups an iterable of rows into lists of at most batch_size rows. """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_rows(connection, table_name, rows, columns=None):
+    """ Inserts rows (tuples) into a table with a single executemany and commit.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table
+    rows: iterable of tuples in column order
+    columns: names of the columns the tuples fill, defaults to all columns """
+    if columns is None:
+        columns = get_column_names(connection, table_name)
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+    try:
+        connection.executemany(query, rows)
+        connection.commit()
+    except Error as e:
+        connection.rollback()
+        print(e)
+    finally:
+        invalidate(connection, table_name)
+
+
+def _secondary_indexes(connection, table_name):
+    """ (name, sql) of the user created indexes on a table (not the PK autoindexes). """
+    cursor = connection.cursor()
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL;",
+                   (table_name,))
+    return cursor.fetchall()
+
+
+def load_rows(connection, table_name, records, batch_size=DEFAULT_BATCH_SIZE, defer_indexes=True):
+    """ Bulk loads records into a table.
+
+    The load runs with journal_mode=WAL and synchronous=NORMAL, and puts the
+    previous modes back afterwards. With defer_indexes the secondary indexes
+    and search triggers of the table are dropped for the load and rebuilt
+    once at the end, instead of being updated row by row.
+
+    Dict records may name different columns: each batch inserts the columns
+    any of its records names (NULL where a record leaves one out). A key that
+    is not a column of the table stops the load with ValueError, the batches
+    before it staying loaded.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table
+    records: iterable of dicts (column name -> value) or tuples in column order
+    batch_size: rows per executemany / transaction
+    defer_indexes: build the secondary indexes after the load
+
+    Returns:
+    report: dict with rows, seconds and rows_per_second
+
+    Raises:
+    ValueError: a record names a column the table does not have """
+    table_columns = get_column_names(connection, table_name)
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return {"rows": 0, "seconds": 0.0, "rows_per_second": 0.0}
+
+    if isinstance(first, dict):
+        batches = (_dict_batch(table_name, table_columns, batch)
+                   for batch in batched(_chain(first, records), batch_size))
+    else:
+        batches = ((table_columns, [tuple(record) for record in batch])
+                   for batch in batched(_chain(first, records), batch_size))
+
+    cursor = connection.cursor()
+    connection.commit()
+    synchronous = cursor.execute("PRAGMA synchronous;").fetchone()[0]
+    journal_mode = cursor.execute("PRAGMA journal_mode;").fetchone()[0]
+    cursor.execute("PRAGMA journal_mode=WAL;")
+    cursor.execute("PRAGMA synchronous=NORMAL;")
+
+    indexes = []
+    last_rowid = cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_name};").fetchone()[0]
+    if defer_indexes:
+        indexes = _secondary_indexes(connection, table_name)
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {name};")
+        drop_search_triggers(connection, table_name)
+        connection.commit()
+
+    count = 0
+    start = time.perf_counter()
+    try:
+        for columns, batch in batches:
+            cursor.execute("BEGIN;")
+            cursor.executemany(f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                               f"VALUES ({', '.join('?' * len(columns))});", batch)
+            connection.commit()
+            count += len(batch)
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        if defer_indexes:
+            for _, sql in indexes:
+                cursor.execute(sql)
+            if _has_search_index(connection):
+                create_search_triggers(connection, table_name)
+                index_table(connection, table_name, after_rowid=last_rowid)
+            connection.commit()
+        cursor.execute(f"PRAGMA synchronous={synchronous};")
+        if journal_mode.lower() != "wal":
+            try:
+                cursor.execute(f"PRAGMA journal_mode={journal_mode};")
+            except Error as e:
+                # leaving WAL needs the only connection to the database: it stays in WAL
+                print(e)
+        invalidate(connection, table_name)
+
+    seconds = time.perf_counter() - start
+    return {"rows": count, "seconds": seconds, "rows_per_second": count / seconds if seconds else 0.0}
+
+
+def load_file(connection, table_name, path, batch_size=DEFAULT_BATCH_SIZE, defer_indexes=True):
+    """ Bulk loads a CSV or JSONL file into a table, see load_rows. """
+    return load_rows(connection, table_name, read_records(path), batch_size, defer_indexes)
+
+
+def _dict_batch(table_name, table_columns, records):
+    """ Columns named by any record of a batch (in table order), and the rows of values for them.
+
+    Raises:
+    ValueError: a record names a column the table does not have """
+    named = set()
+    for record in records:
+        named.update(record)
+    unknown = named - set(table_columns)
+    if unknown:
+        raise ValueError(f"Unknown columns for {table_name}: {', '.join(sorted(unknown))}")
+    columns = [col for col in table_columns if col in named]
+    return columns, [tuple(record.get(col) for col in columns) for record in records]
+
+
+def _chain(first, rest):
+    """ Puts back the record that was read to tell dicts from tuples. """
+    yield first
+    yield from rest
+
+
+def _has_search_index(connection):
+    """ Whether the search index of search.py exists in this database. """
+    return get_catalog(connection).has_table("_Search_Index")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load a CSV or JSONL file into a table.")
+    parser.add_argument("table", help="table to load into, e.g. Flight")
+    parser.add_argument("path", help="CSV (with header) or JSONL file")
+    parser.add_argument("--database", default="aircraft_management_system_db.db")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-defer-indexes", action="store_true",
+                        help="keep indexes and search triggers live during the load")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    try:
+        report = load_file(connection, args.table, args.path, args.batch_size, not args.no_defer_indexes)
+        print(f"Loaded {report['rows']} rows into {args.table} in {report['seconds']:.2f}s "
+              f"({report['rows_per_second']:.0f} rows/sec)")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+""" Thread-safe query executor on top of a pool of sqlite3 connections.
+
+The database runs in WAL mode so readers never block the writer:
+- each thread gets its own read connection (at most max_readers of them read
+  at the same time, the others wait in a queue),
+- every write goes through a single writer connection behind a lock, and
+  writes are committed in batches (every commit_every statements or
+  commit_interval seconds, or on flush()) instead of after every statement.
+  A timer commits the batch once commit_interval has passed, so a lone write
+  does not wait for the next one to become visible. Each statement runs in
+  its own SAVEPOINT: a failing statement is rolled back alone, the writes of
+  the batch that were already reported as done stay.
+
+WAL needs a database file, so ':memory:' cannot be pooled. """
+import sqlite3
+import threading
+import time
+
+from cache import get_result_cache, written_table
+from instrumentation import InstrumentedConnection
+
+DEFAULT_MAX_READERS = 4
+DEFAULT_COMMIT_EVERY = 100
+DEFAULT_COMMIT_INTERVAL = 0.5
+
+
+class ConnectionPool:
+    """ Pooled executor: concurrent reads, one serialized writer.
+
+    Variables:
+    database_file (str): name of db file.
+    max_readers (int): max number of read queries running at once
+    commit_every (int): commit the writer after this many write statements
+    commit_interval (float): ...or when the oldest uncommitted write is this old (seconds) """
+
+    def __init__(self, database_file, max_readers=DEFAULT_MAX_READERS,
+                 commit_every=DEFAULT_COMMIT_EVERY, commit_interval=DEFAULT_COMMIT_INTERVAL):
+        self.database_file = database_file
+        self.max_readers = max_readers
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._read_slots = threading.BoundedSemaphore(max_readers)
+
+        self._writer = sqlite3.connect(database_file, check_same_thread=False, factory=InstrumentedConnection)
+        self._writer.execute("PRAGMA journal_mode=WAL;")
+        self._writer.execute("PRAGMA synchronous=NORMAL;")
+        self._write_lock = threading.Lock()
+        self._pending_writes = 0
+        self._first_pending = None
+        self._commit_timer = None
+        self._written_tables = set()
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "reads": 0, "writes": 0, "commits": 0,
+            "read_wait_seconds": 0.0, "read_wait_max_seconds": 0.0,
+            "write_wait_seconds": 0.0, "write_wait_max_seconds": 0.0,
+            "readers_busy": 0, "readers_busy_peak": 0,
+        }
+
+    def _reader(self):
+        """ The read connection of the calling thread, opened on first use. """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.database_file, check_same_thread=False,
+                                         factory=InstrumentedConnection)
+            self._local.connection = connection
+            with self._readers_lock:
+                self._readers.append(connection)
+        return connection
+
+    def _record_wait(self, kind, waited):
+        """ Adds a queue wait ('read' or 'write') to the metrics. """
+        with self._metrics_lock:
+            self._metrics[f"{kind}_wait_seconds"] += waited
+            if waited > self._metrics[f"{kind}_wait_max_seconds"]:
+                self._metrics[f"{kind}_wait_max_seconds"] = waited
+
+    def read(self, query, params=()):
+        """ Runs a read query on the calling thread's connection.
+
+        Variables:
+        query: The SQL query that will be executed
+        params: values bound to the query's ? placeholders
+
+        Returns:
+        result: the rows of the query """
+        return self.run(lambda connection: connection.execute(query, params).fetchall())
+
+    def run(self, function, *args):
+        """ Calls function(connection, *args) with the calling thread's read connection,
+        e.g. pool.run(queries.pilots_by_rank, 'Captain').
+
+        Returns:
+        result: what function returns """
+        start = time.perf_counter()
+        self._read_slots.acquire()
+        self._record_wait("read", time.perf_counter() - start)
+        with self._metrics_lock:
+            self._metrics["readers_busy"] += 1
+            self._metrics["readers_busy_peak"] = max(self._metrics["readers_busy_peak"], self._metrics["readers_busy"])
+        try:
+            return function(self._reader(), *args)
+        finally:
+            with self._metrics_lock:
+                self._metrics["readers_busy"] -= 1
+                self._metrics["reads"] += 1
+            self._read_slots.release()
+
+    def write(self, query, params=()):
+        """ Runs a write statement on the writer connection (commit is batched).
+
+        Variables:
+        query: The SQL statement that will be executed
+        params: values bound to the statement's ? placeholders
+
+        Returns:
+        rowcount: number of rows changed """
+        return self._write(query, lambda: self._writer.execute(query, params).rowcount)
+
+    def write_many(self, query, rows):
+        """ Runs a write statement once per row with executemany (commit is batched).
+
+        Returns:
+        rowcount: number of rows changed """
+        return self._write(query, lambda: self._writer.executemany(query, rows).rowcount)
+
+    def _write(self, query, statement):
+        """ Runs statement() in a savepoint under the write lock and commits once the batch is full.
+        The table query writes to is remembered so its cached reads are dropped on commit. """
+        start = time.perf_counter()
+        with self._write_lock:
+            self._record_wait("write", time.perf_counter() - start)
+            table_name = written_table(query)
+            if table_name is not None:
+                self._written_tables.add(table_name)
+            if not self._writer.in_transaction:
+                self._writer.execute("BEGIN;")
+            self._writer.execute("SAVEPOINT pool_write;")
+            try:
+                rowcount = statement()
+            except sqlite3.Error:
+                self._rollback_statement()
+                raise
+            self._writer.execute("RELEASE pool_write;")
+            with self._metrics_lock:
+                self._metrics["writes"] += 1
+            self._pending_writes += 1
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+                self._commit_timer = threading.Timer(self.commit_interval, self._commit_due)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+            if (self._pending_writes >= self.commit_every
+                    or time.monotonic() - self._first_pending >= self.commit_interval):
+                self._commit()
+            return rowcount
+
+    def _rollback_statement(self):
+        """ Undoes the failed statement only; the caller holds the write lock. """
+        try:
+            self._writer.execute("ROLLBACK TO pool_write;")
+            self._writer.execute("RELEASE pool_write;")
+            if not self._pending_writes:
+                # nothing else in the batch: end the transaction so the write lock is not held
+                self._writer.rollback()
+        except sqlite3.Error:
+            # some errors (e.g. disk full) already rolled back the whole transaction
+            self._writer.rollback()
+            self._pending_writes = 0
+            self._first_pending = None
+            self._invalidate()
+
+    def _commit_due(self):
+        """ Commits the batch once its oldest write is commit_interval old (runs on the timer thread). """
+        with self._write_lock:
+            if (self._first_pending is not None
+                    and time.monotonic() - self._first_pending >= self.commit_interval):
+                self._commit()
+
+    def _commit(self):
+        """ Commits the writer; the caller holds the write lock. """
+        if self._writer.in_transaction:
+            self._writer.commit()
+            with self._metrics_lock:
+                self._metrics["commits"] += 1
+        self._pending_writes = 0
+        self._first_pending = None
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        self._invalidate()
+
+    def _invalidate(self):
+        """ Drops the cached reads of the tables written since the last commit (or rollback). """
+        if self._written_tables:
+            cache = get_result_cache(self._writer)
+            for table_name in self._written_tables:
+                cache.invalidate(table_name)
+            self._written_tables.clear()
+
+    def flush(self):
+        """ Commits every pending write now, making it visible to the readers. """
+        with self._write_lock:
+            self._commit()
+
+    def metrics(self):
+        """ Snapshot of the pool metrics.
+
+        Returns:
+        metrics: dict of counters, queue wait times (seconds) and pool utilisation """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        with self._readers_lock:
+            metrics["reader_connections"] = len(self._readers)
+        metrics["utilisation"] = metrics["readers_busy"] / self.max_readers
+        metrics["peak_utilisation"] = metrics["readers_busy_peak"] / self.max_readers
+        metrics["read_wait_mean_seconds"] = metrics["read_wait_seconds"] / metrics["reads"] if metrics["reads"] else 0.0
+        metrics["pending_writes"] = self._pending_writes
+        return metrics
+
+    def close(self):
+        """ Commits pending writes and closes every connection of the pool. """
+        with self._write_lock:
+            self._commit()
+            self._writer.close()
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,273 @@
+""" Parameterized queries used by the menu options.
+
+Table and column names are checked against the database before they go
+into a statement, and every value is bound with a ? placeholder, so the same
+SQL text is reused for every call. The SQL text is built once per shape
+(functools.lru_cache) and sqlite3 keeps the prepared statement for that text
+in the connection's statement cache (cached_statements), so repeated
+lookups skip both string building and SQL parsing. """
+import re
+from functools import lru_cache
+from sqlite3 import Error
+
+from archive import drop_history_view, flight_source, rebuild_history_view
+from cache import cached_query, invalidate
+from changelog import create_change_log, is_logged
+from schema import get_catalog
+from search import refresh_search_table
+
+# Size of the SQL text cache and of each connection's prepared statement cache
+STATEMENT_CACHE_SIZE = 256
+
+_identifier = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def validate_identifier(connection, table_name, column_name=None):
+    """ Checks that a table (and optionally one of its columns) exists.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table
+    column_name: The name of a column of that table
+
+    Raises:
+    ValueError: if the table or column does not exist """
+    if not _identifier.match(table_name or ""):
+        raise ValueError(f"Invalid table name: {table_name!r}")
+    catalog = get_catalog(connection)
+    if not catalog.has_table(table_name):
+        raise ValueError(f"No such table: {table_name}")
+    if column_name is not None and column_name not in catalog.column_names(table_name):
+        raise ValueError(f"No such column: {table_name}.{column_name}")
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def select_query(table_name, columns=None, where_column=None):
+    """ SELECT columns FROM table [WHERE where_column = ?] """
+    column_list = ", ".join(columns) if columns else "*"
+    query = f"SELECT {column_list} FROM {table_name}"
+    if where_column is not None:
+        query += f" WHERE {where_column} = ?"
+    return query + ";"
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def insert_query(table_name, columns):
+    """ INSERT INTO table (columns) VALUES (?, ...) """
+    return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def update_query(table_name, set_column, where_column):
+    """ UPDATE table SET set_column = ? WHERE where_column = ? """
+    return f"UPDATE {table_name} SET {set_column} = ? WHERE {where_column} = ?;"
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def delete_query(table_name, where_column):
+    """ DELETE FROM table WHERE where_column = ? """
+    return f"DELETE FROM {table_name} WHERE {where_column} = ?;"
+
+
+def _write(connection, table_name, query, params):
+    """ Runs a write statement on table_name, commits it and drops the cached reads of the table.
+
+    Returns:
+    rowcount: number of rows changed, None on error """
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        connection.commit()
+        return cursor.rowcount
+    except Error as e:
+        connection.rollback()
+        print(e)
+    finally:
+        invalidate(connection, table_name)
+
+
+def column_values(connection, table_name, column_name):
+    """ Gets every value of one column (menu option 4).
+
+    Returns:
+    values: list of the column's values in table order """
+    validate_identifier(connection, table_name, column_name)
+    cursor = connection.cursor()
+    cursor.execute(select_query(table_name, (column_name,)))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def update_value(connection, table_name, column_name, old_value, new_value):
+    """ Replaces old_value with new_value in one column (menu option 4).
+
+    Returns:
+    rowcount: number of rows changed """
+    validate_identifier(connection, table_name, column_name)
+    return _write(connection, table_name, update_query(table_name, column_name, column_name), (new_value, old_value))
+
+
+def delete_rows(connection, table_name, column_name, value):
+    """ Deletes the rows whose column equals value (menu option 5).
+
+    Returns:
+    rowcount: number of rows deleted """
+    validate_identifier(connection, table_name, column_name)
+    return _write(connection, table_name, delete_query(table_name, column_name), (value,))
+
+
+def insert_row(connection, table_name, columns, values):
+    """ Inserts one row (menu option 6).
+
+    Returns:
+    rowcount: 1 if the row was inserted """
+    for column_name in columns:
+        validate_identifier(connection, table_name, column_name)
+    return _write(connection, table_name, insert_query(table_name, tuple(columns)), tuple(values))
+
+
+# The lookups of menu options 7, 8 and 9 read through the result cache (cache.py); the flight
+# lookups read the archived flights too once the archive is attached (archive.attach_archive)
+
+def flight_numbers(connection):
+    """ Gets all the flight numbers (menu option 7). """
+    rows = cached_query(connection, select_query(flight_source(connection), ("Flight_Number",)), (), ("Flight",))
+    return [row[0] for row in rows]
+
+
+def flight_duration_and_passengers(connection, flight_number):
+    """ Gets (Flight_Duration, Passenger_Count) of one flight (menu option 7). """
+    rows = cached_query(connection, select_query(flight_source(connection), ("Flight_Duration", "Passenger_Count"),
+                                                 "Flight_Number"), (flight_number,), ("Flight",))
+    return rows[0] if rows else None
+
+
+def aircraft_by_status(connection, status):
+    """ Gets (Aircraft_Registration_Number, Manufacturer) of the aircraft with a status (menu option 8). """
+    return cached_query(connection, select_query("Aircraft", ("Aircraft_Registration_Number", "Manufacturer"),
+                                                 "Status"), (status,), ("Aircraft",))
+
+
+def pilots_by_rank(connection, rank):
+    """ Gets (First_Name, Last_Name) of the pilots with a rank (menu option 9). """
+    return cached_query(connection, select_query("Pilot", ("First_Name", "Last_Name"), "Pilot_Ranking"), (rank,),
+                        ("Pilot",))
+
+
+# triggers that maintain one derived table together (stats.py, availability.py)
+_trigger_families = ("_Stats_", "_Flight_Times_")
+
+
+def _probe_triggers(cursor, table_name):
+    """ Compiles the insert, update and delete triggers of a table (SQLite only checks the columns a
+    trigger names when a statement firing it is prepared); the statements change no row.
+
+    Raises:
+    Error: a trigger names a column that does not exist """
+    column_names = get_catalog(cursor.connection).column_names(table_name)
+    cursor.execute(f"INSERT INTO {table_name} SELECT * FROM {table_name} WHERE 0;")
+    cursor.execute(f"UPDATE {table_name} SET {', '.join(f'{column} = {column}' for column in column_names)} WHERE 0;")
+    cursor.execute(f"DELETE FROM {table_name} WHERE 0;")
+
+
+def drop_column(connection, table_name, column_name):
+    """ Drops a column from a table (menu option 5).
+
+    ALTER TABLE ... DROP fails while any index or trigger of the schema names
+    the column, so the indexes and triggers that mention it (managed
+    indexes, search, stats, availability and change log triggers) are dropped
+    first and recreated afterwards, all in one transaction. The search and
+    change log triggers are rebuilt for the remaining columns; the others that
+    needed the dropped column (found by compiling the triggers of their
+    table) are left out, and reported. The TEMP history view of an attached
+    archive is dropped too, and rebuilt over the remaining columns. """
+    validate_identifier(connection, table_name, column_name)
+    mentions = re.compile(rf"\b{column_name}\b", re.IGNORECASE)
+    # taken first: the log triggers name the column, so they are among the dependents dropped below
+    logged = is_logged(connection, table_name)
+    cursor = connection.cursor()
+    connection.commit()
+    try:
+        cursor.execute("BEGIN;")
+        # indexes first: a trigger is recreated before its table is probed
+        dependents = [(kind, name, owner, sql) for kind, name, owner, sql in cursor.execute(
+            "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+            "AND sql IS NOT NULL ORDER BY type;").fetchall() if mentions.search(sql)]
+        for kind, name, _, _ in dependents:
+            cursor.execute(f"DROP {kind.upper()} {name};")
+        drop_history_view(connection)
+        cursor.execute(f"ALTER TABLE {table_name} DROP {column_name};")
+        lost = []
+        for kind, name, owner, sql in dependents:
+            try:
+                cursor.execute(sql)
+                if kind == "trigger":
+                    _probe_triggers(cursor, owner)
+            except Error:
+                cursor.execute(f"DROP {kind.upper()} IF EXISTS {name};")
+                lost.append(name)
+        connection.commit()
+    except Error as e:
+        connection.rollback()
+        print(e)
+        return
+    finally:
+        invalidate(connection, table_name)
+        rebuild_history_view(connection)
+
+    # rebuilt for the remaining columns
+    refresh_search_table(connection, table_name)
+    rebuilt = {f"_Search_{table_name}_{event}" for event in ("Insert", "Update", "Delete")}
+    if logged:
+        create_change_log(connection, [table_name])
+        rebuilt |= {f"_Change_Log_{table_name}_{event}" for event in ("Insert", "Update", "Delete")}
+    lost = [name for name in lost if name not in rebuilt]
+    for family in _trigger_families:
+        if any(name.startswith(family) for name in lost):
+            # a derived table kept up to date by only some of its triggers would be wrong: drop them all
+            siblings = [row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND substr(name, 1, ?) = ?;",
+                (len(family), family)).fetchall()]
+            for name in siblings:
+                connection.execute(f"DROP TRIGGER {name};")
+            connection.commit()
+            lost = [name for name in lost if not name.startswith(family)] + [f"{family}* triggers"]
+    for name in lost:
+        print(f"{name} dropped: {table_name}.{column_name} is gone")
+
+
+flights_of_aircraft_query = """ SELECT Flight.Flight_Number, Flight.Departure_Airport_Code, Flight.Arrival_Airport_Code,
+    Flight.Departure_Date_Time, Flight.Arrival_Date_Time
+FROM Aircraft JOIN Flight ON Flight.Aircraft_Registration_Number = Aircraft.Aircraft_Registration_Number
+WHERE Aircraft.Aircraft_Registration_Number = ?
+ORDER BY Flight.Departure_Date_Time; """
+
+pilots_on_flight_query = """ SELECT Pilot.Commercial_Pilot_License_Number, Pilot.First_Name, Pilot.Last_Name,
+    Pilot_Flight.Pilot_Ranking
+FROM Pilot_Flight JOIN Pilot ON Pilot.Commercial_Pilot_License_Number = Pilot_Flight.Commercial_Pilot_License_Number
+WHERE Pilot_Flight.Flight_Number = ?; """
+
+departures_query = """ SELECT Flight_Number, Arrival_Airport_Code, Departure_Date_Time, Arrival_Date_Time
+FROM Flight
+WHERE Departure_Airport_Code = ? AND Departure_Date_Time >= ? AND Departure_Date_Time < ?
+ORDER BY Departure_Date_Time; """
+
+
+def flights_of_aircraft(connection, registration_number):
+    """ Gets the flights flown by one aircraft, in departure order. """
+    cursor = connection.cursor()
+    cursor.execute(flights_of_aircraft_query, (registration_number,))
+    return cursor.fetchall()
+
+
+def pilots_on_flight(connection, flight_number):
+    """ Gets (licence number, first name, last name, ranking) of the crew of one flight. """
+    cursor = connection.cursor()
+    cursor.execute(pilots_on_flight_query, (flight_number,))
+    return cursor.fetchall()
+
+
+def departures(connection, airport_code, start, end):
+    """ Gets the flights leaving an airport between start (included) and end (excluded). """
+    cursor = connection.cursor()
+    cursor.execute(departures_query, (airport_code, start, end))
+    return cursor.fetchall()
@@ -0,0 +1,187 @@
+""" Read replicas: online snapshots, then deltas from the change log.
+
+snapshot copies the live database to a replica file with the sqlite3
+backup API, pages at a time (reporting progress), inside one read
+transaction: the copy is the database as of one moment even while other
+connections keep writing (in WAL mode they are not blocked), and it records
+the change log Seq of that moment in the replica's _Replica_State.
+
+Replicator then brings the replica up to date from the primary's
+_Change_Log (changelog.py) in batches: within a batch only the last change
+of each row counts (a delete, or an upsert of the logged row), and each
+batch is applied in one replica transaction together with its new Seq, so
+a batch interrupted half way is simply applied again. The replica's own
+triggers keep its search index, R*Tree and stats in step. The replicator
+records its Seq as an offset on the primary, so prune_change_log keeps what
+it has not applied yet; forget_replica removes that offset once the replica
+is no longer used.
+
+Schema changes (ALTER / DROP) are not in the change log: take a new
+snapshot after one. """
+import json
+import os
+import sqlite3
+import time
+
+from changelog import (create_change_log, drop_change_log_triggers, has_change_log, last_sequence, remove_offset,
+    set_offset)
+from schema import get_catalog
+
+DEFAULT_SNAPSHOT_PAGES = 256
+DEFAULT_REPLICATION_BATCH_SIZE = 1000
+
+replica_state_table = """ CREATE TABLE IF NOT EXISTS _Replica_State (
+    Id INTEGER PRIMARY KEY CHECK (Id = 1),
+    Seq INTEGER NOT NULL,
+    Primary_File TEXT ); """
+
+
+def _reader_name(replica_file):
+    """ Offset name of a replica on the primary. """
+    return f"replica:{os.path.abspath(replica_file)}"
+
+
+def snapshot(connection, replica_file, pages=DEFAULT_SNAPSHOT_PAGES, progress=None):
+    """ Copies the database to replica_file as of one moment, without stopping writers.
+
+    The change log is created first if the database has none, so the
+    replica can be kept up to date with Replicator.
+
+    Variables:
+    connection: connection to the primary database
+    replica_file: file of the replica (overwritten)
+    pages: pages copied per backup step (-1 for all at once)
+    progress: called as progress(status, remaining, total) after each step
+
+    Returns:
+    seq: change log Seq the replica is at """
+    if not has_change_log(connection):
+        create_change_log(connection)
+    connection.commit()
+    replica = sqlite3.connect(replica_file)
+    try:
+        # the read transaction pins the snapshot: every backup step reads the same version
+        connection.execute("BEGIN;")
+        try:
+            seq = last_sequence(connection)
+            connection.backup(replica, pages=pages, progress=progress)
+        finally:
+            connection.rollback()
+        primary_file = connection.execute("PRAGMA database_list;").fetchone()[2]
+        # the replica applies the primary's log, it does not keep one of its own
+        drop_change_log_triggers(replica)
+        replica.execute("DELETE FROM _Change_Log;")
+        replica.execute("DELETE FROM _Change_Log_Offsets;")
+        replica.execute(replica_state_table)
+        replica.execute("INSERT INTO _Replica_State (Id, Seq, Primary_File) VALUES (1, ?, ?) "
+                        "ON CONFLICT(Id) DO UPDATE SET Seq = excluded.Seq, Primary_File = excluded.Primary_File;",
+                        (seq, primary_file))
+        replica.commit()
+    finally:
+        replica.close()
+    set_offset(connection, _reader_name(replica_file), seq)
+    return seq
+
+
+def forget_replica(connection, replica_file):
+    """ Unregisters a replica on the primary, so its offset no longer holds back prune_change_log.
+
+    Returns:
+    removed: whether the replica had an offset """
+    return remove_offset(connection, _reader_name(replica_file))
+
+
+class Replicator:
+    """ Applies the primary's change log to a replica made by snapshot.
+
+    Variables:
+    connection: connection to the primary database
+    replica_file (str): file of the replica
+    batch_size (int): log rows applied per replica transaction
+    seq (int): change log Seq the replica is at """
+
+    def __init__(self, connection, replica_file, batch_size=DEFAULT_REPLICATION_BATCH_SIZE):
+        self.connection = connection
+        self.replica_file = replica_file
+        self.batch_size = batch_size
+        self.replica = sqlite3.connect(replica_file)
+        self.replica.execute("PRAGMA journal_mode=WAL;")
+        if not get_catalog(self.replica).has_table("_Replica_State"):
+            self.replica.close()
+            raise ValueError(f"{replica_file} is not a replica (make it with replication.snapshot)")
+        self.seq = self.replica.execute("SELECT Seq FROM _Replica_State WHERE Id = 1;").fetchone()[0]
+
+    def lag(self):
+        """ Changes logged on the primary that the replica has not applied yet. """
+        return self.connection.execute("SELECT count(*) FROM _Change_Log WHERE Seq > ?;", (self.seq,)).fetchone()[0]
+
+    def _apply(self, changes):
+        """ Applies one batch of log rows (and its last Seq) in one replica transaction. """
+        last = {}
+        for _, table_name, op, row_key, row_data in changes:
+            # later changes of a row replace the earlier ones
+            last[(table_name, row_key)] = (op, row_data)
+
+        deletes, upserts = {}, {}
+        for (table_name, row_key), (op, row_data) in last.items():
+            if op == "delete":
+                deletes.setdefault(table_name, []).append((row_key,))
+            else:
+                upserts.setdefault(table_name, []).append(json.loads(row_data))
+
+        catalog = get_catalog(self.replica)
+        cursor = self.replica.cursor()
+        cursor.execute("BEGIN;")
+        try:
+            for table_name, keys in deletes.items():
+                key_column = catalog.primary_key(table_name)[0]
+                cursor.executemany(f"DELETE FROM {table_name} WHERE {key_column} = ?;", keys)
+            for table_name, rows in upserts.items():
+                key_column = catalog.primary_key(table_name)[0]
+                columns = catalog.column_names(table_name)
+                updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != key_column)
+                # an upsert, not INSERT OR REPLACE: REPLACE would skip the replica's delete triggers
+                cursor.executemany(f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                                   f"VALUES ({', '.join('?' * len(columns))}) "
+                                   f"ON CONFLICT({key_column}) DO UPDATE SET {updates};",
+                                   [tuple(row.get(column) for column in columns) for row in rows])
+            cursor.execute("UPDATE _Replica_State SET Seq = ? WHERE Id = 1;", (changes[-1][0],))
+            self.replica.commit()
+        except Exception:
+            self.replica.rollback()
+            raise
+        self.seq = changes[-1][0]
+
+    def sync(self, max_batches=None):
+        """ Applies the pending changes batch by batch.
+
+        Variables:
+        max_batches: stop after this many batches (None: until the replica has caught up)
+
+        Returns:
+        report: dict with batches, changes, seq, seconds and changes_per_second """
+        start = time.perf_counter()
+        batches = count = 0
+        while max_batches is None or batches < max_batches:
+            changes = self.connection.execute(
+                "SELECT Seq, Table_Name, Op, Row_Key, Row_Data FROM _Change_Log WHERE Seq > ? ORDER BY Seq LIMIT ?;",
+                (self.seq, self.batch_size)).fetchall()
+            if not changes:
+                break
+            self._apply(changes)
+            batches += 1
+            count += len(changes)
+        if batches:
+            set_offset(self.connection, _reader_name(self.replica_file), self.seq)
+        seconds = time.perf_counter() - start
+        return {"batches": batches, "changes": count, "seq": self.seq, "seconds": seconds,
+                "changes_per_second": count / seconds if seconds else 0.0}
+
+    def close(self):
+        self.replica.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
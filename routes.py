@@ -0,0 +1,189 @@
+""" Fastest itinerary between two airports over the Flight schedule.
+
+Flight is a time-dependent graph: every flight is a connection from its
+departure airport to its arrival airport. The timetable keeps the
+connections in flat arrays sorted by departure time (airport codes interned
+to ints, times in minutes since the epoch) and answers earliest-arrival
+queries with the Connection Scan Algorithm: one forward pass over the
+connections departing after the requested time, stopping as soon as no later
+connection can improve the arrival at the destination. """
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from availability import to_minutes
+
+DEFAULT_MIN_CONNECTION_MINUTES = 45
+# an itinerary must arrive within this many minutes of depart_after (bounds the scan of unreachable pairs)
+DEFAULT_HORIZON_MINUTES = 48 * 60
+
+Leg = namedtuple("Leg", ["flight", "departure_airport", "arrival_airport", "departure", "arrival"])
+
+timetable_query = """ SELECT Flight_Number, Departure_Airport_Code, Arrival_Airport_Code,
+    CAST(strftime('%s', Departure_Date_Time) AS INTEGER) / 60,
+    CAST(strftime('%s', Arrival_Date_Time) AS INTEGER) / 60
+FROM Flight
+WHERE Departure_Date_Time IS NOT NULL AND Arrival_Date_Time IS NOT NULL
+ORDER BY Departure_Date_Time; """
+
+
+def _minutes(value):
+    """ Epoch minutes of a datetime or string; ints are already epoch minutes. """
+    return value if isinstance(value, int) else to_minutes(value)
+
+
+def minutes_to_text(minutes):
+    """ Formats epoch minutes like the Flight datetime columns ('YYYY-MM-DD HH:MM:SS'). """
+    return datetime.fromtimestamp(minutes * 60, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Timetable:
+    """ Array-backed connection list for the Connection Scan Algorithm. """
+
+    def __init__(self):
+        self.departures = array("q")   # departure minute of each connection, sorted
+        self.arrivals = array("q")     # arrival minute
+        self.from_airport = array("l")  # interned departure airport
+        self.to_airport = array("l")    # interned arrival airport
+        self.flights = []               # Flight_Number
+        self._airport_ids = {}
+        self._airport_codes = []
+
+    @classmethod
+    def from_database(cls, connection):
+        """ Builds the timetable from every timed flight in one query.
+
+        Variables:
+        connection: connection to the database
+
+        Returns:
+        timetable: the built Timetable """
+        timetable = cls()
+        cursor = connection.cursor()
+        cursor.execute(timetable_query)
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            for flight, departure_airport, arrival_airport, departure, arrival in rows:
+                if departure is not None and arrival is not None and arrival >= departure:
+                    timetable._append(flight, departure_airport, arrival_airport, departure, arrival)
+        # the SQL order is by datetime text, re-sort in case of mixed formats
+        if any(a > b for a, b in zip(timetable.departures, timetable.departures[1:])):
+            timetable._sort()
+        return timetable
+
+    def _airport(self, code):
+        """ Interned int of an airport code. """
+        airport = self._airport_ids.get(code)
+        if airport is None:
+            airport = self._airport_ids[code] = len(self._airport_codes)
+            self._airport_codes.append(code)
+        return airport
+
+    def _append(self, flight, departure_airport, arrival_airport, departure, arrival):
+        self.departures.append(departure)
+        self.arrivals.append(arrival)
+        self.from_airport.append(self._airport(departure_airport))
+        self.to_airport.append(self._airport(arrival_airport))
+        self.flights.append(flight)
+
+    def _sort(self):
+        order = sorted(range(len(self.flights)), key=self.departures.__getitem__)
+        self.departures = array("q", (self.departures[i] for i in order))
+        self.arrivals = array("q", (self.arrivals[i] for i in order))
+        self.from_airport = array("l", (self.from_airport[i] for i in order))
+        self.to_airport = array("l", (self.to_airport[i] for i in order))
+        self.flights = [self.flights[i] for i in order]
+
+    def __len__(self):
+        return len(self.flights)
+
+    def add_flight(self, flight, departure_airport, arrival_airport, departure, arrival):
+        """ Inserts one flight at its place in departure order. """
+        departure, arrival = _minutes(departure), _minutes(arrival)
+        i = bisect_right(self.departures, departure)
+        self.departures.insert(i, departure)
+        self.arrivals.insert(i, arrival)
+        self.from_airport.insert(i, self._airport(departure_airport))
+        self.to_airport.insert(i, self._airport(arrival_airport))
+        self.flights.insert(i, flight)
+
+    def remove_flight(self, flight, departure=None):
+        """ Removes one flight (departure, if known, narrows the search to a bisect).
+
+        Returns:
+        removed: True if the flight was in the timetable """
+        if departure is not None:
+            departure = _minutes(departure)
+            start, end = bisect_left(self.departures, departure), bisect_right(self.departures, departure)
+            candidates = range(start, end)
+        else:
+            candidates = range(len(self.flights))
+        for i in candidates:
+            if self.flights[i] == flight:
+                for column in (self.departures, self.arrivals, self.from_airport, self.to_airport, self.flights):
+                    del column[i]
+                return True
+        return False
+
+    def update_flight(self, flight, departure_airport, arrival_airport, departure, arrival, old_departure=None):
+        """ Replaces a flight after it was retimed or rerouted. """
+        self.remove_flight(flight, old_departure)
+        self.add_flight(flight, departure_airport, arrival_airport, departure, arrival)
+
+    def earliest_arrival(self, origin, destination, depart_after, min_connection=DEFAULT_MIN_CONNECTION_MINUTES,
+                         horizon=DEFAULT_HORIZON_MINUTES):
+        """ Fastest itinerary from origin to destination leaving at or after depart_after.
+
+        Variables:
+        origin, destination: airport codes
+        depart_after: datetime, 'YYYY-MM-DD HH:MM[:SS]' string or epoch minutes
+        min_connection: minimum minutes between landing and the next departure
+        horizon: latest arrival in minutes after depart_after
+
+        Returns:
+        itinerary: list of Leg (times in epoch minutes), [] if already there, None if unreachable """
+        if origin == destination:
+            return []
+        source = self._airport_ids.get(origin)
+        target = self._airport_ids.get(destination)
+        if source is None or target is None:
+            return None
+        start = _minutes(depart_after)
+
+        infinity = float("inf")
+        # ready[a]: earliest minute a connection can leave airport a (arrival + min_connection)
+        ready = [infinity] * len(self._airport_codes)
+        ready[source] = start
+        best_arrival = start + horizon + 1
+        in_connection = [None] * len(self._airport_codes)
+        departures, arrivals = self.departures, self.arrivals
+        from_airport, to_airport = self.from_airport, self.to_airport
+        for i in range(bisect_left(departures, start), len(departures)):
+            departure = departures[i]
+            if departure >= best_arrival:
+                break
+            if ready[from_airport[i]] <= departure:
+                arrival = arrivals[i]
+                to = to_airport[i]
+                if to == target:
+                    if arrival < best_arrival:
+                        best_arrival = arrival
+                        in_connection[to] = i
+                elif arrival + min_connection < ready[to]:
+                    ready[to] = arrival + min_connection
+                    in_connection[to] = i
+        if in_connection[target] is None:
+            return None
+
+        itinerary = []
+        airport = target
+        while airport != source:
+            i = in_connection[airport]
+            itinerary.append(Leg(self.flights[i], self._airport_codes[from_airport[i]],
+                                 self._airport_codes[to_airport[i]], departures[i], arrivals[i]))
+            airport = from_airport[i]
+        itinerary.reverse()
+        return itinerary
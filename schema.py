@@ -0,0 +1,194 @@
+""" Table definitions for the aircraft management system database. """
+from collections import namedtuple
+
+# Create tables
+aircraft_table = """ CREATE TABLE IF NOT EXISTS Aircraft (
+    Aircraft_Registration_Number VARCHAR(25) PRIMARY KEY,
+    Seat_Capacity INT,
+    Manufacturer VARCHAR(25) NOT NULL,
+    Status TEXT CHECK (Status IN ('Active', 'Maintenance', 'Retired')) NOT NULL); """
+
+flight_table = """ CREATE TABLE IF NOT EXISTS Flight (
+    Flight_Number VARCHAR (25) PRIMARY KEY,
+    Aircraft_Registration_Number VARCHAR(25) REFERENCES Aircraft(Aircraft_Registration_Number) NOT NULL,
+    Departure_Airport_Code VARCHAR(25) NOT NULL,
+    Arrival_Airport_Code VARCHAR(25) NOT NULL,
+    Departure_Date_Time DATETIME,
+    Arrival_Date_Time DATETIME,
+    Passenger_Count INT,
+    Flight_Duration INT ); """
+
+pilot_table = """ CREATE TABLE IF NOT EXISTS Pilot (
+    Commercial_Pilot_License_Number VARCHAR(25) PRIMARY KEY,
+    First_Name VARCHAR(25) NOT NULL,
+    Last_Name VARCHAR(25) NOT NULL,
+    License_Number VARCHAR(25) NOT NULL,
+    Contact_Number VARCHAR(25) NOT NULL,
+    Pilot_Ranking TEXT CHECK (Pilot_Ranking IN ('Cadet', 'Captain')) NOT NULL ); """
+
+destination_table = """ CREATE TABLE IF NOT EXISTS Destination (
+    Airport_Destination_Code VARCHAR(25) PRIMARY KEY,
+    Location VARCHAR(25) NOT NULL,
+    Country VARCHAR(25) NOT NULL ); """
+
+pilot_flight_table = """ CREATE TABLE IF NOT EXISTS Pilot_Flight (
+    Pilot_Flight_ID INT PRIMARY KEY,
+    Commercial_Pilot_License_Number VARCHAR(25) REFERENCES Pilot(Commercial_Pilot_License_Number),
+    Flight_Number VARCHAR (25) REFERENCES Flight(Flight_Number),
+    Pilot_Ranking TEXT CHECK (Pilot_Ranking IN ('Pilot Cadet', 'Second officer', 'Cadet', 'Captain')) NOT NULL ); """
+
+aircraft_destination_table = """ CREATE TABLE IF NOT EXISTS Aircraft_Destination (
+    Aircraft_Destination_ID INT PRIMARY KEY,
+    Aircraft_Registration_Number VARCHAR(25) REFERENCES Aircraft(Aircraft_Registration_Number),
+    Airport_Destination_Code VARCHAR(25) REFERENCES Destination(Airport_Destination_Code) ); """
+
+aircraft_flight_table = """ CREATE TABLE IF NOT EXISTS Aircraft_Flight (
+    Aircraft_Flight_ID INT PRIMARY KEY,
+    Aircraft_Registration_Number VARCHAR(25) REFERENCES Aircraft(Aircraft_Registration_Number),
+    Flight_Number VARCHAR (25) REFERENCES Flight(Flight_Number) ); """
+
+tables_to_create = [aircraft_table, flight_table, pilot_table,
+    destination_table, pilot_flight_table, aircraft_destination_table, aircraft_flight_table]
+
+# Stored in PRAGMA user_version once the database is set up; bump it when the
+# tables, indexes or derived tables change so existing databases get upgraded
+SCHEMA_VERSION = 3
+
+# Names of the seven tables above, in creation order
+table_names = ["Aircraft", "Flight", "Pilot", "Destination",
+    "Pilot_Flight", "Aircraft_Destination", "Aircraft_Flight"]
+
+
+Column = namedtuple("Column", ["name", "type", "not_null", "default", "primary_key"])
+ForeignKey = namedtuple("ForeignKey", ["column", "table", "to_column"])
+
+
+class SchemaCatalog:
+    """ In-process copy of the table / column / type / foreign key metadata.
+
+    The metadata is read from sqlite_master and the table PRAGMAs once, and
+    read again only when PRAGMA schema_version changes (any CREATE, DROP or
+    ALTER on the database bumps it).
+
+    Variables:
+    connection: connection to the database """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.schema_version = None
+        self._tables = []
+        self._columns = {}
+        self._foreign_keys = {}
+        self._indexed_columns = {}
+
+    def _refresh(self):
+        """ Reloads the metadata if the schema changed since the last load. """
+        cursor = self.connection.cursor()
+        schema_version = cursor.execute("PRAGMA schema_version;").fetchone()[0]
+        if schema_version == self.schema_version:
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY rowid;")
+        all_tables = [row[0] for row in cursor.fetchall()]
+        columns = {}
+        foreign_keys = {}
+        indexed_columns = {}
+        for table_name in all_tables:
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            columns[table_name] = [Column(row[1], row[2], bool(row[3]), row[4], row[5]) for row in cursor.fetchall()]
+            cursor.execute(f"PRAGMA foreign_key_list({table_name})")
+            foreign_keys[table_name] = [ForeignKey(row[3], row[2], row[4]) for row in cursor.fetchall()]
+            indexed_columns[table_name] = {}
+            for index in cursor.execute(f"PRAGMA index_list({table_name})").fetchall():
+                # the entries of an index are (its columns..., rowid), the viewer's keyset order; partial
+                # indexes only serve some queries, and expression or DESC columns don't sort as the columns
+                if not index[4]:
+                    key = [(row[2], row[3]) for row in self.connection.execute(
+                        f"PRAGMA index_xinfo({index[1]})").fetchall() if row[5]]
+                    if all(name is not None and not descending for name, descending in key):
+                        key = [name for name, _ in key]
+                        known = indexed_columns[table_name].get(key[0])
+                        # the shortest index led by a column has the smallest keys
+                        if known is None or len(key) < len(known):
+                            indexed_columns[table_name][key[0]] = key
+        # tables starting with '_' are internal (e.g. the search index), as are sqlite_ ones
+        self._tables = [name for name in all_tables if not name.startswith(("_", "sqlite_"))]
+        self._columns = columns
+        self._foreign_keys = foreign_keys
+        self._indexed_columns = indexed_columns
+        self.schema_version = schema_version
+
+    def tables(self):
+        """ Names of the user tables, in creation order. """
+        self._refresh()
+        return list(self._tables)
+
+    def has_table(self, table_name):
+        """ Whether a table (user or internal) exists. """
+        self._refresh()
+        return table_name in self._columns
+
+    def columns(self, table_name):
+        """ Column metadata (Column tuples) of a table, [] if it does not exist. """
+        self._refresh()
+        return list(self._columns.get(table_name, []))
+
+    def column_names(self, table_name):
+        """ Column names of a table in table order. """
+        return [column.name for column in self.columns(table_name)]
+
+    def primary_key(self, table_name):
+        """ Names of the primary key columns of a table. """
+        return [column.name for column in sorted(self.columns(table_name), key=lambda c: c.primary_key)
+                if column.primary_key]
+
+    def foreign_keys(self, table_name):
+        """ ForeignKey tuples (column, table, to_column) of a table. """
+        self._refresh()
+        return list(self._foreign_keys.get(table_name, []))
+
+    def indexed_columns(self, table_name):
+        """ Columns of a table that lead a (non partial) index, so pages sorted on
+        the index columns then the rowid are read in index order. """
+        self._refresh()
+        return set(self._indexed_columns.get(table_name, {}))
+
+    def index_key(self, table_name, column_name):
+        """ Columns of the shortest index led by a column (the column first), None if there is none. """
+        self._refresh()
+        key = self._indexed_columns.get(table_name, {}).get(column_name)
+        return None if key is None else list(key)
+
+
+# one catalog per open connection (the catalog keeps the connection alive, so the id is not reused)
+_catalogs = {}
+
+
+def get_catalog(connection):
+    """ Gets the schema catalog of a connection, creating it on first use.
+
+    Variables:
+    connection: connection to the database
+
+    Returns:
+    catalog: the SchemaCatalog of that connection """
+    catalog = _catalogs.get(id(connection))
+    if catalog is None:
+        catalog = _catalogs[id(connection)] = SchemaCatalog(connection)
+    return catalog
+
+
+def forget_catalog(connection):
+    """ Drops the catalog of a connection that is being closed. """
+    _catalogs.pop(id(connection), None)
+
+
+def get_column_names(connection, table_name):
+    """ Gets the column names of a table.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table
+
+    Returns:
+    column_names: names of the columns in table order """
+    return get_catalog(connection).column_names(table_name)
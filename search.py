@@ -0,0 +1,187 @@
+""" Global search over every table in the database.
+
+Every column value of the searchable tables is copied into the
+_Search_Index table as (Value, Table_Name, Row_Key), Row_Key being the
+row's primary key. Triggers on each table keep the index in sync, so a
+search is one index lookup on Value followed by primary key fetches,
+instead of an OR-chain scan over every table. The entries are keyed by
+primary key rather than rowid since none of the tables has an INTEGER
+PRIMARY KEY: VACUUM may renumber their rowids. """
+from sqlite3 import Error
+
+from schema import get_catalog, get_column_names, table_names
+
+search_index_table = """ CREATE TABLE IF NOT EXISTS _Search_Index (
+    Value TEXT COLLATE NOCASE NOT NULL,
+    Table_Name TEXT NOT NULL,
+    Row_Key NOT NULL ); """
+
+search_index_value = "CREATE INDEX IF NOT EXISTS _Search_Index_Value ON _Search_Index (Value);"
+search_index_row = "CREATE INDEX IF NOT EXISTS _Search_Index_Row ON _Search_Index (Table_Name, Row_Key);"
+
+# Max number of keys bound into one "key IN (...)" fetch
+FETCH_CHUNK = 500
+
+
+search_query = "SELECT DISTINCT Table_Name, Row_Key FROM _Search_Index WHERE Value = ?;"
+
+prefix_search_query = "SELECT DISTINCT Table_Name, Row_Key FROM _Search_Index WHERE Value LIKE ? ESCAPE '\\';"
+
+
+def _key_column(connection, table_name):
+    """ The primary key column the index entries of a table point at. """
+    return get_catalog(connection).primary_key(table_name)[0]
+
+
+def _values_select(table_name, key_column, column_names, prefix):
+    """ Builds the SELECT that turns one row into (Value, Table_Name, Row_Key) rows.
+
+    Variables:
+    table_name: The name of a specific table
+    key_column: primary key column of the table
+    column_names: columns of the table
+    prefix: 'NEW.' inside a trigger """
+    return " UNION ALL ".join(
+        f"SELECT CAST({prefix}{col} AS TEXT), '{table_name}', {prefix}{key_column} "
+        f"WHERE {prefix}{col} IS NOT NULL AND {prefix}{key_column} IS NOT NULL"
+        for col in column_names)
+
+
+def create_search_triggers(connection, table_name):
+    """ Creates the insert/update/delete triggers that keep the index in sync.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table """
+    column_names = get_column_names(connection, table_name)
+    key_column = _key_column(connection, table_name)
+    new_values = _values_select(table_name, key_column, column_names, "NEW.")
+    delete_old = f"DELETE FROM _Search_Index WHERE Table_Name = '{table_name}' AND Row_Key = OLD.{key_column};"
+    triggers = [
+        f""" CREATE TRIGGER IF NOT EXISTS _Search_{table_name}_Insert AFTER INSERT ON {table_name}
+        BEGIN
+            INSERT INTO _Search_Index (Value, Table_Name, Row_Key) {new_values};
+        END; """,
+        f""" CREATE TRIGGER IF NOT EXISTS _Search_{table_name}_Update AFTER UPDATE ON {table_name}
+        BEGIN
+            {delete_old}
+            INSERT INTO _Search_Index (Value, Table_Name, Row_Key) {new_values};
+        END; """,
+        f""" CREATE TRIGGER IF NOT EXISTS _Search_{table_name}_Delete AFTER DELETE ON {table_name}
+        BEGIN
+            {delete_old}
+        END; """,
+    ]
+    cursor = connection.cursor()
+    for trigger in triggers:
+        cursor.execute(trigger)
+
+
+def drop_search_triggers(connection, table_name):
+    """ Drops the search triggers of a table, e.g. before ALTER TABLE ... DROP.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table """
+    cursor = connection.cursor()
+    for event in ("Insert", "Update", "Delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS _Search_{table_name}_{event};")
+
+
+def index_table(connection, table_name, after_rowid=0):
+    """ (Re)builds the index entries of one table from its current rows.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table
+    after_rowid: only index rows above this rowid (rows appended by a bulk load) """
+    column_names = get_column_names(connection, table_name)
+    key_column = _key_column(connection, table_name)
+    cursor = connection.cursor()
+    if after_rowid:
+        cursor.execute(f"DELETE FROM _Search_Index WHERE Table_Name = ? AND Row_Key IN "
+                       f"(SELECT {key_column} FROM {table_name} WHERE rowid > ?);", (table_name, after_rowid))
+    else:
+        cursor.execute("DELETE FROM _Search_Index WHERE Table_Name = ?;", (table_name,))
+    for col in column_names:
+        cursor.execute(f"INSERT INTO _Search_Index (Value, Table_Name, Row_Key) "
+                       f"SELECT CAST({col} AS TEXT), '{table_name}', {key_column} "
+                       f"FROM {table_name} WHERE rowid > ? AND {col} IS NOT NULL AND {key_column} IS NOT NULL;",
+                       (after_rowid,))
+
+
+def refresh_search_table(connection, table_name):
+    """ Recreates triggers and index entries of a table after its columns changed.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table """
+    drop_search_triggers(connection, table_name)
+    create_search_triggers(connection, table_name)
+    index_table(connection, table_name)
+    connection.commit()
+
+
+def create_search_index(connection, tables=None):
+    """ Creates the search index and its triggers, backfilling it on first use.
+
+    Variables:
+    connection: connection to the database
+    tables: tables to index, defaults to all the tables of the schema """
+    if tables is None:
+        tables = table_names
+    try:
+        catalog = get_catalog(connection)
+        is_new = not catalog.has_table("_Search_Index")
+        cursor = connection.cursor()
+        if not is_new and "Row_Key" not in catalog.column_names("_Search_Index"):
+            # built when the entries pointed at rowids
+            for table_name in table_names:
+                drop_search_triggers(connection, table_name)
+            cursor.execute("DROP TABLE _Search_Index;")
+            is_new = True
+        cursor.execute(search_index_table)
+        cursor.execute(search_index_value)
+        cursor.execute(search_index_row)
+        for table_name in tables:
+            create_search_triggers(connection, table_name)
+            if is_new:
+                index_table(connection, table_name)
+        connection.commit()
+    except Error as e:
+        print(e)
+
+
+def search(connection, value, prefix=False):
+    """ Finds every row that has a column equal to value (case insensitive).
+
+    Variables:
+    connection: connection to the database
+    value: the attribute value being searched for
+    prefix: when True, match every value starting with value instead
+
+    Returns:
+    results: dict of table name -> list of matching records """
+    cursor = connection.cursor()
+    if prefix:
+        escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        cursor.execute(prefix_search_query, (escaped + "%",))
+    else:
+        cursor.execute(search_query, (value,))
+
+    row_keys = {}
+    for table_name, row_key in cursor.fetchall():
+        row_keys.setdefault(table_name, []).append(row_key)
+
+    results = {}
+    for table_name, keys in row_keys.items():
+        key_column = _key_column(connection, table_name)
+        records = []
+        for start in range(0, len(keys), FETCH_CHUNK):
+            chunk = keys[start:start + FETCH_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"SELECT * FROM {table_name} WHERE {key_column} IN ({placeholders}) ORDER BY rowid;",
+                           chunk)
+            records.extend(cursor.fetchall())
+        results[table_name] = records
+    return results
@@ -0,0 +1,122 @@
+""" asyncio front-end for the read-only lookups (menu options 3, 7, 8 and 9).
+
+Each lookup runs on a bounded thread pool, one read connection per thread
+(pool.ConnectionPool in WAL mode), so the event loop never blocks on SQLite:
+- coalescing: while a lookup is running, identical requests (same lookup,
+  same arguments) wait for its result instead of running it again,
+- backpressure: at most max_pending distinct lookups are queued or running;
+  beyond that new requests fail at once with ServiceOverloaded,
+- timeouts: a request waits at most timeout seconds (asyncio.TimeoutError);
+  the lookup itself finishes in its thread and still serves the other
+  requests waiting for it.
+
+Usage:
+    async with QueryService("aircraft_management_system_db.db") as service:
+        captains = await service.pilots_by_rank("Captain") """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import availability
+import queries
+import search as search_index
+from pool import DEFAULT_MAX_READERS, ConnectionPool
+
+DEFAULT_MAX_PENDING = 256
+DEFAULT_TIMEOUT = 2.0
+
+
+class ServiceOverloaded(Exception):
+    """ Raised when max_pending lookups are already queued or running. """
+
+
+class QueryService:
+    """ Coalescing, bounded, async executor of the lookups.
+
+    Variables:
+    database_file (str): name of db file.
+    max_workers (int): threads (and read connections) running lookups
+    max_pending (int): max distinct lookups queued or running at once
+    timeout (float): seconds a request waits for its result """
+
+    def __init__(self, database_file, max_workers=DEFAULT_MAX_READERS, max_pending=DEFAULT_MAX_PENDING,
+                 timeout=DEFAULT_TIMEOUT):
+        self.pool = ConnectionPool(database_file, max_readers=max_workers)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="lookup")
+        self._in_flight = {}
+        self._metrics = {"requests": 0, "executed": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    async def run(self, function, *args):
+        """ Runs function(connection, *args) on the pool, sharing the result
+        with identical concurrent requests.
+
+        Returns:
+        result: what function returns
+
+        Raises:
+        ServiceOverloaded: if max_pending lookups are already in flight
+        asyncio.TimeoutError: if the result takes longer than timeout """
+        self._metrics["requests"] += 1
+        key = (function, args)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self._metrics["coalesced"] += 1
+        else:
+            if len(self._in_flight) >= self.max_pending:
+                self._metrics["rejected"] += 1
+                raise ServiceOverloaded(f"{len(self._in_flight)} lookups already in flight")
+            self._metrics["executed"] += 1
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self.pool.run, function, *args)
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        try:
+            # shield: one waiter timing out must not cancel the lookup for the others
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._metrics["timeouts"] += 1
+            raise
+        except Exception:
+            self._metrics["errors"] += 1
+            raise
+
+    async def search(self, value, prefix=False):
+        """ Rows equal to (or starting with) value in any table (menu option 3). """
+        return await self.run(search_index.search, value, prefix)
+
+    async def flight_duration_and_passengers(self, flight_number):
+        """ (Flight_Duration, Passenger_Count) of one flight (menu option 7). """
+        return await self.run(queries.flight_duration_and_passengers, flight_number)
+
+    async def aircraft_by_status(self, status):
+        """ (registration, manufacturer) of the aircraft with a status (menu option 8). """
+        return await self.run(queries.aircraft_by_status, status)
+
+    async def available_aircraft(self, start, end, airport_code=None, min_seats=0):
+        """ Active aircraft free between start and end (menu option 8). """
+        return await self.run(availability.available_aircraft, start, end, airport_code, min_seats)
+
+    async def pilots_by_rank(self, rank):
+        """ (first name, last name) of the pilots with a rank (menu option 9). """
+        return await self.run(queries.pilots_by_rank, rank)
+
+    def metrics(self):
+        """ Request counters plus the pool metrics.
+
+        Returns:
+        metrics: dict """
+        metrics = dict(self._metrics)
+        metrics["in_flight"] = len(self._in_flight)
+        metrics["pool"] = self.pool.metrics()
+        return metrics
+
+    def close(self):
+        """ Waits for the running lookups and closes the connections. """
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,436 @@
+""" Flights sharded across several SQLite files, queried scatter-gather on a process pool.
+
+A directory of shards holds one database file per shard (<name>.db) and
+shards.json, the ShardMap every process routes with:
+- Flight rows go to the shard of their departure region (by='airport':
+  regions maps airport codes to shards, other airports are spread by a
+  stable hash of the code) or of their departure month (by='month',
+  months dealt round robin),
+- Pilot_Flight and Aircraft_Flight rows follow their flight,
+- Aircraft, Pilot, Destination and Aircraft_Destination are reference
+  tables, copied to every shard (a write to them goes to every shard, one
+  transaction per shard, so it is not atomic across shards).
+
+Each shard is a complete database (indexes, search index, availability
+R*Tree, stats), so a query runs unchanged on every shard. ShardedDatabase
+sends it to a ProcessPoolExecutor, one task per shard, so the shards are
+read on all cores, and merges the partial results: rows of the sharded
+tables are concatenated (so query refuses aggregates, ORDER BY, LIMIT and
+the like over them), reference rows are taken from one shard, stats are
+added group by group (load factor recomputed from the totals) and aggregates
+merge their partial sum / count / min / max (avg = total sum / total count).
+Reads use read-only connections; inserts are the only routed writes. """
+import json
+import os
+import re
+import sqlite3
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from availability import create_availability_index
+from indexes import create_indexes
+from schema import SCHEMA_VERSION, get_catalog, tables_to_create
+from search import create_search_index, search
+from stats import create_stats_tables, stats_by_aircraft, stats_by_day, stats_by_pilot, stats_by_route
+
+SHARDED_TABLES = ("Flight", "Pilot_Flight", "Aircraft_Flight")
+REFERENCE_TABLES = ("Aircraft", "Pilot", "Destination", "Aircraft_Destination")
+SHARD_MAP_FILE = "shards.json"
+
+_aggregate_functions = ("sum", "count", "min", "max", "avg")
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_read_only_query = re.compile(r"^\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+# what makes concatenated per-shard rows differ from the rows of one database
+_cross_shard_clauses = re.compile(
+    r"\b(?:GROUP\s+BY|ORDER\s+BY|LIMIT|OFFSET|DISTINCT|HAVING|UNION|INTERSECT|EXCEPT|OVER)\b"
+    r"|\b(?:count|sum|total|avg|min|max|group_concat)\s*\(", re.IGNORECASE)
+
+
+class ShardMap:
+    """ Which shard a flight belongs to.
+
+    Variables:
+    directory (str): directory of the shard files
+    shards (list): shard names
+    by (str): 'airport' (departure region) or 'month' (departure month)
+    regions (dict): airport code -> shard name, by='airport' only """
+
+    def __init__(self, directory, shards, by="airport", regions=None):
+        if by not in ("airport", "month"):
+            raise ValueError(f"Unknown shard key: {by!r} (expected 'airport' or 'month')")
+        unknown = set((regions or {}).values()) - set(shards)
+        if unknown:
+            raise ValueError(f"Regions mapped to unknown shards: {', '.join(sorted(unknown))}")
+        self.directory = directory
+        self.shards = list(shards)
+        self.by = by
+        self.regions = dict(regions or {})
+
+    @classmethod
+    def load(cls, directory):
+        """ Reads the map saved in a shard directory. """
+        with open(os.path.join(directory, SHARD_MAP_FILE)) as map_file:
+            saved = json.load(map_file)
+        return cls(directory, saved["shards"], saved["by"], saved["regions"])
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, SHARD_MAP_FILE), "w") as map_file:
+            json.dump({"shards": self.shards, "by": self.by, "regions": self.regions}, map_file, indent=2)
+
+    def path(self, shard):
+        """ Database file of a shard. """
+        return os.path.join(self.directory, f"{shard}.db")
+
+    def paths(self):
+        return [self.path(shard) for shard in self.shards]
+
+    def shard_of(self, departure_airport, departure_date_time):
+        """ Shard of a flight from its Departure_Airport_Code and Departure_Date_Time. """
+        if self.by == "month":
+            if not departure_date_time or len(departure_date_time) < 7:
+                return self.shards[0]
+            month = int(departure_date_time[:4]) * 12 + int(departure_date_time[5:7]) - 1
+            return self.shards[month % len(self.shards)]
+        shard = self.regions.get(departure_airport)
+        if shard is None:
+            # crc32, unlike hash(), is the same in every process
+            shard = self.shards[zlib.crc32((departure_airport or "").encode()) % len(self.shards)]
+        return shard
+
+
+def create_shard(connection):
+    """ Creates the (empty) tables of a shard; the indexes come after its data. """
+    for table_query in tables_to_create:
+        connection.execute(table_query)
+    connection.commit()
+
+
+def _finish_shard(connection):
+    """ Builds the indexes and derived tables of a loaded shard and stamps its schema version. """
+    create_indexes(connection)
+    create_search_index(connection)
+    create_availability_index(connection)
+    create_stats_tables(connection)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+    connection.execute("PRAGMA journal_mode=WAL;")
+
+
+def _split_one(shard_map, shard, source_file):
+    """ Fills one shard from the source database (runs in a worker process).
+
+    Returns:
+    rows: dict table -> rows copied """
+    path = shard_map.path(shard)
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists")
+    connection = sqlite3.connect(path)
+    try:
+        create_shard(connection)
+        connection.create_function("shard_of", 2, shard_map.shard_of, deterministic=True)
+        connection.execute("ATTACH DATABASE ? AS source;", (source_file,))
+        rows = {}
+        connection.execute("BEGIN;")
+        for table_name in REFERENCE_TABLES:
+            rows[table_name] = connection.execute(
+                f"INSERT INTO main.{table_name} SELECT * FROM source.{table_name};").rowcount
+        rows["Flight"] = connection.execute(
+            "INSERT INTO main.Flight SELECT * FROM source.Flight "
+            "WHERE shard_of(Departure_Airport_Code, Departure_Date_Time) = ?;", (shard,)).rowcount
+        for table_name in ("Pilot_Flight", "Aircraft_Flight"):
+            # links to flights that exist nowhere are kept on the first shard
+            orphans = (" OR Flight_Number IS NULL OR Flight_Number NOT IN (SELECT Flight_Number FROM source.Flight)"
+                       if shard == shard_map.shards[0] else "")
+            rows[table_name] = connection.execute(
+                f"INSERT INTO main.{table_name} SELECT * FROM source.{table_name} "
+                f"WHERE Flight_Number IN (SELECT Flight_Number FROM main.Flight){orphans};").rowcount
+        connection.commit()
+        connection.execute("DETACH DATABASE source;")
+        _finish_shard(connection)
+        return rows
+    finally:
+        connection.close()
+
+
+def split_database(source_file, shard_map, processes=None):
+    """ Splits a database into the shards of shard_map (one worker process per shard) and saves the map.
+
+    Variables:
+    source_file: the database to split (left unchanged)
+    shard_map: ShardMap of the new shards; their files must not exist yet
+    processes: worker processes, one per CPU by default
+
+    Returns:
+    report: dict shard -> dict table -> rows """
+    shard_map.save()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {shard: executor.submit(_split_one, shard_map, shard, source_file) for shard in shard_map.shards}
+        return {shard: future.result() for shard, future in futures.items()}
+
+
+# connections opened by a worker process, one per shard file
+_worker_connections = {}
+
+
+def _shard_connection(path, read_only):
+    """ The connection of this worker process to a shard file (read-only ones for the reads). """
+    connection = _worker_connections.get((path, read_only))
+    if connection is None:
+        if read_only:
+            connection = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        else:
+            connection = sqlite3.connect(path)
+        _worker_connections[(path, read_only)] = connection
+    return connection
+
+
+def _run_on_shard(path, function_name, args):
+    """ Runs one of the _shard_functions on a shard (in a worker process). """
+    return _shard_functions[function_name](_shard_connection(path, function_name != "write"), *args)
+
+
+def _shard_query(connection, query, params):
+    return connection.execute(query, params).fetchall()
+
+
+def _shard_stats(connection, group, start, end):
+    if group == "day":
+        return stats_by_day(connection, start, end)
+    return {"aircraft": stats_by_aircraft, "route": stats_by_route, "pilot": stats_by_pilot}[group](connection)
+
+
+def _shard_write(connection, query, rows):
+    cursor = connection.cursor()
+    cursor.executemany(query, rows)
+    connection.commit()
+    return cursor.rowcount
+
+
+def _shard_flights_present(connection, flight_numbers):
+    placeholders = ", ".join("?" * len(flight_numbers))
+    return [row[0] for row in connection.execute(
+        f"SELECT Flight_Number FROM Flight WHERE Flight_Number IN ({placeholders});", flight_numbers)]
+
+
+_shard_functions = {
+    "query": _shard_query,
+    "search": search,
+    "stats": _shard_stats,
+    "write": _shard_write,
+    "flights_present": _shard_flights_present,
+}
+
+
+class ShardedDatabase:
+    """ Scatter-gather reads and routed writes over a directory of shards.
+
+    Variables:
+    shard_map (ShardMap): the shards and the routing of flights
+    processes (int): worker processes, one per CPU by default """
+
+    def __init__(self, directory, processes=None):
+        self.shard_map = ShardMap.load(directory)
+        self.processes = processes
+        self._executor = ProcessPoolExecutor(max_workers=processes)
+        # reads of the schema only (column names, tables a query reads), never of the data
+        self._catalog_connection = sqlite3.connect(self.shard_map.paths()[0])
+
+    def _read_tables(self, query, params):
+        """ Tables a query reads, as SQLite sees them while preparing it (comma joins, subqueries, CTEs). """
+        tables = set()
+
+        def collect(action, table_name, column_name, database, source):
+            if action == sqlite3.SQLITE_READ and table_name:
+                tables.add(table_name)
+            return sqlite3.SQLITE_OK
+
+        self._catalog_connection.set_authorizer(collect)
+        try:
+            # EXPLAIN prepares the query without running it
+            self._catalog_connection.execute("EXPLAIN " + query, params)
+        finally:
+            self._catalog_connection.set_authorizer(None)
+        return tables
+
+    def _scatter(self, function_name, *args, paths=None):
+        """ Runs a shard function on every shard (or on paths) in parallel; results in shard order. """
+        futures = [self._executor.submit(_run_on_shard, path, function_name, args)
+                   for path in paths or self.shard_map.paths()]
+        return [future.result() for future in futures]
+
+    def query(self, query, params=()):
+        """ Rows of a SELECT over the sharded tables, every shard's rows concatenated (in no global order).
+        A query that reads only reference tables runs on one shard.
+
+        Concatenating is only right for queries that filter and project rows,
+        so queries over the sharded tables with aggregates, GROUP BY, DISTINCT,
+        ORDER BY, LIMIT or compound SELECTs are refused: use aggregate() (or
+        sort the rows afterwards).
+
+        Raises:
+        ValueError: the query is not a SELECT, or cannot be merged by concatenation """
+        if not _read_only_query.match(query):
+            raise ValueError("ShardedDatabase.query only runs SELECT queries; use insert_rows to write")
+        tables = self._read_tables(query, tuple(params))
+        if tables and tables <= set(REFERENCE_TABLES):
+            return self._scatter("query", query, tuple(params), paths=self.shard_map.paths()[:1])[0]
+        clause = _cross_shard_clauses.search(_string_literal.sub("''", query))
+        if clause:
+            raise ValueError(f"{clause.group(0).rstrip('(').strip()!r} over the sharded tables would be computed per "
+                             "shard; use ShardedDatabase.aggregate for totals and sort the rows afterwards")
+        return [row for rows in self._scatter("query", query, tuple(params)) for row in rows]
+
+    def search(self, value, prefix=False):
+        """ search.search over every shard: reference rows once, sharded rows from every shard. """
+        results = {}
+        for shard_results in self._scatter("search", value, prefix):
+            for table_name, records in shard_results.items():
+                if table_name in REFERENCE_TABLES:
+                    results.setdefault(table_name, records)
+                else:
+                    results.setdefault(table_name, []).extend(records)
+        return results
+
+    def stats(self, group, start=None, end=None):
+        """ Flight totals by aircraft, route, day or pilot, added up over the shards.
+
+        Returns:
+        stats: list of dicts like stats.stats_by_aircraft, sorted by key """
+        merged = {}
+        for shard_stats in self._scatter("stats", group, start, end):
+            for row in shard_stats:
+                keys = tuple(value for column, value in row.items() if column not in _stats_measures)
+                total = merged.get(keys)
+                if total is None:
+                    merged[keys] = dict(row)
+                else:
+                    for measure in _stats_measures[:-1]:
+                        total[measure] += row[measure]
+        for total in merged.values():
+            total["Load_Factor"] = total["Passengers"] / total["Seats"] if total["Seats"] else None
+        return [merged[keys] for keys in sorted(merged)]
+
+    def aggregate(self, group_by, aggregates, where="", params=()):
+        """ GROUP BY over Flight on every shard, partial results merged.
+
+        Variables:
+        group_by: Flight columns to group on ([] for one total)
+        aggregates: (function, column) pairs, function one of sum, count, min, max, avg
+        where: optional condition on Flight ("WHERE ..." without the keyword)
+        params: values of the ? placeholders in where
+
+        Returns:
+        rows: list of tuples (group columns..., aggregates...) sorted by group """
+        columns = set(get_catalog(self._catalog_connection).column_names("Flight"))
+        for column in list(group_by) + [column for _, column in aggregates]:
+            if column != "*" and column not in columns:
+                raise ValueError(f"Flight has no column {column!r}")
+        for function, column in aggregates:
+            if function not in _aggregate_functions:
+                raise ValueError(f"Unknown aggregate: {function!r} (expected one of {', '.join(_aggregate_functions)})")
+            if column == "*" and function != "count":
+                raise ValueError(f"{function}(*) is not an aggregate")
+        # each shard returns sum, count, min and max of every aggregated column
+        partial = ", ".join("NULL, count(*), NULL, NULL" if column == "*" else
+                            f"sum({column}), count({column}), min({column}), max({column})"
+                            for _, column in aggregates)
+        select = ", ".join(list(group_by) + [partial])
+        query = f"SELECT {select} FROM Flight {'WHERE ' + where if where else ''}"
+        if group_by:
+            query += f" GROUP BY {', '.join(group_by)}"
+
+        merged = {}
+        width = len(group_by)
+        for rows in self._scatter("query", query + ";", tuple(params)):
+            for row in rows:
+                keys, values = row[:width], row[width:]
+                total = merged.get(keys)
+                if total is None:
+                    merged[keys] = list(values)
+                    continue
+                for i in range(0, len(values), 4):
+                    total[i] = _add(total[i], values[i])
+                    total[i + 1] += values[i + 1]
+                    total[i + 2] = _pick(min, total[i + 2], values[i + 2])
+                    total[i + 3] = _pick(max, total[i + 3], values[i + 3])
+
+        results = []
+        for keys in sorted(merged, key=lambda group: tuple((value is None, value) for value in group)):
+            total = merged[keys]
+            values = []
+            for n, (function, _) in enumerate(aggregates):
+                column_sum, count, smallest, largest = total[4 * n:4 * n + 4]
+                if function == "avg":
+                    values.append(column_sum / count if count else None)
+                else:
+                    values.append({"sum": column_sum, "count": count, "min": smallest, "max": largest}[function])
+            results.append(tuple(keys) + tuple(values))
+        return results
+
+    def insert_rows(self, table_name, rows):
+        """ Inserts rows (tuples in table column order) where they belong: reference rows on every shard,
+        flights on the shard of their departure, link rows on the shard of their flight.
+
+        This is the only routed write: updates and deletes (including a flight
+        whose new departure belongs to another shard, which would have to move
+        with its link rows) are not supported; apply them to the shard files
+        directly, or split the database again.
+
+        Returns:
+        inserted: number of rows inserted (reference rows counted once) """
+        catalog = get_catalog(self._catalog_connection)
+        columns = catalog.column_names(table_name)
+        if not columns:
+            raise ValueError(f"Unknown table: {table_name!r}")
+        query = f"INSERT INTO {table_name} VALUES ({', '.join('?' * len(columns))});"
+        rows = [tuple(row) for row in rows]
+        if table_name in REFERENCE_TABLES:
+            return self._scatter("write", query, rows)[0]
+
+        by_shard = {shard: [] for shard in self.shard_map.shards}
+        if table_name == "Flight":
+            airport, departure = columns.index("Departure_Airport_Code"), columns.index("Departure_Date_Time")
+            for row in rows:
+                by_shard[self.shard_map.shard_of(row[airport], row[departure])].append(row)
+        else:
+            flight = columns.index("Flight_Number")
+            flight_numbers = sorted({row[flight] for row in rows if row[flight] is not None})
+            home = {}
+            for shard, present in zip(self.shard_map.shards, self._scatter("flights_present", flight_numbers)):
+                for flight_number in present:
+                    home.setdefault(flight_number, shard)
+            for row in rows:
+                by_shard[home.get(row[flight], self.shard_map.shards[0])].append(row)
+
+        busy = [shard for shard, shard_rows in by_shard.items() if shard_rows]
+        futures = [self._executor.submit(_run_on_shard, self.shard_map.path(shard), "write", (query, by_shard[shard]))
+                   for shard in busy]
+        return sum(future.result() for future in futures)
+
+    def close(self):
+        self._executor.shutdown()
+        self._catalog_connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_stats_measures = ("Flights", "Passengers", "Seats", "Block_Hours", "Passenger_Hours", "Load_Factor")
+
+
+def _add(total, value):
+    """ SQL sum: NULL only if every part is NULL. """
+    if total is None:
+        return value
+    return total if value is None else total + value
+
+
+def _pick(function, current, value):
+    """ SQL min / max: NULLs ignored. """
+    if current is None:
+        return value
+    return current if value is None else function(current, value)
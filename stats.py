@@ -0,0 +1,237 @@
+""" Flight statistics by aircraft, route, day and pilot.
+
+The totals live in summary tables (_Stats_Aircraft, _Stats_Route, _Stats_Day,
+_Stats_Pilot) that triggers on Flight and Pilot_Flight update by +/- one
+flight on every insert, update and delete. Reading the stats costs one row
+per group instead of a GROUP BY over the whole Flight table.
+
+Each group keeps: Flights, Passengers, Seats (current Seat_Capacity of the
+aircraft of each flight: triggers on Aircraft re-weight the groups of its
+flights when the capacity changes), Block_Hours (sum of Flight_Duration) and
+Passenger_Hours (sum of Passenger_Count * Flight_Duration). The schema has no
+airport coordinates, so passenger-hours stand in for passenger-km. """
+from sqlite3 import Error
+
+from schema import get_catalog
+
+# name -> (key columns, expression of each key for a Flight row written as {row}.)
+_flight_groups = {
+    "_Stats_Aircraft": (["Aircraft_Registration_Number"], ["{row}.Aircraft_Registration_Number"]),
+    "_Stats_Route": (["Departure_Airport_Code", "Arrival_Airport_Code"],
+                     ["{row}.Departure_Airport_Code", "{row}.Arrival_Airport_Code"]),
+    "_Stats_Day": (["Day"], ["COALESCE(date({row}.Departure_Date_Time), 'unknown')"]),
+}
+
+_measures = ["Flights", "Passengers", "Seats", "Block_Hours", "Passenger_Hours"]
+
+
+def _measure_values(row, sign):
+    """ The five measures of one Flight row, negated when sign is '-'. """
+    values = [
+        "1",
+        f"COALESCE({row}.Passenger_Count, 0)",
+        f"COALESCE((SELECT Seat_Capacity FROM Aircraft WHERE Aircraft_Registration_Number = "
+        f"{row}.Aircraft_Registration_Number), 0)",
+        f"COALESCE({row}.Flight_Duration, 0)",
+        f"COALESCE({row}.Passenger_Count * {row}.Flight_Duration, 0)",
+    ]
+    return [f"{sign}{value}" if sign == "-" else value for value in values]
+
+
+def _stats_table(table_name, key_columns):
+    """ CREATE TABLE statement of one summary table. """
+    keys = ",\n    ".join(f"{key} TEXT NOT NULL" for key in key_columns)
+    measures = ",\n    ".join(f"{measure} REAL NOT NULL DEFAULT 0" for measure in _measures)
+    return f""" CREATE TABLE IF NOT EXISTS {table_name} (
+    {keys},
+    {measures},
+    PRIMARY KEY ({', '.join(key_columns)}) ); """
+
+
+def _upsert(table_name, key_columns, key_values, measure_values, source=""):
+    """ INSERT ... ON CONFLICT DO UPDATE that adds measure_values to the group of key_values.
+
+    source is the "FROM ... WHERE ..." the values are selected from, if any
+    (an upsert from a SELECT needs a WHERE clause to parse). """
+    updates = ", ".join(f"{measure} = {measure} + excluded.{measure}" for measure in _measures)
+    return (f"INSERT INTO {table_name} ({', '.join(key_columns + _measures)}) "
+            f"SELECT {', '.join(key_values + measure_values)} {source or 'WHERE true'} "
+            f"ON CONFLICT({', '.join(key_columns)}) DO UPDATE SET {updates};")
+
+
+def _cleanup(table_name, key_columns, key_values):
+    """ Removes the group of key_values once its last flight is gone. """
+    condition = " AND ".join(f"{key} = {value}" for key, value in zip(key_columns, key_values))
+    return f"DELETE FROM {table_name} WHERE {condition} AND Flights <= 0;"
+
+
+def _flight_statements(row, sign):
+    """ Statements that add (sign '') or remove (sign '-') one Flight row everywhere. """
+    statements = []
+    for table_name, (key_columns, key_templates) in _flight_groups.items():
+        key_values = [template.format(row=row) for template in key_templates]
+        statements.append(_upsert(table_name, key_columns, key_values, _measure_values(row, sign)))
+        if sign == "-":
+            statements.append(_cleanup(table_name, key_columns, key_values))
+    statements.extend(_pilot_statements(
+        f"FROM Pilot_Flight WHERE Pilot_Flight.Flight_Number = {row}.Flight_Number "
+        f"AND Pilot_Flight.Commercial_Pilot_License_Number IS NOT NULL",
+        "Pilot_Flight.Commercial_Pilot_License_Number", row, sign))
+    return statements
+
+
+def _pilot_statements(source, pilot, flight, sign):
+    """ Statements that add or remove one flight for the pilots selected by source. """
+    statements = [_upsert("_Stats_Pilot", ["Commercial_Pilot_License_Number"], [pilot],
+                          _measure_values(flight, sign), source)]
+    if sign == "-":
+        statements.append("DELETE FROM _Stats_Pilot WHERE Flights <= 0 AND Commercial_Pilot_License_Number IN "
+                          f"(SELECT {pilot} {source});")
+    return statements
+
+
+def _pilot_flight_statements(row, sign):
+    """ Statements that add or remove the flight of one Pilot_Flight row for its pilot. """
+    return _pilot_statements(
+        f"FROM Flight WHERE Flight.Flight_Number = {row}.Flight_Number "
+        f"AND {row}.Commercial_Pilot_License_Number IS NOT NULL",
+        f"{row}.Commercial_Pilot_License_Number", "Flight", sign)
+
+
+def _seat_statements(registration, seats):
+    """ Statements that add seats (per flight) to every group the flights of one aircraft count in. """
+    flights = f"FROM Flight WHERE Flight.Aircraft_Registration_Number = {registration}"
+    statements = []
+    for table_name, (key_columns, key_templates) in _flight_groups.items():
+        key_values = [template.format(row="Flight") for template in key_templates]
+        same_group = " AND ".join(f"{value} = {table_name}.{key}" for key, value in zip(key_columns, key_values))
+        statements.append(f"UPDATE {table_name} SET Seats = Seats + {seats} * (SELECT count(*) {flights} "
+                          f"AND {same_group}) WHERE ({', '.join(key_columns)}) IN "
+                          f"(SELECT {', '.join(key_values)} {flights});")
+    pilot_flights = ("FROM Pilot_Flight JOIN Flight ON Flight.Flight_Number = Pilot_Flight.Flight_Number "
+                     f"WHERE Flight.Aircraft_Registration_Number = {registration}")
+    statements.append(f"UPDATE _Stats_Pilot SET Seats = Seats + {seats} * (SELECT count(*) {pilot_flights} "
+                      "AND Pilot_Flight.Commercial_Pilot_License_Number = _Stats_Pilot.Commercial_Pilot_License_Number) "
+                      "WHERE Commercial_Pilot_License_Number IN "
+                      f"(SELECT Pilot_Flight.Commercial_Pilot_License_Number {pilot_flights});")
+    return statements
+
+
+def _trigger(name, event, table_name, statements, when=None):
+    """ CREATE TRIGGER statement running statements after each event on table_name (if when holds). """
+    body = "\n            ".join(statements)
+    condition = f" WHEN {when}" if when else ""
+    return f""" CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table_name}{condition}
+        BEGIN
+            {body}
+        END; """
+
+
+stats_tables = [_stats_table(table_name, key_columns) for table_name, (key_columns, _) in _flight_groups.items()]
+stats_tables.append(_stats_table("_Stats_Pilot", ["Commercial_Pilot_License_Number"]))
+
+stats_triggers = [
+    _trigger("_Stats_Flight_Insert", "INSERT", "Flight", _flight_statements("NEW", "")),
+    _trigger("_Stats_Flight_Update", "UPDATE", "Flight",
+             _flight_statements("OLD", "-") + _flight_statements("NEW", "")),
+    _trigger("_Stats_Flight_Delete", "DELETE", "Flight", _flight_statements("OLD", "-")),
+    _trigger("_Stats_Pilot_Flight_Insert", "INSERT", "Pilot_Flight", _pilot_flight_statements("NEW", "")),
+    _trigger("_Stats_Pilot_Flight_Update", "UPDATE", "Pilot_Flight",
+             _pilot_flight_statements("OLD", "-") + _pilot_flight_statements("NEW", "")),
+    _trigger("_Stats_Pilot_Flight_Delete", "DELETE", "Pilot_Flight", _pilot_flight_statements("OLD", "-")),
+    # the Seats of a flight follow the capacity of its aircraft, as in rebuild_stats
+    _trigger("_Stats_Aircraft_Insert", "INSERT", "Aircraft",
+             _seat_statements("NEW.Aircraft_Registration_Number", "COALESCE(NEW.Seat_Capacity, 0)")),
+    _trigger("_Stats_Aircraft_Update", "UPDATE OF Aircraft_Registration_Number, Seat_Capacity", "Aircraft",
+             _seat_statements("OLD.Aircraft_Registration_Number", "-COALESCE(OLD.Seat_Capacity, 0)")
+             + _seat_statements("NEW.Aircraft_Registration_Number", "COALESCE(NEW.Seat_Capacity, 0)"),
+             "OLD.Seat_Capacity IS NOT NEW.Seat_Capacity "
+             "OR OLD.Aircraft_Registration_Number IS NOT NEW.Aircraft_Registration_Number"),
+    _trigger("_Stats_Aircraft_Delete", "DELETE", "Aircraft",
+             _seat_statements("OLD.Aircraft_Registration_Number", "-COALESCE(OLD.Seat_Capacity, 0)")),
+]
+
+
+def rebuild_stats(connection):
+    """ Recomputes every summary table from scratch with GROUP BY (one full pass).
+
+    Variables:
+    connection: connection to the database """
+    cursor = connection.cursor()
+    measures = ", ".join(f"SUM({value})" for value in _measure_values("Flight", ""))
+    for table_name, (key_columns, key_templates) in _flight_groups.items():
+        key_values = [template.format(row="Flight") for template in key_templates]
+        cursor.execute(f"DELETE FROM {table_name};")
+        cursor.execute(f"INSERT INTO {table_name} ({', '.join(key_columns + _measures)}) "
+                       f"SELECT {', '.join(key_values)}, {measures} FROM Flight GROUP BY {', '.join(key_values)};")
+    cursor.execute("DELETE FROM _Stats_Pilot;")
+    cursor.execute(f"INSERT INTO _Stats_Pilot (Commercial_Pilot_License_Number, {', '.join(_measures)}) "
+                   f"SELECT Pilot_Flight.Commercial_Pilot_License_Number, {measures} "
+                   f"FROM Pilot_Flight JOIN Flight ON Flight.Flight_Number = Pilot_Flight.Flight_Number "
+                   f"WHERE Pilot_Flight.Commercial_Pilot_License_Number IS NOT NULL "
+                   f"GROUP BY Pilot_Flight.Commercial_Pilot_License_Number;")
+    connection.commit()
+
+
+def create_stats_tables(connection):
+    """ Creates the summary tables and their triggers, filling them on first use.
+
+    The tables are refilled too when the Aircraft triggers are new: until
+    then a Seat_Capacity change left the Seats of the groups out of date.
+
+    Variables:
+    connection: connection to the database """
+    try:
+        cursor = connection.cursor()
+        is_new = not get_catalog(connection).has_table("_Stats_Pilot") or cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name = '_Stats_Aircraft_Update';"
+        ).fetchone()[0] == 0
+        for table_query in stats_tables:
+            cursor.execute(table_query)
+        for trigger in stats_triggers:
+            cursor.execute(trigger)
+        connection.commit()
+        if is_new:
+            rebuild_stats(connection)
+    except Error as e:
+        print(e)
+
+
+def _read_stats(connection, table_name, key_columns, where="", params=()):
+    """ Reads a summary table, adding the load factor (Passengers / Seats).
+
+    Returns:
+    stats: list of dicts, one per group """
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT {', '.join(key_columns + _measures)} FROM {table_name} {where} "
+                   f"ORDER BY {', '.join(key_columns)};", params)
+    stats = []
+    for row in cursor.fetchall():
+        group = dict(zip(key_columns + _measures, row))
+        group["Flights"] = int(group["Flights"])
+        group["Load_Factor"] = group["Passengers"] / group["Seats"] if group["Seats"] else None
+        stats.append(group)
+    return stats
+
+
+def stats_by_aircraft(connection):
+    """ Totals per aircraft: flights, passengers, seats, block hours, passenger-hours and load factor. """
+    return _read_stats(connection, "_Stats_Aircraft", ["Aircraft_Registration_Number"])
+
+
+def stats_by_route(connection):
+    """ Totals per (departure airport, arrival airport). """
+    return _read_stats(connection, "_Stats_Route", ["Departure_Airport_Code", "Arrival_Airport_Code"])
+
+
+def stats_by_day(connection, start=None, end=None):
+    """ Totals per departure day, optionally from start to end ('YYYY-MM-DD', both included). """
+    if start is None and end is None:
+        return _read_stats(connection, "_Stats_Day", ["Day"])
+    return _read_stats(connection, "_Stats_Day", ["Day"], "WHERE Day BETWEEN ? AND ?",
+                       (start or "0000-00-00", end or "9999-99-99"))
+
+
+def stats_by_pilot(connection):
+    """ Totals per pilot over the flights they are assigned to in Pilot_Flight. """
+    return _read_stats(connection, "_Stats_Pilot", ["Commercial_Pilot_License_Number"])
@@ -0,0 +1,234 @@
+""" Deterministic synthetic data for every table, from 10^3 to 10^8 flights.
+
+The same (flights, seed) always gives the same rows. Everything is generated
+as streams of tuples (nothing is held in memory) and is referentially
+consistent:
+- every flight belongs to an aircraft and flies between two Destination airports,
+- the flights of an aircraft are back to back (one leg lands where the next
+  departs) and never overlap,
+- every flight has a Captain and a Cadet from its aircraft's crew of four
+  pilots, who alternate legs, so the roster has no overlapping legs,
+- Aircraft_Flight links every flight to its aircraft and Aircraft_Destination
+  links every aircraft to three destinations.
+
+Usage:
+    python synthetic.py --flights 1000000 --seed 1 --database synthetic.db """
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from availability import create_availability_index
+from indexes import create_indexes
+from loader import DEFAULT_BATCH_SIZE, load_rows
+from schema import SCHEMA_VERSION, tables_to_create
+from search import create_search_index
+from stats import create_stats_tables
+
+DEFAULT_SEED = 1
+SCHEDULE_START = datetime(2023, 1, 1)
+SCHEDULE_DAYS = 365
+
+_manufacturers = ["Airbus", "Boeing", "Embraer", "Bombardier", "ATR"]
+_first_names = ["Sean", "Aoife", "Luca", "Marta", "Jan", "Eva", "Omar", "Ines", "Piotr", "Sofia"]
+_last_names = ["Murphy", "Rossi", "Garcia", "Novak", "Silva", "Schmidt", "Kelly", "Horvat", "Dubois", "Berg"]
+_countries = ["Ireland", "Italy", "Spain", "Hungary", "Portugal", "Czech Republic", "Germany", "France"]
+_letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def table_sizes(flights):
+    """ Number of rows of each table for a given number of flights.
+
+    Returns:
+    sizes: dict table name -> row count """
+    aircraft = max(5, flights // 100)
+    return {
+        "Aircraft": aircraft,
+        "Flight": flights,
+        "Pilot": aircraft * 4,
+        "Destination": max(10, min(26 ** 3, flights // 500)),
+        "Pilot_Flight": flights * 2,
+        "Aircraft_Destination": aircraft * 3,
+        "Aircraft_Flight": flights,
+    }
+
+
+def _rng(seed, table_name):
+    """ Random generator of one table (str seeds are hashed deterministically). """
+    return random.Random(f"{seed}-{table_name}")
+
+
+def airport_code(index):
+    """ Three-letter code of the index-th destination (AAA, AAB, ...). """
+    return _letters[index // 676 % 26] + _letters[index // 26 % 26] + _letters[index % 26]
+
+
+def registration(index):
+    """ Aircraft_Registration_Number of the index-th aircraft. """
+    return f"EI-{index:07d}"
+
+
+def licence(index):
+    """ Commercial_Pilot_License_Number of the index-th pilot. """
+    return f"CPL-{index:08d}"
+
+
+def flight_number(index):
+    """ Flight_Number of the index-th flight. """
+    return f"FN{index:09d}"
+
+
+def seat_capacity(aircraft_index):
+    """ Seat_Capacity of an aircraft (100 to 349). """
+    return 100 + aircraft_index * 37 % 250
+
+
+def _leg_airport(aircraft_index, leg, destinations):
+    """ Departure airport of an aircraft's leg; consecutive legs never repeat an airport. """
+    step = 1 + aircraft_index % (destinations - 1)
+    return (aircraft_index * 7919 + leg * step) % destinations
+
+
+def aircraft_rows(flights, seed=DEFAULT_SEED):
+    """ Aircraft rows: 1 in 10 in Maintenance, 1 in 25 Retired, the rest Active. """
+    rng = _rng(seed, "Aircraft")
+    for a in range(table_sizes(flights)["Aircraft"]):
+        status = "Retired" if a % 25 == 24 else "Maintenance" if a % 10 == 9 else "Active"
+        yield (registration(a), seat_capacity(a), rng.choice(_manufacturers), status)
+
+
+def flight_rows(flights, seed=DEFAULT_SEED):
+    """ Flight rows: flight n is leg n // aircraft of aircraft n % aircraft, spread over a year. """
+    rng = _rng(seed, "Flight")
+    sizes = table_sizes(flights)
+    aircraft, destinations = sizes["Aircraft"], sizes["Destination"]
+    legs = -(-flights // aircraft)
+    gap = SCHEDULE_DAYS * 24 * 60 // legs
+    longest = max(45, min(300, gap - 60))
+    for n in range(flights):
+        a, leg = n % aircraft, n // aircraft
+        departure = SCHEDULE_START + timedelta(minutes=leg * gap + a % 60)
+        minutes = rng.randrange(45, longest + 1)
+        seats = seat_capacity(a)
+        yield (flight_number(n), registration(a),
+               airport_code(_leg_airport(a, leg, destinations)), airport_code(_leg_airport(a, leg + 1, destinations)),
+               departure.strftime("%Y-%m-%d %H:%M:%S"),
+               (departure + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S"),
+               rng.randrange(seats // 2, seats + 1), round(minutes / 60, 2))
+
+
+def pilot_rows(flights, seed=DEFAULT_SEED):
+    """ Pilot rows: four per aircraft, two Captains and two Cadets. """
+    rng = _rng(seed, "Pilot")
+    for p in range(table_sizes(flights)["Pilot"]):
+        yield (licence(p), rng.choice(_first_names), rng.choice(_last_names), f"LIC{p:09d}",
+               f"+353 8{rng.randrange(10)} {rng.randrange(1000000, 10000000)}", "Captain" if p % 2 == 0 else "Cadet")
+
+
+def destination_rows(flights, seed=DEFAULT_SEED):
+    """ Destination rows, one per airport code. """
+    rng = _rng(seed, "Destination")
+    for d in range(table_sizes(flights)["Destination"]):
+        yield (airport_code(d), f"City {airport_code(d)}", rng.choice(_countries))
+
+
+def pilot_flight_rows(flights, seed=DEFAULT_SEED):
+    """ Pilot_Flight rows: a Captain and a Cadet of the aircraft's crew, alternating by leg. """
+    aircraft = table_sizes(flights)["Aircraft"]
+    for n in range(flights):
+        a, leg = n % aircraft, n // aircraft
+        crew = 4 * a + 2 * (leg % 2)
+        yield (2 * n + 1, licence(crew), flight_number(n), "Captain")
+        yield (2 * n + 2, licence(crew + 1), flight_number(n), "Cadet")
+
+
+def aircraft_destination_rows(flights, seed=DEFAULT_SEED):
+    """ Aircraft_Destination rows: three destinations per aircraft. """
+    sizes = table_sizes(flights)
+    for a in range(sizes["Aircraft"]):
+        for j in range(3):
+            yield (3 * a + j + 1, registration(a), airport_code((a * 3 + j) % sizes["Destination"]))
+
+
+def aircraft_flight_rows(flights, seed=DEFAULT_SEED):
+    """ Aircraft_Flight rows: one per flight. """
+    aircraft = table_sizes(flights)["Aircraft"]
+    for n in range(flights):
+        yield (n + 1, registration(n % aircraft), flight_number(n))
+
+
+# table name -> row generator, in creation order (referenced tables first)
+row_generators = {
+    "Aircraft": aircraft_rows,
+    "Flight": flight_rows,
+    "Pilot": pilot_rows,
+    "Destination": destination_rows,
+    "Pilot_Flight": pilot_flight_rows,
+    "Aircraft_Destination": aircraft_destination_rows,
+    "Aircraft_Flight": aircraft_flight_rows,
+}
+
+
+def populate(connection, flights, seed=DEFAULT_SEED, batch_size=DEFAULT_BATCH_SIZE):
+    """ Bulk loads the synthetic rows of every table (see loader.load_rows).
+
+    Variables:
+    connection: connection to the database (the tables must exist)
+    flights: number of flights, the other tables are sized from it
+    seed: random seed
+    batch_size: rows per executemany / transaction
+
+    Returns:
+    reports: dict table name -> load report (rows, seconds, rows_per_second) """
+    return {table_name: load_rows(connection, table_name, rows(flights, seed), batch_size)
+            for table_name, rows in row_generators.items()}
+
+
+def build_database(connection, flights, seed=DEFAULT_SEED, batch_size=DEFAULT_BATCH_SIZE):
+    """ Creates the tables of an empty database, loads the synthetic data and
+    then builds the indexes and derived tables in one pass each.
+
+    The database is stamped with SCHEMA_VERSION, so initialise_database
+    leaves it (and its data) alone.
+
+    Returns:
+    reports: the load reports of populate, plus the index build time under "indexes" """
+    for table_query in tables_to_create:
+        connection.execute(table_query)
+    connection.commit()
+    reports = populate(connection, flights, seed, batch_size)
+    start = time.perf_counter()
+    create_indexes(connection)
+    create_search_index(connection)
+    create_availability_index(connection)
+    create_stats_tables(connection)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+    reports["indexes"] = {"seconds": time.perf_counter() - start}
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic aircraft management database.")
+    parser.add_argument("--flights", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--database", default="synthetic.db")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    try:
+        if connection.execute("SELECT count(*) FROM sqlite_master;").fetchone()[0]:
+            raise SystemExit(f"{args.database} is not empty")
+        reports = build_database(connection, args.flights, args.seed, args.batch_size)
+        for table_name, report in reports.items():
+            if "rows" in report:
+                print(f"{table_name}: {report['rows']} rows in {report['seconds']:.2f}s "
+                      f"({report['rows_per_second']:.0f} rows/sec)")
+        print(f"indexes and derived tables: {reports['indexes']['seconds']:.2f}s")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+""" A refreshed snapshot must match one built from scratch, whatever the writes in between. """
+import os
+import sqlite3
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from aircraft import initialise_database
+from analytics import FleetSnapshot
+from changelog import create_change_log
+
+NEW_FLIGHT = "INSERT INTO Flight VALUES ('T1', 'EI-DCJ', 'MAD', 'DUB', '2023-11-05 08:00', '2023-11-05 10:30', 99, 2.5);"
+
+
+def _reports(snapshot):
+    return len(snapshot), snapshot.load_factor("route"), snapshot.duration_percentiles("aircraft")
+
+
+def _assert_up_to_date(snapshot, connection):
+    snapshot.refresh(connection)
+    assert _reports(snapshot) == _reports(FleetSnapshot.from_database(connection))
+
+
+@pytest.mark.parametrize("logged", [False, True])
+def test_reused_rowid(logged):
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    if logged:
+        create_change_log(connection)
+    snapshot = FleetSnapshot.from_database(connection)
+    last = connection.execute("SELECT Flight_Number FROM Flight ORDER BY rowid DESC LIMIT 1;").fetchone()[0]
+    connection.execute("DELETE FROM Flight WHERE Flight_Number = ?;", (last,))
+    connection.execute(NEW_FLIGHT)
+    connection.commit()
+    _assert_up_to_date(snapshot, connection)
+
+
+@pytest.mark.parametrize("logged", [False, True])
+def test_update_in_place(logged):
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    if logged:
+        create_change_log(connection)
+    snapshot = FleetSnapshot.from_database(connection)
+    connection.execute("UPDATE Flight SET Passenger_Count = 1, Flight_Duration = 9 WHERE Flight_Number = 'B777';")
+    connection.commit()
+    _assert_up_to_date(snapshot, connection)
+
+
+def test_inserts_are_appended():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    create_change_log(connection)
+    snapshot = FleetSnapshot.from_database(connection)
+    assert snapshot.refresh(connection) == 0
+    connection.execute(NEW_FLIGHT)
+    connection.commit()
+    assert snapshot.refresh(connection) == 1
+    _assert_up_to_date(snapshot, connection)
+
+
+def test_commit_of_another_connection(tmp_path):
+    database_file = os.path.join(tmp_path, "live.db")
+    connection = sqlite3.connect(database_file)
+    initialise_database(connection)
+    snapshot = FleetSnapshot.from_database(connection)
+    assert snapshot.refresh(connection) == 0
+    writer = sqlite3.connect(database_file)
+    writer.execute("UPDATE Flight SET Passenger_Count = 1 WHERE Flight_Number = 'B777';")
+    writer.commit()
+    writer.close()
+    _assert_up_to_date(snapshot, connection)
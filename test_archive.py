@@ -0,0 +1,80 @@
+""" Archiving moves flights with their link rows and keeps them readable through Flight_History. """
+import os
+import sqlite3
+
+from aircraft import initialise_database
+from archive import aircraft_history, archive_flights, attach_archive, attach_history, flight_source, forget_archive
+from integrity import check_integrity
+from queries import drop_column, flight_duration_and_passengers
+
+
+def _connection(tmp_path):
+    connection = sqlite3.connect(os.path.join(tmp_path, "live.db"))
+    connection.execute("PRAGMA journal_mode=WAL;")
+    initialise_database(connection)
+    return connection
+
+
+def _count(connection, query):
+    return connection.execute(query).fetchone()[0]
+
+
+def test_archive_keeps_foreign_keys(tmp_path):
+    connection = _connection(tmp_path)
+    before = list(check_integrity(connection, workers=1))
+    links = _count(connection, "SELECT count(*) FROM Pilot_Flight") + _count(connection, "SELECT count(*) FROM Aircraft_Flight")
+
+    moved = archive_flights(connection, "2023-11-06", os.path.join(tmp_path, "archive"))
+
+    assert moved == {"2023-10": 1, "2023-11": 2}
+    assert _count(connection, "SELECT count(*) FROM Flight") == 2
+    assert list(check_integrity(connection, workers=1)) == before
+    archived_links = 0
+    for month in moved:
+        archive = sqlite3.connect(os.path.join(tmp_path, "archive", f"flights_{month.replace('-', '_')}.db"))
+        archived_links += _count(archive, "SELECT count(*) FROM Pilot_Flight") + \
+            _count(archive, "SELECT count(*) FROM Aircraft_Flight")
+        archive.close()
+    remaining = _count(connection, "SELECT count(*) FROM Pilot_Flight") + _count(connection, "SELECT count(*) FROM Aircraft_Flight")
+    assert archived_links + remaining == links
+    connection.close()
+
+
+def test_archive_is_retryable(tmp_path):
+    connection = _connection(tmp_path)
+    directory = os.path.join(tmp_path, "archive")
+    archive_flights(connection, "2023-11-06", directory)
+    assert archive_flights(connection, "2023-11-06", directory) == {}
+    history = {group["Aircraft_Registration_Number"]: group["Flights"] for group in aircraft_history(directory)}
+    assert history == {"EI-DCJ": 1, "F-WWBY": 1, "EI-HGA": 1}
+    connection.close()
+
+
+def test_history_view_serves_archived_flights(tmp_path):
+    connection = _connection(tmp_path)
+    directory = os.path.join(tmp_path, "archive")
+    attach_archive(connection, directory)
+    archive_flights(connection, "2023-11-06", directory)
+    assert flight_source(connection) == "Flight_History"
+    assert _count(connection, "SELECT count(*) FROM Flight_History") == 5
+    assert flight_duration_and_passengers(connection, "B777") == (1.5, 122)
+    forget_archive(connection)
+    assert flight_duration_and_passengers(connection, "B777") is None
+    connection.close()
+
+
+def test_drop_column_with_history_view(tmp_path):
+    connection = _connection(tmp_path)
+    directory = os.path.join(tmp_path, "archive")
+    archive_flights(connection, "2023-11-06", directory)
+    attach_history(connection, directory)
+    drop_column(connection, "Flight", "Passenger_Count")
+    assert "Passenger_Count" not in [row[1] for row in connection.execute("PRAGMA main.table_info(Flight);")]
+    # the view is rebuilt over the live columns, and still reads the archived months
+    assert "Passenger_Count" not in [row[1] for row in connection.execute("PRAGMA temp.table_info(Flight_History);")]
+    assert _count(connection, "SELECT count(*) FROM Flight_History") == 5
+    # months archived from now on are copied by column name
+    assert archive_flights(connection, "2024-01-01", directory) == {"2023-11": 2}
+    assert _count(connection, "SELECT count(*) FROM Flight_History") == 5
+    forget_archive(connection)
+    connection.close()
@@ -0,0 +1,91 @@
+""" The result cache never serves a result from before a write, and stays bounded. """
+import sqlite3
+import time
+
+from aircraft import initialise_database
+from cache import ResultCache, forget_connection, get_result_cache
+from queries import flight_duration_and_passengers, update_value
+
+KEY = ("SELECT 1", ())
+
+
+def _stored(cache, key, tables, rows):
+    """ Stores rows the way a read does (a key is stored on its second miss). """
+    for _ in range(2):
+        _, generation = cache.lookup(key)
+        cache.put(key, tables, rows, generation)
+
+
+def test_no_stale_read_after_write():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    for _ in range(3):
+        assert flight_duration_and_passengers(connection, "B777") == (1.5, 122)
+    assert get_result_cache(connection).stats()["hits"] == 1
+    update_value(connection, "Flight", "Passenger_Count", 122, 150)
+    assert flight_duration_and_passengers(connection, "B777") == (1.5, 150)
+    forget_connection(connection)
+    connection.close()
+
+
+def test_read_overlapping_a_write_is_not_stored():
+    cache = ResultCache()
+    _, generation = cache.lookup(KEY)
+    cache.put(KEY, frozenset({"Flight"}), [("old",)], generation)
+    # the second read, stored unless a write overlaps it
+    rows, generation = cache.lookup(KEY)
+    assert rows is None
+    cache.invalidate("Flight")
+    cache.put(KEY, frozenset({"Flight"}), [("stale",)], generation)
+    assert cache.lookup(KEY)[0] is None
+    assert cache.stats()["skipped_stores"] == 1
+
+
+def test_base_table_write_skips_derived_reads():
+    cache = ResultCache()
+    key = ("SELECT Row_Key FROM _Search_Index", ())
+    _, generation = cache.lookup(key)
+    cache.put(key, frozenset({"_Search_Index"}), [("stale",)], generation)
+    _, generation = cache.lookup(key)
+    # the search triggers change _Search_Index with every Flight write
+    cache.invalidate("Flight")
+    cache.put(key, frozenset({"_Search_Index"}), [("stale",)], generation)
+    assert cache.lookup(key)[0] is None
+    assert cache.stats()["skipped_stores"] == 1
+    # a write to a table the read does not depend on does not stop the store
+    _, generation = cache.lookup(KEY)
+    cache.put(KEY, frozenset({"Flight"}), [("fresh",)], generation)
+    _, generation = cache.lookup(KEY)
+    cache.invalidate("Pilot")
+    cache.put(KEY, frozenset({"Flight"}), [("fresh",)], generation)
+    assert cache.lookup(KEY)[0] == [("fresh",)]
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl=5.0)
+    _stored(cache, KEY, frozenset({"Flight"}), [(1,)])
+    now[0] += 4.0
+    assert cache.lookup(KEY)[0] == [(1,)]
+    now[0] += 2.0
+    assert cache.lookup(KEY)[0] is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    keys = [(f"SELECT {i}", ()) for i in range(3)]
+    _stored(cache, keys[0], frozenset({"Flight"}), [(0,)])
+    _stored(cache, keys[1], frozenset({"Flight"}), [(1,)])
+    # using the first entry makes the second the least recently used
+    assert cache.lookup(keys[0])[0] == [(0,)]
+    _stored(cache, keys[2], frozenset({"Flight"}), [(2,)])
+    assert cache.lookup(keys[1])[0] is None
+    assert cache.lookup(keys[0])[0] == [(0,)]
+    assert cache.lookup(keys[2])[0] == [(2,)]
+    assert cache.stats()["evictions"] == 1
+    # and the evicted entry no longer answers to invalidation
+    cache.invalidate("Flight")
+    assert cache.stats()["entries"] == 0
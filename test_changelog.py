@@ -0,0 +1,21 @@
+""" A removed reader no longer holds back pruning of the change log. """
+import sqlite3
+
+from aircraft import initialise_database
+from changelog import create_change_log, last_sequence, offsets, prune_change_log, remove_offset, set_offset
+
+
+def test_removed_reader_lets_the_log_be_pruned():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    create_change_log(connection)
+    set_offset(connection, "gone", 0)
+    connection.execute("UPDATE Flight SET Passenger_Count = Passenger_Count + 1;")
+    connection.commit()
+    latest = last_sequence(connection)
+    set_offset(connection, "integrity", latest)
+    assert prune_change_log(connection) == 0
+    assert remove_offset(connection, "gone")
+    assert not remove_offset(connection, "gone")
+    assert offsets(connection) == {"integrity": latest}
+    assert prune_change_log(connection) == latest
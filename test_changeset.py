@@ -0,0 +1,48 @@
+""" Changesets read from files keep explicit NULLs and leave absent columns alone. """
+import sqlite3
+
+import pytest
+
+from aircraft import initialise_database
+from changeset import ABSENT, apply_changes, read_changes
+from loader import read_records
+
+
+def _connection():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    return connection
+
+
+def _flight(connection, flight_number):
+    return connection.execute("SELECT Departure_Date_Time, Arrival_Date_Time, Passenger_Count FROM Flight "
+                              "WHERE Flight_Number = ?;", (flight_number,)).fetchone()
+
+
+def test_jsonl_null_and_absent(tmp_path):
+    connection = _connection()
+    before = _flight(connection, "B777")
+    path = tmp_path / "changes.jsonl"
+    path.write_text('{"op": "update", "table": "Flight", "key": "B777", "Departure_Date_Time": null}\n')
+    apply_changes(connection, read_changes(read_records(str(path), ABSENT)))
+    assert _flight(connection, "B777") == (None,) + before[1:]
+
+
+def test_csv_null_and_absent(tmp_path):
+    connection = _connection()
+    before = _flight(connection, "B777")
+    path = tmp_path / "changes.csv"
+    path.write_text("op,table,key,Departure_Date_Time,Arrival_Date_Time,Passenger_Count\n"
+                    "update,Flight,B777,\\N,,99\n")
+    apply_changes(connection, read_changes(read_records(str(path), ABSENT)))
+    assert _flight(connection, "B777") == (None, before[1], 99)
+
+
+def test_update_without_values_is_refused():
+    connection = _connection()
+    before = _flight(connection, "B777")
+    changes = read_changes([{"op": "update", "table": "Flight", "key": "B777", "Passenger_Count": 1},
+                            {"op": "update", "table": "Flight", "key": "B777", "Passenger_Count": ABSENT}])
+    with pytest.raises(ValueError):
+        apply_changes(connection, changes)
+    assert _flight(connection, "B777") == before
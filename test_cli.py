@@ -0,0 +1,26 @@
+""" The command line loads a subsystem only for its command, and reports errors on stderr. """
+import os
+import subprocess
+import sys
+
+from cli import main
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_subsystems_are_imported_lazily():
+    loaded = subprocess.run([sys.executable, "-c", "import sys, cli; print(' '.join(sorted(sys.modules)))"],
+                            cwd=HERE, capture_output=True, text=True, check=True).stdout.split()
+    for module in ("analytics", "changeset", "crew", "integrity", "replication", "routes", "sharding",
+                   "concurrent.futures", "multiprocessing"):
+        assert module not in loaded
+
+
+def test_view_error_exit_status(tmp_path, capsys):
+    database = os.path.join(tmp_path, "cli.db")
+    assert main(["--database", database, "--archive", os.path.join(tmp_path, "archive"),
+                 "view", "Flight", "--order-by", "Passenger_Count"]) == 1
+    out, err = capsys.readouterr()
+    assert "can only be ordered by" in err and "can only be ordered by" not in out
+    assert main(["--database", database, "--archive", os.path.join(tmp_path, "archive"),
+                 "crew", "--min-rest", "0"]) == 0
@@ -0,0 +1,93 @@
+""" The roster sweep and its incremental checks find the conflicts that comparing every pair of legs finds. """
+import random
+import sqlite3
+
+from aircraft import initialise_database
+from crew import CrewRoster
+
+MIN_REST = 30
+
+
+def _brute_force(assignments, times, min_rest=MIN_REST):
+    """ Conflicts from every pair of legs of each pilot, and the captain count of every crewed flight. """
+    conflicts = set()
+    legs = [(times[flight], flight, pilot) for pilot, flight, _ in assignments.values()]
+    for (first_times, first, pilot), (second_times, second, other_pilot) in \
+            ((a, b) for a in legs for b in legs if a < b):
+        if pilot != other_pilot or first == second:
+            continue
+        if second_times[0] < first_times[1]:
+            conflicts.add(("overlap", pilot, first, second))
+        elif second_times[0] - first_times[1] < min_rest:
+            conflicts.add(("rest", pilot, first, second))
+    for flight in {flight for _, flight, _ in assignments.values()}:
+        captains = sum(1 for _, crewed, ranking in assignments.values() if crewed == flight and ranking == "Captain")
+        if captains != 1:
+            conflicts.add(("captain", None, flight, None))
+    return conflicts
+
+
+def _random_roster(generator, pilots=6, flights=40):
+    times = {}
+    for i in range(flights):
+        start = generator.randrange(0, 3 * 24 * 60, 5)
+        times[f"F{i}"] = (start, start + generator.randrange(30, 300, 5))
+    assignments = {}
+    for pilot_flight_id in range(1, 3 * flights):
+        flight = generator.choice(sorted(times))
+        assignments[pilot_flight_id] = (f"CPL{generator.randrange(pilots)}", flight,
+                                        generator.choice(["Captain", "Cadet"]))
+    return times, assignments
+
+
+def test_sweep_matches_brute_force():
+    generator = random.Random(11)
+    for _ in range(20):
+        times, assignments = _random_roster(generator)
+        roster = CrewRoster(MIN_REST)
+        for pilot_flight_id, (pilot, flight, ranking) in assignments.items():
+            roster.assign(pilot_flight_id, pilot, flight, ranking, *times[flight])
+        assert set(map(tuple, roster.conflicts())) == _brute_force(assignments, times)
+
+
+def test_incremental_checks_match_brute_force():
+    generator = random.Random(12)
+    times, assignments = _random_roster(generator)
+    roster = CrewRoster(MIN_REST)
+    for pilot_flight_id, (pilot, flight, ranking) in assignments.items():
+        roster.assign(pilot_flight_id, pilot, flight, ranking, *times[flight])
+    for _ in range(30):
+        # what a change reports: the conflicts of the changed legs (pilot pairs in either order)
+        change = generator.choice(["assign", "unassign", "retime"])
+        if change == "assign":
+            pilot_flight_id = max(assignments) + 1
+            pilot, flight = f"CPL{generator.randrange(6)}", generator.choice(sorted(times))
+            assignments[pilot_flight_id] = (pilot, flight, "Cadet")
+            reported = roster.assign(pilot_flight_id, pilot, flight, "Cadet")
+            expected = {conflict for conflict in _brute_force(assignments, times)
+                        if conflict[0] != "captain" and conflict[1] == pilot and flight in conflict[2:]}
+            assert {tuple(conflict) for conflict in reported if conflict.kind != "captain"} == expected
+        elif change == "unassign":
+            pilot_flight_id = generator.choice(sorted(assignments))
+            flight = assignments.pop(pilot_flight_id)[1]
+            reported = roster.unassign(pilot_flight_id)
+            expected = {conflict for conflict in _brute_force(assignments, times)
+                        if conflict[0] == "captain" and conflict[2] == flight}
+            assert set(map(tuple, reported)) == expected
+        else:
+            flight = generator.choice(sorted(times))
+            start = generator.randrange(0, 3 * 24 * 60, 5)
+            times[flight] = (start, start + generator.randrange(30, 300, 5))
+            reported = roster.retime_flight(flight, *times[flight])
+            expected = {conflict for conflict in _brute_force(assignments, times) if flight in conflict[2:]}
+            assert set(map(tuple, reported)) == expected
+        assert set(map(tuple, roster.conflicts())) == _brute_force(assignments, times)
+
+
+def test_check_assignment_leaves_roster_unchanged():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    roster = CrewRoster.from_database(connection, MIN_REST)
+    before = roster.conflicts()
+    assert roster.check_assignment("CPL001", "B777", "Captain") == [("captain", "CPL001", "B777", None)]
+    assert roster.conflicts() == before
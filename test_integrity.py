@@ -0,0 +1,37 @@
+""" The parallel integrity checks must see one version of the database and leave no lock behind. """
+import os
+import sqlite3
+
+from aircraft import initialise_database
+from integrity import _snapshot_connections, check_integrity
+
+
+def _connection(tmp_path):
+    connection = sqlite3.connect(os.path.join(tmp_path, "live.db"))
+    connection.execute("PRAGMA journal_mode=WAL;")
+    initialise_database(connection)
+    return connection
+
+
+def test_workers_share_one_snapshot(tmp_path):
+    connection = _connection(tmp_path)
+    worker_connections = _snapshot_connections(os.path.join(tmp_path, "live.db"), 3)
+    connection.execute("DELETE FROM Pilot;")
+    connection.commit()
+    assert [worker.execute("SELECT count(*) FROM Pilot;").fetchone()[0] for worker in worker_connections] == [10] * 3
+    for worker in worker_connections:
+        worker.close()
+    connection.close()
+
+
+def test_parallel_checks_match_serial(tmp_path):
+    connection = _connection(tmp_path)
+    connection.execute("DELETE FROM Aircraft WHERE Aircraft_Registration_Number = 'EI-DCJ';")
+    connection.commit()
+    serial = sorted(check_integrity(connection, workers=1))
+    assert serial and sorted(check_integrity(connection, workers=4)) == serial
+    # a run stopped early ends its read transactions
+    next(check_integrity(connection, workers=4))
+    connection.execute("DELETE FROM Pilot;")
+    connection.commit()
+    connection.close()
@@ -0,0 +1,52 @@
+""" Bulk loads take every column the records name and leave the journal mode as they found it. """
+import os
+import sqlite3
+
+import pytest
+
+from aircraft import initialise_database
+from loader import load_rows
+
+
+def _connection(tmp_path):
+    connection = sqlite3.connect(os.path.join(tmp_path, "load.db"))
+    initialise_database(connection)
+    return connection
+
+
+def test_columns_named_after_the_first_record(tmp_path):
+    connection = _connection(tmp_path)
+    records = [{"Flight_Number": f"L{i}", "Aircraft_Registration_Number": "EI-DCJ", "Departure_Airport_Code": "EDI",
+                "Arrival_Airport_Code": "MAD"} for i in range(5)]
+    # keys the first record leaves out, in the first batch and in a later one
+    records[1]["Passenger_Count"] = 101
+    records[4]["Passenger_Count"], records[4]["Flight_Duration"] = 104, 2
+    assert load_rows(connection, "Flight", records, batch_size=2)["rows"] == 5
+    loaded = connection.execute("SELECT Flight_Number, Passenger_Count, Flight_Duration FROM Flight "
+                                "WHERE Flight_Number LIKE 'L%' ORDER BY Flight_Number;").fetchall()
+    assert loaded == [("L0", None, None), ("L1", 101, None), ("L2", None, None), ("L3", None, None),
+                      ("L4", 104, 2)]
+    connection.close()
+
+
+def test_unknown_column_in_a_later_record(tmp_path):
+    connection = _connection(tmp_path)
+    records = [{"Airport_Destination_Code": "Y1", "Location": "One", "Country": "Nowhere"},
+               {"Airport_Destination_Code": "Y2", "Location": "Two", "Country": "Nowhere", "Runways": 2}]
+    with pytest.raises(ValueError):
+        load_rows(connection, "Destination", records, batch_size=1)
+    # the batch before the bad record stays loaded
+    assert connection.execute("SELECT count(*) FROM Destination WHERE Airport_Destination_Code LIKE 'Y%';"
+                              ).fetchone()[0] == 1
+    connection.close()
+
+
+def test_journal_mode_is_restored(tmp_path):
+    connection = _connection(tmp_path)
+    assert connection.execute("PRAGMA journal_mode;").fetchone()[0] == "delete"
+    load_rows(connection, "Destination", [("Z1", "Zed", "Nowhere")])
+    assert connection.execute("PRAGMA journal_mode;").fetchone()[0] == "delete"
+    connection.execute("PRAGMA journal_mode=WAL;")
+    load_rows(connection, "Destination", [("Z2", "Zed", "Nowhere")])
+    assert connection.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    connection.close()
@@ -0,0 +1,74 @@
+""" The pool keeps the writes reported as done when another one fails, and commits a lone write on time. """
+import os
+import sqlite3
+import threading
+import time
+
+from aircraft import initialise_database
+from pool import ConnectionPool
+
+_insert = "INSERT INTO Destination (Airport_Destination_Code, Location, Country) VALUES (?, ?, ?);"
+
+
+def _database(tmp_path):
+    database_file = os.path.join(tmp_path, "pool.db")
+    connection = sqlite3.connect(database_file)
+    initialise_database(connection)
+    connection.commit()
+    connection.close()
+    return database_file
+
+
+def _codes(pool):
+    return {row[0] for row in pool.read("SELECT Airport_Destination_Code FROM Destination;")}
+
+
+def test_failed_write_keeps_the_batch(tmp_path):
+    with ConnectionPool(_database(tmp_path), commit_every=100, commit_interval=60) as pool:
+        pool.write(_insert, ("AAA", "A", "A"))
+        try:
+            pool.write(_insert, ("AAA", "A", "A"))
+            raise AssertionError("duplicate key accepted")
+        except sqlite3.IntegrityError:
+            pass
+        pool.write(_insert, ("BBB", "B", "B"))
+        pool.flush()
+        assert {"AAA", "BBB"} <= _codes(pool)
+
+
+def test_failed_first_write_releases_the_lock(tmp_path):
+    database_file = _database(tmp_path)
+    with ConnectionPool(database_file, commit_interval=60) as pool:
+        try:
+            pool.write(_insert, ("EDI", "Edinburgh", "UK"))
+        except sqlite3.IntegrityError:
+            pass
+        other = sqlite3.connect(database_file, timeout=0)
+        other.execute(_insert, ("CCC", "C", "C"))
+        other.commit()
+        other.close()
+
+
+def test_lone_write_is_committed_by_the_timer(tmp_path):
+    with ConnectionPool(_database(tmp_path), commit_every=100, commit_interval=0.05) as pool:
+        pool.write(_insert, ("DDD", "D", "D"))
+        deadline = time.monotonic() + 5
+        while "DDD" not in _codes(pool):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert pool.metrics()["pending_writes"] == 0
+
+
+def test_concurrent_writers(tmp_path):
+    with ConnectionPool(_database(tmp_path), commit_every=7) as pool:
+        def writer(number):
+            for row in range(50):
+                pool.write(_insert, (f"T{number}_{row}", "T", "T"))
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.flush()
+        assert len([code for code in _codes(pool) if code.startswith("T")]) == 200
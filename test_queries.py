@@ -0,0 +1,46 @@
+""" Dropping a column (menu option 5) must work with the derived tables' triggers in place, and leave writes working. """
+import sqlite3
+
+import pytest
+
+from aircraft import initialise_database
+from changelog import changes_since, create_change_log
+from queries import drop_column
+from schema import get_catalog, table_names
+from search import search
+
+
+def _connection():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    create_change_log(connection)
+    return connection
+
+
+def _non_key_columns():
+    connection = _connection()
+    catalog = get_catalog(connection)
+    return [(table_name, column) for table_name in table_names
+            for column in catalog.column_names(table_name) if column not in catalog.primary_key(table_name)]
+
+
+@pytest.mark.parametrize("table_name, column", _non_key_columns())
+def test_drop_column(table_name, column):
+    connection = _connection()
+    drop_column(connection, table_name, column)
+    catalog = get_catalog(connection)
+    assert column not in catalog.column_names(table_name)
+    for other in table_names:
+        columns = catalog.column_names(other)
+        connection.execute(f"UPDATE {other} SET {columns[-1]} = {columns[-1]};")
+        connection.execute(f"DELETE FROM {other} WHERE rowid = 1;")
+    connection.commit()
+
+
+def test_drop_column_rebuilds_search_and_change_log():
+    connection = _connection()
+    drop_column(connection, "Pilot", "Contact_Number")
+    connection.execute("UPDATE Pilot SET First_Name = 'Zelda' WHERE Commercial_Pilot_License_Number = 'CPL001';")
+    connection.commit()
+    assert search(connection, "zelda")["Pilot"][0][1] == "Zelda"
+    assert "Contact_Number" not in changes_since(connection, 0, "Pilot")[-1][4]
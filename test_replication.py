@@ -0,0 +1,73 @@
+""" A replica made while the primary is written to catches up to the same seven tables. """
+import os
+import sqlite3
+
+from aircraft import initialise_database
+from changelog import is_logged
+from queries import drop_column
+from replication import Replicator, snapshot
+from schema import get_catalog, table_names
+
+
+def _rows(connection):
+    """ Every row of the seven tables, in primary key order. """
+    catalog = get_catalog(connection)
+    return {table_name: connection.execute(f"SELECT * FROM {table_name} ORDER BY "
+                                           f"{', '.join(catalog.primary_key(table_name))};").fetchall()
+            for table_name in table_names}
+
+
+def test_replica_matches_primary(tmp_path):
+    primary_file = os.path.join(tmp_path, "primary.db")
+    replica_file = os.path.join(tmp_path, "replica.db")
+    connection = sqlite3.connect(primary_file)
+    connection.execute("PRAGMA journal_mode=WAL;")
+    initialise_database(connection)
+    writer = sqlite3.connect(primary_file)
+
+    def write_during_copy(status, remaining, total):
+        if not writer.execute("SELECT count(*) FROM Pilot WHERE Commercial_Pilot_License_Number = 'CPL100';"
+                              ).fetchone()[0]:
+            writer.execute("INSERT INTO Pilot SELECT 'CPL100', First_Name, Last_Name, 'L100', Contact_Number, "
+                           "Pilot_Ranking FROM Pilot WHERE Commercial_Pilot_License_Number = 'CPL001';")
+            writer.commit()
+
+    snapshot(connection, replica_file, pages=1, progress=write_during_copy)
+    replica = sqlite3.connect(replica_file)
+    # the copy is of the moment the snapshot started, the pilot comes with the log
+    assert connection.execute("SELECT count(*) FROM Pilot WHERE Commercial_Pilot_License_Number = 'CPL100';"
+                              ).fetchone()[0] == 1
+    assert replica.execute("SELECT count(*) FROM Pilot WHERE Commercial_Pilot_License_Number = 'CPL100';"
+                           ).fetchone()[0] == 0
+
+    # one batch: a primary key rename chain (F56 -> F57, then B777 -> F56) and a delete then re-insert
+    connection.execute("UPDATE Flight SET Flight_Number = 'F57' WHERE Flight_Number = 'F56';")
+    connection.execute("UPDATE Flight SET Flight_Number = 'F56' WHERE Flight_Number = 'B777';")
+    deleted = connection.execute("SELECT * FROM Flight WHERE Flight_Number = 'FR2233';").fetchone()
+    connection.execute("DELETE FROM Flight WHERE Flight_Number = 'FR2233';")
+    connection.execute("INSERT INTO Flight VALUES (?, ?, ?, ?, ?, ?, ?, ?);", deleted[:6] + (7, deleted[7]))
+    connection.execute("UPDATE Pilot_Flight SET Flight_Number = 'F56' WHERE Flight_Number = 'B777';")
+    connection.commit()
+
+    with Replicator(connection, replica_file, batch_size=1000) as replicator:
+        report = replicator.sync()
+    assert report["batches"] == 1
+    assert _rows(replica) == _rows(connection)
+    replica.close()
+    writer.close()
+    connection.close()
+
+
+def test_drop_column_keeps_replica_unlogged(tmp_path):
+    connection = sqlite3.connect(os.path.join(tmp_path, "primary.db"))
+    initialise_database(connection)
+    replica_file = os.path.join(tmp_path, "replica.db")
+    snapshot(connection, replica_file)
+    replica = sqlite3.connect(replica_file)
+    drop_column(replica, "Flight", "Passenger_Count")
+    assert not is_logged(replica, "Flight")
+    # on the primary the log triggers are rebuilt for the remaining columns
+    drop_column(connection, "Flight", "Passenger_Count")
+    assert is_logged(connection, "Flight")
+    replica.close()
+    connection.close()
@@ -0,0 +1,114 @@
+""" Connection Scan finds the earliest arrival that trying every itinerary finds, and stays right as flights change. """
+import random
+import sqlite3
+
+from aircraft import initialise_database
+from routes import Timetable, timetable_query
+
+AIRPORTS = ["DUB", "EDI", "MAD", "MXP", "BUD", "PRG"]
+MIN_CONNECTION = 45
+HORIZON = 48 * 60
+
+
+def _random_flights(generator, count=30):
+    flights = []
+    for i in range(count):
+        departure_airport, arrival_airport = generator.sample(AIRPORTS, 2)
+        departure = generator.randrange(0, 2 * 24 * 60, 15)
+        flights.append((f"F{i}", departure_airport, arrival_airport, departure,
+                        departure + generator.randrange(45, 240, 15)))
+    return flights
+
+
+def _brute_force(flights, origin, destination, start, min_connection=MIN_CONNECTION, horizon=HORIZON):
+    """ Earliest arrival over every itinerary (depth first over the flights not used yet), None if none. """
+    best = None
+
+    def visit(airport, ready, used):
+        nonlocal best
+        for flight, departure_airport, arrival_airport, departure, arrival in flights:
+            if flight in used or departure_airport != airport or departure < ready or arrival > start + horizon:
+                continue
+            if arrival_airport == destination:
+                best = arrival if best is None else min(best, arrival)
+            elif arrival_airport != origin:
+                visit(arrival_airport, arrival + min_connection, used | {flight})
+
+    visit(origin, start, frozenset())
+    return best
+
+
+def _check(timetable, flights, origin, destination, start):
+    if origin == destination:
+        assert timetable.earliest_arrival(origin, destination, start) == []
+        return
+    itinerary = timetable.earliest_arrival(origin, destination, start, MIN_CONNECTION, HORIZON)
+    expected = _brute_force(flights, origin, destination, start)
+    if expected is None:
+        assert itinerary is None
+        return
+    assert itinerary[-1].arrival == expected
+    # the itinerary itself is flown: it starts at the origin after start and every connection is long enough
+    assert itinerary[0].departure_airport == origin and itinerary[0].departure >= start
+    assert itinerary[-1].arrival_airport == destination
+    for first, second in zip(itinerary, itinerary[1:]):
+        assert first.arrival_airport == second.departure_airport
+        assert second.departure - first.arrival >= MIN_CONNECTION
+    scheduled = {flight[0]: flight for flight in flights}
+    assert all(tuple(leg) == scheduled[leg.flight] for leg in itinerary)
+
+
+def _timetable(flights):
+    timetable = Timetable()
+    for flight in flights:
+        timetable.add_flight(*flight)
+    return timetable
+
+
+def test_earliest_arrival_matches_brute_force():
+    generator = random.Random(21)
+    for _ in range(10):
+        flights = _random_flights(generator)
+        timetable = _timetable(flights)
+        for origin in AIRPORTS:
+            for destination in AIRPORTS:
+                _check(timetable, flights, origin, destination, generator.randrange(0, 24 * 60, 30))
+
+
+def test_incremental_changes_match_brute_force():
+    generator = random.Random(22)
+    flights = _random_flights(generator)
+    timetable = _timetable(flights)
+    for i in range(40):
+        change = generator.choice(["add", "remove", "update"])
+        if change == "add":
+            flight = _random_flights(generator, 1)[0]
+            flight = (f"N{i}",) + flight[1:]
+            flights.append(flight)
+            timetable.add_flight(*flight)
+        elif change == "remove":
+            flight = flights.pop(generator.randrange(len(flights)))
+            # with and without the departure that narrows the search
+            assert timetable.remove_flight(flight[0], flight[3] if i % 2 else None)
+            assert not timetable.remove_flight(flight[0])
+        else:
+            index = generator.randrange(len(flights))
+            old = flights[index]
+            flights[index] = (old[0],) + _random_flights(generator, 1)[0][1:]
+            timetable.update_flight(*flights[index], old_departure=old[3])
+        assert list(timetable.departures) == sorted(timetable.departures)
+        assert sorted(zip(timetable.flights, timetable.departures, timetable.arrivals)) == \
+            sorted((flight, departure, arrival) for flight, _, _, departure, arrival in flights)
+        origin, destination = generator.sample(AIRPORTS, 2)
+        _check(timetable, flights, origin, destination, generator.randrange(0, 24 * 60, 30))
+
+
+def test_from_database():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    flights = connection.execute(timetable_query).fetchall()
+    timetable = Timetable.from_database(connection)
+    assert len(timetable) == len(flights)
+    for _, origin, destination, departure, _ in flights:
+        _check(timetable, flights, origin, destination, departure)
+        assert timetable.earliest_arrival(origin, destination, departure + 1) is None
@@ -0,0 +1,38 @@
+""" The search index and the flight time R*Tree must survive Flight rowids being renumbered (as VACUUM may do). """
+import sqlite3
+
+from aircraft import initialise_database
+from availability import available_aircraft, create_availability_index
+from search import create_search_index, drop_search_triggers, search
+
+
+def _renumbered():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    # renumber the rows without the triggers seeing it, then put the triggers back
+    drop_search_triggers(connection, "Flight")
+    for event in ("Insert", "Update", "Delete"):
+        connection.execute(f"DROP TRIGGER _Flight_Times_{event};")
+    connection.execute("UPDATE Flight SET rowid = 1000 - rowid;")
+    create_search_index(connection)
+    create_availability_index(connection)
+    connection.commit()
+    return connection
+
+
+def test_search_after_renumbering():
+    connection = _renumbered()
+    assert [row[0] for row in search(connection, "B777")["Flight"]] == ["B777"]
+    connection.execute("DELETE FROM Flight WHERE Flight_Number = 'B777';")
+    connection.execute("UPDATE Flight SET Arrival_Airport_Code = 'ZZZ' WHERE Flight_Number = 'F56';")
+    assert "Flight" not in search(connection, "B777")
+    assert [row[0] for row in search(connection, "ZZ", prefix=True)["Flight"]] == ["F56"]
+    assert search(connection, "F56")["Flight"] == search(connection, "ZZZ")["Flight"]
+
+
+def test_availability_after_renumbering():
+    connection = _renumbered()
+    window = ("2023-10-30 08:30:00", "2023-10-30 09:00:00")
+    assert "EI-DCJ" not in [row[0] for row in available_aircraft(connection, *window)]
+    connection.execute("DELETE FROM Flight WHERE Flight_Number = 'B777';")
+    assert "EI-DCJ" in [row[0] for row in available_aircraft(connection, *window)]
@@ -0,0 +1,97 @@
+""" Scatter-gather over shards must give the results of the single database file. """
+import os
+import sqlite3
+
+import pytest
+
+from search import search
+from sharding import ShardedDatabase, ShardMap, split_database
+from stats import stats_by_aircraft, stats_by_route
+from synthetic import build_database, flight_number
+
+FLIGHTS = 2000
+
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("sharding"))
+    database_file = os.path.join(directory, "single.db")
+    connection = sqlite3.connect(database_file)
+    build_database(connection, FLIGHTS)
+    connection.commit()
+    shard_map = ShardMap(os.path.join(directory, "shards"), ["a", "b", "c"])
+    split_database(database_file, shard_map, processes=2)
+    sharded = ShardedDatabase(shard_map.directory, processes=2)
+    yield connection, sharded
+    sharded.close()
+    connection.close()
+
+
+def test_split_keeps_every_row(databases):
+    connection, sharded = databases
+    for table_name in ("Flight", "Pilot_Flight", "Aircraft_Flight"):
+        rows = sorted(connection.execute(f"SELECT * FROM {table_name};").fetchall())
+        assert sorted(sharded.query(f"SELECT * FROM {table_name};")) == rows
+    assert sharded.query("SELECT count(*) FROM Aircraft;") == connection.execute(
+        "SELECT count(*) FROM Aircraft;").fetchall()
+
+
+def test_filtered_query(databases):
+    connection, sharded = databases
+    query = "SELECT Flight_Number, Passenger_Count FROM Flight WHERE Passenger_Count > ?;"
+    assert sorted(sharded.query(query, (150,))) == sorted(connection.execute(query, (150,)).fetchall())
+
+
+def test_comma_join(databases):
+    connection, sharded = databases
+    query = ("SELECT Flight.Flight_Number, Aircraft.Manufacturer FROM Aircraft, Flight "
+             "WHERE Aircraft.Aircraft_Registration_Number = Flight.Aircraft_Registration_Number;")
+    rows = sorted(connection.execute(query).fetchall())
+    assert len(rows) == FLIGHTS
+    assert sorted(sharded.query(query)) == rows
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT count(*) FROM Aircraft, Flight;",
+    "SELECT count(*) FROM Flight;",
+    "SELECT * FROM Flight ORDER BY Departure_Date_Time LIMIT 2;",
+    "SELECT DISTINCT Aircraft_Registration_Number FROM Flight;",
+    "SELECT Aircraft_Registration_Number, sum(Passenger_Count) FROM Flight GROUP BY 1;",
+    "DELETE FROM Flight;",
+])
+def test_unmergeable_queries_are_refused(databases, query):
+    _, sharded = databases
+    with pytest.raises(ValueError):
+        sharded.query(query)
+
+
+def test_aggregate(databases):
+    connection, sharded = databases
+    expected = connection.execute(
+        "SELECT Aircraft_Registration_Number, count(*), sum(Passenger_Count), min(Flight_Duration), "
+        "max(Flight_Duration), avg(Passenger_Count) FROM Flight GROUP BY Aircraft_Registration_Number "
+        "ORDER BY Aircraft_Registration_Number;").fetchall()
+    merged = sharded.aggregate(["Aircraft_Registration_Number"], [
+        ("count", "*"), ("sum", "Passenger_Count"), ("min", "Flight_Duration"), ("max", "Flight_Duration"),
+        ("avg", "Passenger_Count")])
+    assert [row[:5] for row in merged] == [row[:5] for row in expected]
+    assert [row[5] for row in merged] == pytest.approx([row[5] for row in expected])
+
+
+def test_stats(databases):
+    connection, sharded = databases
+    for group, single in (("aircraft", stats_by_aircraft), ("route", stats_by_route)):
+        merged = sharded.stats(group)
+        expected = single(connection)
+        assert len(merged) == len(expected)
+        for merged_group, expected_group in zip(merged, expected):
+            assert merged_group == pytest.approx(expected_group)
+
+
+def test_search(databases):
+    connection, sharded = databases
+    value = flight_number(42)
+    expected = search(connection, value)
+    merged = sharded.search(value)
+    assert {table: sorted(rows) for table, rows in merged.items()} == \
+        {table: sorted(rows) for table, rows in expected.items()}
@@ -0,0 +1,56 @@
+""" The trigger-maintained stats must match a rebuild from scratch after any sequence of writes. """
+import sqlite3
+
+from aircraft import initialise_database
+from stats import rebuild_stats, stats_by_aircraft, stats_by_day, stats_by_pilot, stats_by_route
+
+
+def _all_stats(connection):
+    return (stats_by_aircraft(connection), stats_by_route(connection),
+            stats_by_day(connection), stats_by_pilot(connection))
+
+
+def _assert_matches_rebuild(connection):
+    incremental = _all_stats(connection)
+    rebuild_stats(connection)
+    assert incremental == _all_stats(connection)
+
+
+def _connection():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    return connection
+
+
+def test_flight_writes():
+    connection = _connection()
+    connection.execute("INSERT INTO Flight VALUES ('T1', 'EI-DCJ', 'MAD', 'DUB', '2023-11-05 08:00', "
+                       "'2023-11-05 10:30', 120, 150);")
+    connection.execute("INSERT INTO Pilot_Flight VALUES (100, 'CPL001', 'T1', 'Captain');")
+    connection.execute("UPDATE Flight SET Passenger_Count = 90, Departure_Airport_Code = 'EDI' WHERE Flight_Number = 'T1';")
+    connection.execute("DELETE FROM Flight WHERE Flight_Number = 'B777';")
+    connection.commit()
+    _assert_matches_rebuild(connection)
+
+
+def test_seat_capacity_changes():
+    connection = _connection()
+    connection.execute("UPDATE Aircraft SET Seat_Capacity = 300 WHERE Aircraft_Registration_Number = 'EI-DCJ';")
+    connection.execute("INSERT INTO Flight VALUES ('T2', 'EI-DCJ', 'MAD', 'DUB', '2023-11-05 08:00', "
+                       "'2023-11-05 10:30', 120, 150);")
+    connection.execute("UPDATE Aircraft SET Seat_Capacity = NULL WHERE Aircraft_Registration_Number = 'EI-DCJ';")
+    connection.execute("DELETE FROM Flight WHERE Flight_Number = 'T2';")
+    connection.execute("UPDATE Aircraft SET Seat_Capacity = 100 WHERE Aircraft_Registration_Number = 'EI-DCJ';")
+    connection.commit()
+    _assert_matches_rebuild(connection)
+
+
+def test_aircraft_renamed_and_deleted():
+    connection = _connection()
+    connection.execute("UPDATE Aircraft SET Aircraft_Registration_Number = 'EI-NEW' "
+                       "WHERE Aircraft_Registration_Number = 'EI-DCJ';")
+    connection.execute("UPDATE Flight SET Aircraft_Registration_Number = 'EI-NEW' "
+                       "WHERE Aircraft_Registration_Number = 'EI-DCJ';")
+    connection.execute("DELETE FROM Aircraft WHERE Aircraft_Registration_Number = 'EI-HGA';")
+    connection.commit()
+    _assert_matches_rebuild(connection)
@@ -0,0 +1,52 @@
+""" Keyset pages read every row once, in ORDER BY order, without sorting. """
+import random
+import sqlite3
+
+import pytest
+
+from aircraft import initialise_database
+from viewer import iter_pages, iter_rows
+
+
+def _connection():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE Leg (Name TEXT NOT NULL, Airport TEXT, Departure TEXT, Seats INT);")
+    connection.execute("CREATE INDEX Leg_Airport ON Leg (Airport, Departure);")
+    generator = random.Random(7)
+    # few distinct values, and NULLs in both index columns, so ties and NULL keys cross page boundaries
+    connection.executemany("INSERT INTO Leg VALUES (?, ?, ?, ?);", [
+        (f"L{i}", generator.choice(["MAD", "DUB", "EDI", None]), generator.choice(["08:00", "09:30", None]),
+         generator.randint(0, 9)) for i in range(300)])
+    return connection
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("page_size", [1, 7, 100])
+def test_composite_index_order(descending, page_size):
+    connection = _connection()
+    direction = "DESC" if descending else "ASC"
+    expected = connection.execute(f"SELECT Name, Airport FROM Leg ORDER BY Airport {direction}, "
+                                  f"Departure {direction}, rowid {direction};").fetchall()
+    rows = list(iter_rows(connection, "Leg", page_size, ["Name", "Airport"], "Airport", descending))
+    assert rows == expected
+
+
+def test_pages_do_not_sort():
+    connection = _connection()
+    plans = []
+    connection.set_trace_callback(lambda statement: plans.extend(
+        row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + statement).fetchall())
+        if statement.startswith("SELECT") else None)
+    pages = list(iter_pages(connection, "Leg", 5, ["Name"], "Airport"))
+    connection.set_trace_callback(None)
+    assert sum(len(page) for page in pages) == 300
+    assert plans and not any("TEMP B-TREE" in plan for plan in plans)
+
+
+def test_flights_by_airport():
+    connection = sqlite3.connect(":memory:")
+    initialise_database(connection)
+    rows = list(iter_rows(connection, "Flight", 2, ["Flight_Number"], "Departure_Airport_Code"))
+    assert sorted(rows) == sorted(connection.execute("SELECT Flight_Number FROM Flight;").fetchall())
+    with pytest.raises(ValueError):
+        list(iter_rows(connection, "Flight", 2, ["Flight_Number"], "Passenger_Count"))
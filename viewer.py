@@ -0,0 +1,160 @@
+""" Streaming, paginated reads of a table.
+
+Pages are read with keyset pagination: each page query starts right after the
+last key of the previous page (WHERE key > ? ORDER BY key LIMIT page_size),
+so every page costs one index seek however deep into the table it is and
+only one page of rows is held in memory at a time. The key is the rowid, or
+when sorting on a column, the columns of an index it leads then the rowid:
+the order of the index entries, so ties on the column are broken by the
+other index columns and no page needs a sort. """
+from schema import get_catalog
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def _validate(connection, table_name, columns, order_by):
+    """ Checks the table, the projected columns and the sort column against the catalog.
+
+    Returns:
+    columns: the projected columns (all columns when None was given) """
+    catalog = get_catalog(connection)
+    if table_name not in catalog.tables():
+        raise ValueError(f"No such table: {table_name}")
+    column_names = catalog.column_names(table_name)
+    if not columns:
+        columns = column_names
+    unknown = [col for col in columns if col not in column_names]
+    if unknown:
+        raise ValueError(f"No such column in {table_name}: {', '.join(unknown)}")
+    if order_by is not None and order_by not in catalog.indexed_columns(table_name):
+        indexed = ", ".join(sorted(catalog.indexed_columns(table_name))) or "none"
+        raise ValueError(f"{table_name} can only be ordered by a column that leads an index ({indexed})")
+    return list(columns)
+
+
+def _after(keys, last_key, direction, nullable):
+    """ Condition that a row comes after last_key in the page order, and its parameters.
+
+    A row value compared with a NULL is NULL, so when a key column may hold
+    NULLs (index columns after the first) the condition is spelled out column
+    by column, behind a row value of the keys before it that SQLite can still
+    seek on. Ascending, only a NULL in last_key needs that: NULLs sort first,
+    so rows comparing as NULL there are the ones before last_key.
+
+    Variables:
+    keys: key columns, the rowid last
+    last_key: key values of the last row of the previous page
+    direction: "ASC" or "DESC"
+    nullable: key columns that may hold NULLs
+
+    Returns:
+    condition, params """
+    comparison = ">" if direction == "ASC" else "<"
+    seek = 0
+    while seek < len(keys) and last_key[seek] is not None and \
+            (direction == "ASC" or keys[seek] not in nullable):
+        seek += 1
+    if seek == len(keys):
+        return _row_value(keys, comparison), list(last_key)
+    # from the last key (the rowid, never NULL) up to the first
+    condition, params = f"{keys[-1]} {comparison} ?", [last_key[-1]]
+    for key, value in zip(reversed(keys[:-1]), reversed(last_key[:-1])):
+        if value is None and direction == "ASC":
+            condition = f"({key} IS NOT NULL OR ({key} IS NULL AND {condition}))"
+        elif value is None:
+            condition = f"({key} IS NULL AND {condition})"
+        else:
+            past = f"{key} < ? OR {key} IS NULL" if direction == "DESC" and key in nullable else \
+                f"{key} {comparison} ?"
+            condition = f"({past} OR ({key} = ? AND {condition}))"
+            params = [value, value] + params
+    if seek:
+        condition = f"{_row_value(keys[:seek], comparison + '=')} AND {condition}"
+        params = list(last_key[:seek]) + params
+    return condition, params
+
+
+def _row_value(keys, comparison):
+    """ "(key, ...) > (?, ...)", or "key > ?" for a single key. """
+    if len(keys) == 1:
+        return f"{keys[0]} {comparison} ?"
+    return f"({', '.join(keys)}) {comparison} ({', '.join('?' * len(keys))})"
+
+
+def _keyset_pages(cursor, select, where, keys, direction, page_size, nullable=()):
+    """ Pages through one keyset segment.
+
+    Variables:
+    cursor: cursor to run the page queries on
+    select: "SELECT key..., columns... FROM table" (the keys come first)
+    where: condition that selects the segment, or None
+    keys: key columns, e.g. ["rowid"] or ["Departure_Airport_Code", "Departure_Date_Time", "rowid"]
+    direction: "ASC" or "DESC"
+    page_size: max number of rows per page
+    nullable: key columns that may hold NULLs
+
+    Returns:
+    generator of pages (lists of rows without the key columns) """
+    order = ", ".join(f"{key} {direction}" for key in keys)
+    last_key = None
+    while True:
+        conditions = [where] if where else []
+        params = []
+        if last_key is not None:
+            condition, condition_params = _after(keys, last_key, direction, nullable)
+            conditions.append(condition)
+            params.extend(condition_params)
+        query = select
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order} LIMIT ?;"
+        cursor.execute(query, params + [page_size])
+        page = cursor.fetchmany(page_size)
+        if not page:
+            return
+        last_key = page[-1][:len(keys)]
+        yield [row[len(keys):] for row in page]
+        if len(page) < page_size:
+            return
+
+
+def iter_pages(connection, table_name, page_size=DEFAULT_PAGE_SIZE, columns=None, order_by=None, descending=False):
+    """ Reads a table one page at a time.
+
+    Variables:
+    connection: connection to the database
+    table_name: The name of a specific table
+    page_size: number of rows per page
+    columns: columns to read, defaults to all of them
+    order_by: indexed column to sort on, defaults to table (rowid) order
+    descending: sort from the largest key down
+
+    Returns:
+    generator of pages (lists of rows) """
+    columns = _validate(connection, table_name, columns, order_by)
+    direction = "DESC" if descending else "ASC"
+    cursor = connection.cursor()
+    if order_by is None:
+        select = f"SELECT rowid, {', '.join(columns)} FROM {table_name}"
+        yield from _keyset_pages(cursor, select, None, ["rowid"], direction, page_size)
+        return
+
+    # the NULLs of the sort column are paged as their own segment (so each
+    # page seeks): first when ascending, last when descending (as ORDER BY does)
+    catalog = get_catalog(connection)
+    others = catalog.index_key(table_name, order_by)[1:] + ["rowid"]
+    nullable = {column.name for column in catalog.columns(table_name) if not column.not_null}
+    null_segment = (f"SELECT {', '.join(others)}, {', '.join(columns)} FROM {table_name}",
+                    f"{order_by} IS NULL", others)
+    value_segment = (f"SELECT {order_by}, {', '.join(others)}, {', '.join(columns)} FROM {table_name}",
+                     f"{order_by} IS NOT NULL", [order_by] + others)
+    segments = [value_segment, null_segment] if descending else [null_segment, value_segment]
+    for select, where, keys in segments:
+        # (the sort column is not NULL in the value segment, and only NULL in the other)
+        yield from _keyset_pages(cursor, select, where, keys, direction, page_size, nullable - {order_by})
+
+
+def iter_rows(connection, table_name, page_size=DEFAULT_PAGE_SIZE, columns=None, order_by=None, descending=False):
+    """ Same as iter_pages, one row at a time. """
+    for page in iter_pages(connection, table_name, page_size, columns, order_by, descending):
+        yield from page